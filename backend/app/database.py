@@ -2,6 +2,9 @@ import os
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from .services.metrics import mongo_command_metrics, mongo_pool_metrics
+from .services.slow_operations import SLOW_OPERATION_RECORDING, slow_operation_recorder
+
 load_dotenv()
 
 class MongoDB: 
@@ -9,7 +12,11 @@ class MongoDB:
     database_name: str = os.getenv("MONGODB_NAME", "passgod")
 
     async def connect(self): 
-        self.client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017/"))
+        self.client = AsyncIOMotorClient(
+            os.getenv("MONGODB_URL", "mongodb://localhost:27017/"),
+            # The slow operation recorder is only attached when opted in, so it costs nothing otherwise
+            event_listeners=[mongo_command_metrics, mongo_pool_metrics] + ([slow_operation_recorder] if SLOW_OPERATION_RECORDING else [])
+        )
         print("Connected to MongoDB!")
 
     async def close(self): 
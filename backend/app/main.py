@@ -1,16 +1,33 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Response, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 
 from app.database import mongodb, get_database  # Import MongoDB and get_database
+from app.services.scheduler import start_periodic_task, stop_periodic_tasks
+from app.services import change_feed, notification_hub, notification_retention, unlock_sessions
+from app.services.reencryption import reencryption_job
+from app.services.derived_fields import BACKFILL_CHECK_INTERVAL_MINUTES, derived_fields_backfill
+from app.services.metrics import METRICS_CONTENT_TYPE, MetricsMiddleware, mongo_pool_metrics, registry as metrics_registry
+from app.services.loop_monitor import loop_lag_monitor
+from app.services.request_profiler import ProfilingMiddleware, request_profiler
+from app.services import password_hashing
+from app.services.slow_operations import SLOW_OPERATION_RECORDING, slow_operation_recorder
 
 # Load environment variables
 load_dotenv()
 
+# /ready fails (so the load balancer stops routing here) past any of these
+READY_MAX_LOOP_LAG_MS = float(os.getenv("READY_MAX_LOOP_LAG_MS", "250"))
+READY_MAX_HASHING_QUEUE = int(os.getenv("READY_MAX_HASHING_QUEUE", "32"))
+READY_MONGO_TIMEOUT_SECONDS = float(os.getenv("READY_MONGO_TIMEOUT_SECONDS", "2"))
+
 # Initialize FastAPI app
 app = FastAPI(
     title="PASSGOD API",
@@ -25,7 +42,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Unlock-Token", "X-Resume-Token"],
 )
+# Per-route latency and status counts, exposed on /metrics
+app.add_middleware(MetricsMiddleware)
+# Inert until an admin turns profiling on
+app.add_middleware(ProfilingMiddleware)
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
@@ -34,13 +56,58 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 @app.on_event("startup")
 async def startup_db_client():
     await mongodb.connect()
+    loop_lag_monitor.start()
+    db = mongodb.get_db()
+    await passwords.ensure_indexes(db)
+    await social_accounts.ensure_indexes(db)
+    await search.ensure_indexes(db)
+    await change_feed.ensure_indexes(db)
+    await share.ensure_indexes(db)
+    await activity_notifications.ensure_indexes(db)
+    await notification_retention.ensure_indexes(db)
+    await private_storage.ensure_indexes(db)
+    await unlock_sessions.ensure_indexes(db)
+    await notification_hub.broker.start()
+    await activity_notifications.notification_writer.start()
+    await breach_monitor.breach_alert_writer.start()
+
+    # Background maintenance
+    start_periodic_task("purge_expired_shared_files", 60, share.purge_expired_shared_files)
+    start_periodic_task("sync_unlock_revocations", 5, unlock_sessions.sync_revocations)
+    start_periodic_task("purge_expired_upload_sessions", 300, private_storage.purge_expired_upload_sessions)
+    start_periodic_task("prune_sync_tombstones", 3600, change_feed.prune_tombstones)
+    start_periodic_task(
+        "compact_notifications",
+        notification_retention.NOTIFICATION_COMPACTION_INTERVAL_MINUTES * 60,
+        notification_retention.compact_notifications
+    )
+    start_periodic_task(
+        "purge_read_notifications",
+        notification_retention.NOTIFICATION_COMPACTION_INTERVAL_MINUTES * 60,
+        notification_retention.purge_read_notifications
+    )
+    # Fills in derived fields for entries stored before they existed; a no-op once done
+    start_periodic_task("backfill_derived_fields", BACKFILL_CHECK_INTERVAL_MINUTES * 60, derived_fields_backfill.check)
+    await reencryption_job.resume_if_interrupted()
+    if SLOW_OPERATION_RECORDING:
+        await slow_operation_recorder.start(db)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await stop_periodic_tasks()
+    await reencryption_job.stop()
+    await derived_fields_backfill.stop()
+    await slow_operation_recorder.stop()
+    # Flush buffered notifications before the connection goes away
+    await activity_notifications.notification_writer.stop()
+    await breach_monitor.breach_alert_writer.stop()
+    await notification_hub.broker.stop()
+    await loop_lag_monitor.stop()
+    await request_profiler.stop()
     await mongodb.close()
 
 # Import routers
-from app.routers import auth, passwords, social_accounts, breach_monitor, users, share, admin, activity_notifications
+from app.routers import auth, passwords, social_accounts, breach_monitor, users, share, admin, activity_notifications, private_storage, search, sync, batch
 
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
@@ -51,6 +118,10 @@ app.include_router(users.router, prefix="/api/v1/users", tags=["Users"])
 app.include_router(share.router, prefix="/api/v1/share", tags=["Secure Sharing"])
 app.include_router(admin.router, prefix="/api/v1/admin", tags=["Admin"])
 app.include_router(activity_notifications.router, prefix="/api/v1/notifications", tags=["Activity Notifications"])
+app.include_router(private_storage.router, prefix="/api/v1/private-storage", tags=["Private Storage"])
+app.include_router(search.router, prefix="/api/v1/search", tags=["Search"])
+app.include_router(sync.router, prefix="/api/v1/sync", tags=["Sync"])
+app.include_router(batch.router, prefix="/api/v1/batch", tags=["Batch"])
 
 @app.get("/")
 async def root():
@@ -67,6 +138,44 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Whether this worker should get traffic: Mongo answers, the loop isn't saturated and hashing keeps up"""
+    reasons = []
+
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(mongodb.get_db().command("ping"), timeout=READY_MONGO_TIMEOUT_SECONDS)
+        mongo = {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 3)}
+    except Exception as e:
+        mongo = {"ok": False, "error": str(e) or type(e).__name__}
+        reasons.append("mongo unreachable")
+
+    loop_lag = loop_lag_monitor.percentiles()
+    if loop_lag["p99"] > READY_MAX_LOOP_LAG_MS:
+        reasons.append(f"event loop lag p99 {loop_lag['p99']}ms over {READY_MAX_LOOP_LAG_MS}ms")
+
+    hashing_pool = password_hashing.pool_stats()
+    if hashing_pool["queued"] > READY_MAX_HASHING_QUEUE:
+        reasons.append(f"{hashing_pool['queued']} password hashes queued")
+
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE if reasons else status.HTTP_200_OK,
+        content={
+            "status": "not_ready" if reasons else "ready",
+            "reasons": reasons,
+            "mongo": mongo,
+            "mongo_pools": mongo_pool_metrics.stats(),
+            "event_loop_lag_ms": loop_lag,
+            "hashing_pool": hashing_pool,
+        }
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -79,4 +79,24 @@ class ActivityNotification(MongoBaseModel):
     type: str
     entity_id: Optional[PyObjectId] = None
     is_read: bool = False
-    created_at: datetime = Field(default_factory=datetime.utcnow) 
\ No newline at end of file
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class PrivateStorage(MongoBaseModel):
+    user_id: PyObjectId
+    pattern_hash: Optional[str] = None
+    pin_hash: Optional[str] = None
+    last_accessed: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class PrivateItem(MongoBaseModel):
+    user_id: PyObjectId
+    storage_id: PyObjectId
+    item_type: str # "photo", "document", "note", etc.
+    metadata: Optional[dict] = None
+    blob_id: PyObjectId # GridFS file holding the encrypted content
+    length: int
+    content_type: str = "application/octet-stream"
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
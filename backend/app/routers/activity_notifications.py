@@ -1,16 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
+from pymongo import ASCENDING, DESCENDING
 from pymongo.collection import Collection
 from bson import ObjectId
-from datetime import datetime
+from bson.errors import InvalidId
+from datetime import datetime, timedelta
+import asyncio
+import json
 
-from ..database import get_database
+from ..database import get_database, get_db
 from ..models import User, ActivityNotification, PyObjectId
-from ..schemas import ActivityNotificationResponse, ActivityNotificationCreate
-from .auth import get_current_user
+from ..schemas import (
+    ActivityNotificationResponse, ActivityNotificationCreate, UnreadCountResponse,
+    MarkReadRequest, MarkReadResponse, NotificationDigestResponse
+)
+from ..services.buffered_writer import BufferedWriter
+from ..services.change_feed import SYNC_SETTLE_SECONDS, next_change_seq, stamp_change_seqs
+from ..services.fast_json import json_list_response
+from ..services.field_selection import parse_fields, response_projection, selected_model
+from ..services.notification_counters import add_unread_notifications, adjust_unread_count, get_unread_count
+from ..services.notification_hub import hub, OVERFLOW, NOTIFICATION_COLLECTIONS, build_event, parse_event_id, publish_notification
+from .auth import get_current_user, get_current_user_for_stream, get_user_from_token
 
 router = APIRouter()
 
+# Seconds between keep-alive messages on idle streams
+STREAM_KEEPALIVE_SECONDS = 15
+# Most events replayed when a client resumes from a last event id
+STREAM_REPLAY_LIMIT = 500
+
+async def ensure_indexes(db):
+    await db["activity_notifications"].create_index(
+        [("user_id", ASCENDING), ("is_read", ASCENDING), ("created_at", DESCENDING)]
+    )
+    await db["activity_notifications"].create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+    # Stream replay
+    for collection in NOTIFICATION_COLLECTIONS.values():
+        await db[collection].create_index([("user_id", ASCENDING), ("change_seq", ASCENDING), ("_id", ASCENDING)])
+
+async def _after_notifications_flushed(documents: List[dict]):
+    await add_unread_notifications(get_db(), [document["user_id"] for document in documents])
+    for document in documents:
+        await publish_notification(document["user_id"], "activity_notification", document)
+
+# Coalesces high-volume notification inserts; started and flushed by the app lifecycle
+notification_writer = BufferedWriter(
+    "activity_notifications", before_flush=stamp_change_seqs, after_flush=_after_notifications_flushed
+)
+
 async def create_activity_notification(
     db: Collection,
     user_id: PyObjectId,
@@ -27,30 +65,159 @@ async def create_activity_notification(
         "is_read": False,
         "created_at": datetime.utcnow(),
     }
+
+    if notification_writer.running:
+        # Counter update and publishing happen once the batch is flushed
+        await notification_writer.write(notification_data)
+        return ActivityNotificationResponse(**notification_data)
     
+    notification_data["change_seq"] = await next_change_seq(db, user_id)
     result = await db["activity_notifications"].insert_one(notification_data)
+    await adjust_unread_count(db, user_id, 1)
     created_notification = await db["activity_notifications"].find_one({"_id": result.inserted_id})
     if created_notification is None:
         raise HTTPException(status_code=500, detail="Failed to create activity notification")
+    await publish_notification(user_id, "activity_notification", created_notification)
     return ActivityNotificationResponse(**created_notification)
 
+async def replay_events(db: Collection, user_id: PyObjectId, last_event_id: str) -> List[dict]:
+    """Events stored after last_event_id, in change sequence order, across notifications and alerts.
+
+    Sequence numbers are allocated just before their write lands, so an
+    event numbered below the last one sent may land after it, within
+    SYNC_SETTLE_SECONDS. Those are replayed too, which can resend an event
+    the client already has; clients apply events idempotently.
+    """
+    position = parse_event_id(last_event_id)
+    if position is None:
+        return []
+    after_seq, after_id = position
+    landed_after = after_id.generation_time
+    late = {
+        "$gte": ObjectId.from_datetime(landed_after),
+        "$lt": ObjectId.from_datetime(landed_after + timedelta(seconds=SYNC_SETTLE_SECONDS + 1)),
+    }
+    query_filter = {"user_id": ObjectId(user_id), "$or": [
+        {"change_seq": {"$gt": after_seq}},
+        {"change_seq": after_seq, "_id": {"$gt": after_id}},
+        {"change_seq": {"$lt": after_seq}, "_id": late},
+    ]}
+
+    documents = []
+    for kind, collection in NOTIFICATION_COLLECTIONS.items():
+        cursor = db[collection].find(query_filter).sort([("change_seq", 1), ("_id", 1)]).limit(STREAM_REPLAY_LIMIT)
+        documents.extend([(kind, document) async for document in cursor])
+    # Cut after merging so neither collection's events are skipped past
+    documents.sort(key=lambda row: (row[1].get("change_seq", 0), row[1]["_id"]))
+    return [build_event(kind, document) for kind, document in documents[:STREAM_REPLAY_LIMIT]]
+
+async def notification_events(db: Collection, user_id: PyObjectId, last_event_id: Optional[str]) -> AsyncIterator[Optional[dict]]:
+    """Replayed then live events for one stream; yields None when a keep-alive is due"""
+    queue = hub.subscribe(user_id)
+    try:
+        # Subscribe before replaying so nothing published in between is lost
+        replayed_ids = set()
+        if last_event_id:
+            for event in await replay_events(db, user_id, last_event_id):
+                replayed_ids.add(event["id"])
+                yield event
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if event is OVERFLOW:
+                return
+            if event["id"] in replayed_ids:
+                continue
+            yield event
+    finally:
+        hub.unsubscribe(user_id, queue)
+
 @router.get("/", response_model=List[ActivityNotificationResponse])
 async def get_activity_notifications(
     skip: int = 0,
     limit: int = 100,
     read: Optional[bool] = None,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. message,is_read"),
     db: Collection = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
     """Get all activity notifications for the user"""
+    selected = parse_fields(ActivityNotificationResponse, fields)
     query_filter = {"user_id": ObjectId(current_user.id)}
     if read is not None:
         query_filter["is_read"] = read
         
-    notifications_cursor = db["activity_notifications"].find(query_filter).sort("created_at", -1).skip(skip).limit(limit)
+    notifications_cursor = db["activity_notifications"].find(
+        query_filter, response_projection(ActivityNotificationResponse, selected)
+    ).sort("created_at", -1).skip(skip).limit(limit)
     notifications = await notifications_cursor.to_list(length=limit)
     
-    return [ActivityNotificationResponse(**n) for n in notifications]
+    return json_list_response(selected_model(ActivityNotificationResponse, selected), notifications)
+
+@router.get("/digests", response_model=List[NotificationDigestResponse])
+async def get_notification_digests(
+    skip: int = 0,
+    limit: int = 30,
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Get per-day rollups of notifications and alerts that aged out of the main lists"""
+    digests_cursor = db["notification_digests"].find(
+        {"user_id": ObjectId(current_user.id)}, response_projection(NotificationDigestResponse)
+    ).sort("day", -1).skip(skip).limit(limit)
+    digests = await digests_cursor.to_list(length=limit)
+
+    return json_list_response(NotificationDigestResponse, digests)
+
+@router.get("/stream")
+async def stream_activity_notifications(
+    last_event_id: Optional[str] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user_for_stream)
+):
+    """Server-Sent Events stream of new notifications and breach alerts"""
+    events = notification_events(db, current_user.id, last_event_id_header or last_event_id)
+
+    async def event_stream():
+        async for event in events:
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws")
+async def websocket_activity_notifications(
+    websocket: WebSocket,
+    token: str = Query(...),
+    last_event_id: Optional[str] = Query(None),
+    db: Collection = Depends(get_database)
+):
+    """WebSocket stream of new notifications and breach alerts"""
+    try:
+        current_user = await get_user_from_token(token, db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    try:
+        async for event in notification_events(db, current_user.id, last_event_id):
+            await websocket.send_json(event if event is not None else {"event": "keep-alive"})
+    except WebSocketDisconnect:
+        return
+    # The subscriber fell behind; ask the client to reconnect with its last event id
+    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
 
 @router.put("/{notification_id}/read", response_model=ActivityNotificationResponse)
 async def mark_notification_as_read(
@@ -59,16 +226,68 @@ async def mark_notification_as_read(
     current_user: User = Depends(get_current_user)
 ):
     """Mark an activity notification as read"""
+    notification_filter = {
+        "_id": ObjectId(notification_id),
+        "user_id": ObjectId(current_user.id)
+    }
+    # Only an unread -> read transition touches the counter
     updated_notification = await db["activity_notifications"].find_one_and_update(
-        filter={
-            "_id": ObjectId(notification_id),
-            "user_id": ObjectId(current_user.id)
-        },
-        update={"$set": {"is_read": True}},
+        filter={**notification_filter, "is_read": False},
+        update={"$set": {
+            "is_read": True,
+            "read_at": datetime.utcnow(),
+            "change_seq": await next_change_seq(db, current_user.id),
+        }},
         return_document=True
     )
-    
+    if updated_notification is not None:
+        await adjust_unread_count(db, current_user.id, -1)
+    else:
+        updated_notification = await db["activity_notifications"].find_one(notification_filter)
+
     if updated_notification is None:
         raise HTTPException(status_code=404, detail="Notification not found or not owned by user")
     
-    return ActivityNotificationResponse(**updated_notification) 
\ No newline at end of file
+    return ActivityNotificationResponse(**updated_notification)
+
+@router.get("/unread-count", response_model=UnreadCountResponse)
+async def get_unread_notification_count(
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the number of unread notifications from the maintained counter"""
+    return UnreadCountResponse(unread=await get_unread_count(db, current_user.id))
+
+@router.put("/read-all", response_model=MarkReadResponse)
+async def mark_all_notifications_as_read(
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Mark every unread notification as read"""
+    change_seq = await next_change_seq(db, current_user.id)
+    result = await db["activity_notifications"].update_many(
+        {"user_id": ObjectId(current_user.id), "is_read": False},
+        {"$set": {"is_read": True, "read_at": datetime.utcnow(), "change_seq": change_seq}}
+    )
+    await adjust_unread_count(db, current_user.id, -result.modified_count)
+    return MarkReadResponse(updated=result.modified_count)
+
+@router.put("/read", response_model=MarkReadResponse)
+async def mark_notifications_as_read(
+    payload: MarkReadRequest,
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Mark a list of notifications as read"""
+    try:
+        notification_ids = [ObjectId(notification_id) for notification_id in payload.ids]
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid notification id")
+
+    change_seq = await next_change_seq(db, current_user.id)
+    result = await db["activity_notifications"].update_many(
+        {"_id": {"$in": notification_ids}, "user_id": ObjectId(current_user.id), "is_read": False},
+        {"$set": {"is_read": True, "read_at": datetime.utcnow(), "change_seq": change_seq}}
+    )
+    await adjust_unread_count(db, current_user.id, -result.modified_count)
+    return MarkReadResponse(updated=result.modified_count) 
\ No newline at end of file
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from ..database import get_db
+from pymongo.collection import Collection
+from ..database import get_db, get_database
 from ..models import User, BreachAlert
 from ..schemas import UserAdminResponse
 from .auth import get_current_user
-from typing import List
+from .activity_notifications import notification_writer
+from .breach_monitor import breach_alert_writer
+from ..services.encryption import rewrap_user_keys, dek_cache
+from ..services.derived_fields import BACKFILL_OPS_PER_SECOND, derived_fields_backfill
+from ..services.reencryption import REENCRYPTION_BATCH_SIZE, REENCRYPTION_OPS_PER_SECOND, reencryption_job
+from ..services.slow_operations import SLOW_OPERATIONS_COLLECTION, slow_operation_recorder
+from ..services.request_profiler import PROFILE_DEFAULT_DURATION_SECONDS, PROFILE_MAX_DURATION_SECONDS, PROFILE_SAMPLE_INTERVAL_MS, request_profiler
+from typing import List, Optional
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -30,4 +38,137 @@ def delete_user(user_id: int, db: Session = Depends(get_db), admin: User = Depen
 def get_breaches(db: Session = Depends(get_db), admin: User = Depends(require_admin)):
     return db.query(BreachAlert).all()
 
-# For demo: logs are not implemented, but you can add an AuditLog model and endpoints here. 
\ No newline at end of file
+# For demo: logs are not implemented, but you can add an AuditLog model and endpoints here. 
+
+@router.get("/notification-writers")
+async def get_notification_writer_stats(admin: User = Depends(require_admin)):
+    """Queue depth, flush sizes and queue latency of the buffered notification writers"""
+    return [notification_writer.stats(), breach_alert_writer.stats()]
+
+@router.post("/encryption/rewrap-keys")
+async def rewrap_encryption_keys(admin: User = Depends(require_admin)):
+    """Rewrap every user data key under the current master key (master key rotation)"""
+    return {"rewrapped": await rewrap_user_keys(), "dek_cache_size": len(dek_cache)}
+
+@router.get("/encryption/reencrypt")
+async def get_reencryption_status(admin: User = Depends(require_admin)):
+    """Progress of the secret re-encryption job"""
+    state = await reencryption_job.status()
+    if state is None:
+        raise HTTPException(status_code=404, detail="Re-encryption job has never run")
+    return state
+
+@router.post("/encryption/reencrypt", status_code=status.HTTP_202_ACCEPTED)
+async def start_reencryption(
+    restart: bool = False,
+    batch_size: int = Query(REENCRYPTION_BATCH_SIZE, ge=1, le=10000),
+    target_ops_per_second: int = Query(REENCRYPTION_OPS_PER_SECOND, ge=1),
+    admin: User = Depends(require_admin)
+):
+    """Start, resume or (with restart) start over the secret re-encryption job"""
+    state = await reencryption_job.start(restart=restart, batch_size=batch_size, target_ops_per_second=target_ops_per_second)
+    if state is None:
+        raise HTTPException(status_code=409, detail="Re-encryption job is running on another worker")
+    return state
+
+@router.post("/encryption/reencrypt/pause")
+async def pause_reencryption(admin: User = Depends(require_admin)):
+    await reencryption_job.pause()
+    return await reencryption_job.status()
+
+@router.get("/maintenance/backfill")
+async def get_backfill_status(admin: User = Depends(require_admin)):
+    """Progress of the derived field backfill"""
+    state = await derived_fields_backfill.status()
+    if state is None:
+        raise HTTPException(status_code=404, detail="Backfill has never run")
+    return state
+
+@router.post("/maintenance/backfill", status_code=status.HTTP_202_ACCEPTED)
+async def start_backfill(
+    force: bool = False,
+    target_ops_per_second: int = Query(BACKFILL_OPS_PER_SECOND, ge=1),
+    admin: User = Depends(require_admin)
+):
+    """Backfill derived fields now; force runs again even after a completed pass"""
+    state = await derived_fields_backfill.start(force=force, target_ops_per_second=target_ops_per_second)
+    if state is None:
+        state = await derived_fields_backfill.status()
+        if state is not None and state["status"] == "running":
+            raise HTTPException(status_code=409, detail="Backfill is running on another worker")
+    return state
+
+@router.get("/slow-operations")
+async def get_slow_operations(
+    collection: Optional[str] = None,
+    route: Optional[str] = None,
+    collscan: Optional[bool] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Collection = Depends(get_database),
+    admin: User = Depends(require_admin)
+):
+    """Most recent MongoDB commands that took longer than the slow operation threshold"""
+    query_filter = {}
+    if collection:
+        query_filter["collection"] = collection
+    if route:
+        query_filter["route"] = route
+    if collscan is not None:
+        query_filter["collscan"] = collscan
+    # Capped collections keep insertion order, so $natural descending is newest first
+    operations = await db[SLOW_OPERATIONS_COLLECTION].find(query_filter, {"_id": 0}).sort("$natural", -1).limit(limit).to_list(length=limit)
+    return {"recorder": slow_operation_recorder.stats(), "operations": operations}
+
+@router.get("/slow-operations/summary")
+async def get_slow_operation_summary(
+    limit: int = Query(50, ge=1, le=500),
+    db: Collection = Depends(get_database),
+    admin: User = Depends(require_admin)
+):
+    """Recorded slow operations grouped by query shape, worst total time first"""
+    return await db[SLOW_OPERATIONS_COLLECTION].aggregate([
+        {"$group": {
+            "_id": "$shape_id",
+            "command": {"$first": "$command"},
+            "collection": {"$first": "$collection"},
+            "shape": {"$first": "$shape"},
+            "routes": {"$addToSet": "$route"},
+            "count": {"$sum": 1},
+            "total_ms": {"$sum": "$duration_ms"},
+            "max_ms": {"$max": "$duration_ms"},
+            "plan_stages": {"$last": "$plan_stages"},
+            "collscan": {"$max": "$collscan"},
+            "last_seen": {"$max": "$recorded_at"},
+        }},
+        {"$addFields": {"avg_ms": {"$divide": ["$total_ms", "$count"]}}},
+        {"$sort": {"total_ms": -1}},
+        {"$limit": limit},
+    ]).to_list(length=limit)
+
+@router.get("/profiling")
+async def get_profiling_status(admin: User = Depends(require_admin)):
+    """The running profiling session, if any"""
+    return {"enabled": request_profiler.enabled, "session": request_profiler.status()}
+
+@router.post("/profiling/start")
+async def start_profiling(
+    sample_rate: float = Query(0.01, ge=0, le=1),
+    route: Optional[str] = Query(None, description="Route template or path prefix to profile every request of"),
+    interval_ms: int = Query(PROFILE_SAMPLE_INTERVAL_MS, ge=1, le=1000),
+    duration_seconds: int = Query(PROFILE_DEFAULT_DURATION_SECONDS, ge=1, le=PROFILE_MAX_DURATION_SECONDS),
+    admin: User = Depends(require_admin)
+):
+    """Profile a fraction of requests (or every request to a route, or ones sending the profiling header).
+
+    Profiling stops by itself after duration_seconds; restarting replaces
+    the current session, writing out what it collected.
+    """
+    return await request_profiler.start(sample_rate, route=route, interval_ms=interval_ms, duration_seconds=duration_seconds)
+
+@router.post("/profiling/stop")
+async def stop_profiling(admin: User = Depends(require_admin)):
+    """Stop profiling and write folded stacks per route to the profile directory"""
+    summary = await request_profiler.stop()
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Profiling is not running")
+    return summary
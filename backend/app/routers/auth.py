@@ -1,9 +1,8 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel
 from pymongo.collection import Collection
 from bson import ObjectId # Import ObjectId for MongoDB _id
@@ -11,6 +10,7 @@ from bson import ObjectId # Import ObjectId for MongoDB _id
 from ..database import get_database  # Changed to get_database for MongoDB
 from ..models import User # Ensure this refers to the Pydantic User model
 from ..schemas import UserCreate, UserResponse, Token, TokenData
+from ..services.password_hashing import hash_password_async, verify_password_async
 
 router = APIRouter()
 
@@ -19,14 +19,8 @@ SECRET_KEY = "your-secret-key-here"  # In production, use environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token") # Ensure this matches main.py
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token", auto_error=False)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -38,7 +32,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Collection = Depends(get_database)):
+async def get_user_from_token(token: str, db: Collection) -> User:
+    """Resolve a bearer token to its user, raising 401 if either is invalid"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -49,6 +44,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Collection =
         user_id: str = payload.get("sub") # Changed to user_id
         if user_id is None:
             raise credentials_exception
+        # Scoped tokens (such as private storage unlock tokens) share the
+        # signing key but only grant their own scope, never the whole account
+        if payload.get("scope") is not None:
+            raise credentials_exception
         token_data = TokenData(user_id=user_id) # Changed to user_id
     except JWTError:
         raise credentials_exception
@@ -62,6 +61,25 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Collection =
     user = User(**user_data)
     return user
 
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: Collection = Depends(get_database)):
+    # Sub-requests of a /batch call carry the user the batch already authenticated
+    batch_user = getattr(request.state, "batch_user", None)
+    if batch_user is not None:
+        return batch_user
+    return await get_user_from_token(token, db)
+
+async def get_current_user_for_stream(
+    request: Request,
+    token: Optional[str] = Query(None),
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Collection = Depends(get_database)
+):
+    """Like get_current_user, but also accepts ?token= since EventSource can't set headers"""
+    batch_user = getattr(request.state, "batch_user", None)
+    if batch_user is not None:
+        return batch_user
+    return await get_user_from_token(header_token or token or "", db)
+
 @router.post("/register", response_model=UserResponse)
 async def register_user(user: UserCreate, db: Collection = Depends(get_database)):
     existing_user = await db["users"].find_one({"email": user.email})
@@ -70,7 +88,7 @@ async def register_user(user: UserCreate, db: Collection = Depends(get_database)
             status_code=400,
             detail="Email already registered"
         )
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password_async(user.password)
     
     db_user = User(
         email=user.email,
@@ -96,7 +114,7 @@ async def login_for_access_token(
 ):
     user_data = await db["users"].find_one({"email": form_data.username})
     
-    if not user_data or not verify_password(form_data.password, user_data["hashed_password"]):
+    if not user_data or not await verify_password_async(form_data.password, user_data["hashed_password"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
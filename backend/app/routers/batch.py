@@ -0,0 +1,161 @@
+from fastapi import APIRouter, Depends, Request
+from typing import List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+import asyncio
+import base64
+import codecs
+import json
+import re
+import traceback
+
+from ..models import User
+from ..schemas import BatchRequest, BatchRequestItem, BatchResponse, BatchResponseItem
+from ..services.metrics import Counter, registry, route_label
+from .auth import get_current_user
+
+router = APIRouter()
+
+# Only API routes can be batched, and batches can't nest
+BATCHABLE_PREFIX = "/api/"
+BATCH_PATH = "/api/v1/batch"
+# Sub-requests still running after this long get a 504 (e.g. event streams)
+BATCH_SUBREQUEST_TIMEOUT_SECONDS = 10
+# Outer request headers every sub-request inherits
+INHERITED_HEADERS = {b"authorization", b"accept-language", b"user-agent", b"x-forwarded-for"}
+# RFC 9110 field names, and values without control characters (tab allowed)
+HEADER_NAME_PATTERN = re.compile(r"[!#$%&'*+\-.^_`|~0-9A-Za-z]+")
+HEADER_VALUE_PATTERN = re.compile(r"[\t\x20-\x7e\x80-\xff]*")
+
+batch_subrequest_failures_total = registry.register(Counter(
+    "batch_subrequest_failures_total", "Batched sub-requests that raised instead of responding", ["method", "route"]
+))
+
+def _error(item: BatchRequestItem, status: int, detail: str) -> BatchResponseItem:
+    return BatchResponseItem(id=item.id, status=status, headers={"content-type": "application/json"}, body={"detail": detail})
+
+def _encode_headers(item: BatchRequestItem) -> List[Tuple[bytes, bytes]]:
+    """The item's own headers as ASGI expects them; ValueError names one that can't be sent"""
+    headers = []
+    for name, value in (item.headers or {}).items():
+        if not HEADER_NAME_PATTERN.fullmatch(name):
+            raise ValueError(f"Invalid header name {name!r}")
+        if not HEADER_VALUE_PATTERN.fullmatch(value):
+            raise ValueError(f"Header {name} must be latin-1 text without control characters")
+        if name.lower() != "authorization":
+            headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+    return headers
+
+def _decode_body(content: bytes, content_type: str) -> Tuple[object, Optional[str]]:
+    """A sub-response body as JSON, text or base64, and the encoding flag for base64"""
+    media_type, _, params = content_type.partition(";")
+    media_type = media_type.strip().lower()
+    if media_type == "application/json" or media_type.endswith("+json"):
+        return json.loads(content), None
+    charset = next(
+        (value.strip().strip('"') for name, _, value in (param.partition("=") for param in params.split(";"))
+         if name.strip().lower() == "charset"),
+        None
+    )
+    if media_type.startswith("text/") or charset:
+        try:
+            return content.decode(codecs.lookup(charset or "utf-8").name), None
+        except (LookupError, UnicodeDecodeError):
+            pass
+    # Anything else is passed through unchanged rather than decoded lossily
+    return base64.b64encode(content).decode(), "base64"
+
+def _build_scope(request: Request, item: BatchRequestItem, user: User, body: bytes, item_headers: List[Tuple[bytes, bytes]]) -> dict:
+    url = urlsplit(item.path)
+    headers: List[Tuple[bytes, bytes]] = [
+        (name, value) for name, value in request.scope["headers"] if name in INHERITED_HEADERS
+    ]
+    headers.extend(item_headers)
+    if body:
+        headers.append((b"content-type", b"application/json"))
+        headers.append((b"content-length", str(len(body)).encode()))
+    return {
+        "type": "http",
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": item.method,
+        "scheme": request.scope.get("scheme", "http"),
+        # Routing works on the decoded path, as with requests from the server
+        "path": unquote(url.path),
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "root_path": request.scope.get("root_path", ""),
+        "headers": headers,
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+        # Resolved once for the whole batch; get_current_user picks it up from here
+        "state": {"batch_user": user},
+    }
+
+async def _run_subrequest(request: Request, item: BatchRequestItem, user: User) -> BatchResponseItem:
+    path = unquote(urlsplit(item.path).path)
+    if not path.startswith(BATCHABLE_PREFIX) or path.rstrip("/") == BATCH_PATH:
+        return _error(item, 400, "Path can't be batched")
+    try:
+        item_headers = _encode_headers(item)
+    except ValueError as e:
+        return _error(item, 400, str(e))
+
+    body = json.dumps(item.body).encode() if item.body is not None else b""
+    scope = _build_scope(request, item, user, body, item_headers)
+    body_sent = False
+    finished = asyncio.Event()
+    response = {"status": 500, "headers": {}, "chunks": []}
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {
+                name.decode("latin-1"): value.decode("latin-1") for name, value in message.get("headers", [])
+            }
+        elif message["type"] == "http.response.body":
+            response["chunks"].append(message.get("body", b""))
+
+    try:
+        await asyncio.wait_for(request.app(scope, receive, send), timeout=BATCH_SUBREQUEST_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        return _error(item, 504, "Sub-request timed out")
+    except Exception:
+        # The server error middleware has already sent a 500 before re-raising
+        batch_subrequest_failures_total.inc(item.method, route_label(scope))
+        print(f"Batched {item.method} {path} (item {item.id}) failed:\n{traceback.format_exc()}")
+        if not response["chunks"]:
+            return _error(item, 500, "Internal Server Error")
+    finally:
+        finished.set()
+
+    content = b"".join(response["chunks"])
+    payload, encoding = _decode_body(content, response["headers"].get("content-type", "")) if content else (None, None)
+    response["headers"].pop("content-length", None)
+    return BatchResponseItem(
+        id=item.id, status=response["status"], headers=response["headers"], body=payload, encoding=encoding
+    )
+
+@router.post("/", response_model=BatchResponse)
+async def run_batch(
+    batch: BatchRequest,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """Run several API calls in one round trip, authenticating once.
+
+    Sub-requests run concurrently unless sequential is set, and each reports
+    its own status code; one failing doesn't fail the batch.
+    """
+    if batch.sequential:
+        responses = [await _run_subrequest(request, item, current_user) for item in batch.requests]
+    else:
+        responses = await asyncio.gather(*[_run_subrequest(request, item, current_user) for item in batch.requests])
+    return BatchResponse(responses=responses)
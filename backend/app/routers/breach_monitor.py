@@ -3,61 +3,92 @@ from typing import List, Dict, Any, Optional
 import aiohttp
 import hashlib
 import os
+import time
 from dotenv import load_dotenv
 from pymongo.collection import Collection
 from bson import ObjectId
 from datetime import datetime
 
 from ..database import get_database
+from ..services.buffered_writer import BufferedWriter
+from ..services.change_feed import next_change_seq, stamp_change_seqs
 from ..models import User, Password, SocialAccount, BreachAlert, PyObjectId
 from ..schemas import BreachAlertResponse
 from .auth import get_current_user
-from .passwords import decrypt_password
+from ..services.encryption import decrypt_many
+from ..services.fast_json import json_list_response
+from ..services.field_selection import response_projection
+from ..services.metrics import hibp_request_duration_seconds
+from ..services.notification_hub import publish_notification
 
 router = APIRouter()
 
 # Load environment variables
 load_dotenv()
 HIBP_API_KEY = os.getenv("HIBP_API_KEY", "")
+# Overridable to point at a local stand-in (see benchmarks/fake_hibp.py)
+HIBP_RANGE_API_URL = os.getenv("HIBP_RANGE_API_URL", "https://api.pwnedpasswords.com/range").rstrip("/")
+HIBP_API_URL = os.getenv("HIBP_API_URL", "https://haveibeenpwned.com/api/v3").rstrip("/")
 
 async def check_password_breach(password: str) -> bool:
     """Check if a password has been breached using HaveIBeenPwned API"""
     sha1_hash = hashlib.sha1(password.encode()).hexdigest().upper()
     prefix, suffix = sha1_hash[:5], sha1_hash[5:]
     
-    async with aiohttp.ClientSession() as session:
-        # Removed HIBP_API_KEY from headers for free tier usage
-        headers = {"User-Agent": "PassGod"}
-        async with session.get(
-            f"https://api.pwnedpasswords.com/range/{prefix}",
-            headers=headers
-        ) as response:
-            if response.status == 200:
-                text = await response.text()
-                for line in text.splitlines():
-                    if line.startswith(suffix):
-                        return True
-    return False
+    started = time.perf_counter()
+    status_label = "error" # Kept if the request never got a response
+    try:
+        async with aiohttp.ClientSession() as session:
+            # Removed HIBP_API_KEY from headers for free tier usage
+            headers = {"User-Agent": "PassGod"}
+            async with session.get(
+                f"{HIBP_RANGE_API_URL}/{prefix}",
+                headers=headers
+            ) as response:
+                status_label = str(response.status)
+                if response.status == 200:
+                    text = await response.text()
+                    for line in text.splitlines():
+                        if line.startswith(suffix):
+                            return True
+        return False
+    finally:
+        hibp_request_duration_seconds.observe(time.perf_counter() - started, "range", status_label)
 
 async def check_email_breach_api(email: str) -> List[Dict[str, Any]]: # Renamed to avoid conflict
     """Check if an email has been involved in any breaches"""
-    async with aiohttp.ClientSession() as session:
-        # Removed HIBP_API_KEY from headers for free tier usage
-        headers = {"User-Agent": "PassGod"}
-        async with session.get(
-            f"https://haveibeenpwned.com/api/v3/breachedaccount/{email}",
-            headers=headers
-        ) as response:
-            if response.status == 200:
-                return await response.json()
-            elif response.status == 404:
-                return [] # Email not found in any breaches
-            elif response.status == 429: # Too Many Requests
-                print("Rate limit hit for HIBP API. Please wait before retrying.")
-                return []
-            else:
-                response.raise_for_status() # Raise an exception for other HTTP errors
-    return []
+    started = time.perf_counter()
+    status_label = "error" # Kept if the request never got a response
+    try:
+        async with aiohttp.ClientSession() as session:
+            # Removed HIBP_API_KEY from headers for free tier usage
+            headers = {"User-Agent": "PassGod"}
+            async with session.get(
+                f"{HIBP_API_URL}/breachedaccount/{email}",
+                headers=headers
+            ) as response:
+                status_label = str(response.status)
+                if response.status == 200:
+                    return await response.json()
+                elif response.status == 404:
+                    return [] # Email not found in any breaches
+                elif response.status == 429: # Too Many Requests
+                    print("Rate limit hit for HIBP API. Please wait before retrying.")
+                    return []
+                else:
+                    response.raise_for_status() # Raise an exception for other HTTP errors
+        return []
+    finally:
+        hibp_request_duration_seconds.observe(time.perf_counter() - started, "breachedaccount", status_label)
+
+async def _after_breach_alerts_flushed(documents: List[dict]):
+    for document in documents:
+        await publish_notification(document["user_id"], "breach_alert", document)
+
+# Coalesces alert inserts from bulk scans; started and flushed by the app lifecycle
+breach_alert_writer = BufferedWriter(
+    "breach_alerts", before_flush=stamp_change_seqs, after_flush=_after_breach_alerts_flushed
+)
 
 async def create_breach_alert(
     db: Collection,
@@ -76,11 +107,18 @@ async def create_breach_alert(
         "created_at": datetime.utcnow(),
         "breach_date": datetime.utcnow(), # Placeholder for now, can be actual breach date if available
     }
+
+    if breach_alert_writer.running:
+        await breach_alert_writer.write(alert_data)
+        return BreachAlertResponse(**alert_data)
     
+    # Orders the alert among the user's stream events
+    alert_data["change_seq"] = await next_change_seq(db, user_id)
     result = await db["breach_alerts"].insert_one(alert_data)
     created_alert = await db["breach_alerts"].find_one({"_id": result.inserted_id})
     if created_alert is None:
         raise HTTPException(status_code=500, detail="Failed to create breach alert")
+    await publish_notification(user_id, "breach_alert", created_alert)
     return BreachAlertResponse(**created_alert)
 
 @router.post("/check-passwords", response_model=List[BreachAlertResponse])
@@ -95,10 +133,10 @@ async def check_passwords_for_breach(
     # Check regular passwords
     passwords_cursor = db["passwords"].find({"user_id": ObjectId(current_user.id)})
     passwords_list = await passwords_cursor.to_list(length=None) # Get all passwords
+    passwords = [Password(**password_data) for password_data in passwords_list] # Convert dicts to Pydantic models
+    decrypted_passwords = await decrypt_many(db, current_user.id, [password.encrypted_password for password in passwords])
 
-    for password_data in passwords_list:
-        password = Password(**password_data) # Convert dict to Pydantic model
-        decrypted_password = decrypt_password(password.encrypted_password)
+    for password, decrypted_password in zip(passwords, decrypted_passwords):
         if await check_password_breach(decrypted_password):
             alert = await create_breach_alert(
                 db,
@@ -112,10 +150,10 @@ async def check_passwords_for_breach(
     # Check social media passwords
     social_accounts_cursor = db["social_accounts"].find({"user_id": ObjectId(current_user.id)})
     social_accounts_list = await social_accounts_cursor.to_list(length=None) # Get all social accounts
+    accounts = [SocialAccount(**account_data) for account_data in social_accounts_list] # Convert dicts to Pydantic models
+    decrypted_passwords = await decrypt_many(db, current_user.id, [account.encrypted_password for account in accounts])
 
-    for account_data in social_accounts_list:
-        account = SocialAccount(**account_data) # Convert dict to Pydantic model
-        decrypted_password = decrypt_password(account.encrypted_password)
+    for account, decrypted_password in zip(accounts, decrypted_passwords):
         if await check_password_breach(decrypted_password):
             alert = await create_breach_alert(
                 db,
@@ -163,10 +201,10 @@ async def get_breach_alerts(
     if resolved is not None:
         query_filter["is_resolved"] = resolved
         
-    alerts_cursor = db["breach_alerts"].find(query_filter).sort("created_at", -1).skip(skip).limit(limit)
+    alerts_cursor = db["breach_alerts"].find(query_filter, response_projection(BreachAlertResponse)).sort("created_at", -1).skip(skip).limit(limit)
     alerts = await alerts_cursor.to_list(length=limit)
     
-    return [BreachAlertResponse(**a) for a in alerts]
+    return json_list_response(BreachAlertResponse, alerts)
 
 @router.put("/alerts/{alert_id}/resolve", response_model=BreachAlertResponse)
 async def resolve_breach_alert(
@@ -180,7 +218,7 @@ async def resolve_breach_alert(
             "_id": ObjectId(alert_id),
             "user_id": ObjectId(current_user.id)
         },
-        update={"$set": {"is_resolved": True}},
+        update={"$set": {"is_resolved": True, "resolved_at": datetime.utcnow()}},
         return_document=True
     )
     
@@ -1,41 +1,35 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-from cryptography.fernet import Fernet
-import os
-from dotenv import load_dotenv, set_key
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from typing import List, Optional
 from pymongo.collection import Collection
 from bson import ObjectId
+from pymongo import ASCENDING
 from datetime import datetime
 
 from ..database import get_database # Changed to get_database for MongoDB
 from ..models import User, Password # User and Password models from Pydantic
-from ..schemas import PasswordCreate, PasswordResponse
+from ..schemas import PasswordCreate, PasswordResponse, PasswordHealthResponse
+from ..services.encryption import KEY_SCHEME, encrypt_for_user, fingerprint_secret
+from ..services.password_strength import STRENGTH_SCORE_VERSION, score_password
+from ..services.public_suffix import PUBLIC_SUFFIX_LIST_VERSION, registrable_domain
+from ..services.search_index import build_search_tokens, refresh_search_tokens
+from ..services.change_feed import get_vault_version, next_change_seq, record_deletion
+from ..services.conditional_requests import conditional_response, vault_etag
+from ..services.fast_json import json_list_response
+from ..services.field_selection import parse_fields, response_projection, selected_model
 from .auth import get_current_user # Assuming get_current_user now works with MongoDB
 
 router = APIRouter()
 
-# Load encryption key from environment variable or generate a new one
-load_dotenv(override=True) # Ensure .env is loaded and can be overridden
-ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
+# Scores at or below this count as weak in the health report
+WEAK_STRENGTH_SCORE = 1
 
-# If ENCRYPTION_KEY is not set, generate one and save it to .env
-if not ENCRYPTION_KEY:
-    ENCRYPTION_KEY = Fernet.generate_key().decode()
-    env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
-    # Ensure the .env file exists before trying to set the key
-    if not os.path.exists(env_path):
-        with open(env_path, "w") as f:
-            f.write("")
-    set_key(env_path, "ENCRYPTION_KEY", ENCRYPTION_KEY)
-    print(f"Generated new ENCRYPTION_KEY and saved to {env_path}")
-
-cipher_suite = Fernet(ENCRYPTION_KEY.encode())
-
-def encrypt_password(password: str) -> str:
-    return cipher_suite.encrypt(password.encode()).decode()
-
-def decrypt_password(encrypted_password: str) -> str:
-    return cipher_suite.decrypt(encrypted_password.encode()).decode()
+async def ensure_indexes(db):
+    # Reuse detection groups a user's secrets by fingerprint
+    await db["passwords"].create_index([("user_id", ASCENDING), ("password_fingerprint", ASCENDING)])
+    # Weak password views filter on the score stored at write time
+    await db["passwords"].create_index([("user_id", ASCENDING), ("strength_score", ASCENDING)])
+    # Autofill looks credentials up by site
+    await db["passwords"].create_index([("user_id", ASCENDING), ("website_domain", ASCENDING)])
 
 @router.post("/", response_model=PasswordResponse)
 async def create_password(
@@ -43,10 +37,18 @@ async def create_password(
     db: Collection = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    encrypted_password = encrypt_password(password_data.password)
+    encrypted_password = await encrypt_for_user(db, current_user.id, password_data.password)
     
     password_dict = password_data.model_dump(exclude={'password'})
     password_dict["encrypted_password"] = encrypted_password
+    password_dict["key_scheme"] = KEY_SCHEME
+    password_dict["password_fingerprint"] = fingerprint_secret(current_user.id, password_data.password)
+    password_dict["strength_score"] = score_password(password_data.password)
+    password_dict["strength_version"] = STRENGTH_SCORE_VERSION
+    password_dict["website_domain"] = registrable_domain(password_data.website_url)
+    password_dict["website_domain_version"] = PUBLIC_SUFFIX_LIST_VERSION
+    password_dict["search_tokens"] = build_search_tokens(password_dict)
+    password_dict["change_seq"] = await next_change_seq(db, current_user.id, vault_change=True)
     password_dict["user_id"] = ObjectId(current_user.id)
     password_dict["created_at"] = datetime.utcnow()
     password_dict["updated_at"] = datetime.utcnow()
@@ -61,15 +63,89 @@ async def create_password(
 
 @router.get("/", response_model=List[PasswordResponse])
 async def read_passwords(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    max_strength: Optional[int] = Query(None, ge=0, le=4),
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. title,website_url"),
     db: Collection = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
-    passwords_cursor = db["passwords"].find({"user_id": ObjectId(current_user.id)}).skip(skip).limit(limit)
+    selected = parse_fields(PasswordResponse, fields)
+    # Unchanged since the client's copy: answer from the version counter alone
+    version = await get_vault_version(db, current_user.id)
+    etag = None if version is None else vault_etag(
+        "passwords", current_user.id, version, selected, skip=skip, limit=limit, max_strength=max_strength
+    )
+    not_modified = conditional_response(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
+    query_filter = {"user_id": ObjectId(current_user.id)}
+    if max_strength is not None:
+        query_filter["strength_score"] = {"$lte": max_strength}
+    passwords_cursor = db["passwords"].find(query_filter, response_projection(PasswordResponse, selected)).skip(skip).limit(limit)
     passwords = await passwords_cursor.to_list(length=limit) # Use to_list with length
     
-    return [PasswordResponse(**p) for p in passwords]
+    return json_list_response(selected_model(PasswordResponse, selected), passwords, headers=response.headers)
+
+@router.get("/health", response_model=PasswordHealthResponse)
+async def read_password_health(
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Report reused and weak passwords from fingerprints and scores stored at write time, without decrypting anything"""
+    user_id = ObjectId(current_user.id)
+    fingerprinted = {"user_id": user_id, "password_fingerprint": {"$type": "string"}}
+    groups = await db["passwords"].aggregate([
+        {"$match": fingerprinted},
+        {"$project": {"password_fingerprint": 1, "title": 1, "kind": {"$literal": "password"}}},
+        {"$unionWith": {"coll": "social_accounts", "pipeline": [
+            {"$match": fingerprinted},
+            {"$project": {"password_fingerprint": 1, "title": "$platform", "kind": {"$literal": "social_account"}}},
+        ]}},
+        {"$group": {
+            "_id": "$password_fingerprint",
+            "count": {"$sum": 1},
+            "entries": {"$push": {"id": "$_id", "kind": "$kind", "title": "$title"}},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$sort": {"count": -1}},
+    ]).to_list(length=None)
+
+    weak = {"user_id": user_id, "strength_score": {"$lte": WEAK_STRENGTH_SCORE}}
+    weak_entries = await db["passwords"].count_documents(weak) + await db["social_accounts"].count_documents(weak)
+
+    unfingerprinted = {"user_id": user_id, "password_fingerprint": {"$exists": False}}
+    unfingerprinted_entries = (
+        await db["passwords"].count_documents(unfingerprinted)
+        + await db["social_accounts"].count_documents(unfingerprinted)
+    )
+    return PasswordHealthResponse(
+        reused_entries=sum(group["count"] for group in groups),
+        reuse_groups=[{"count": group["count"], "entries": group["entries"]} for group in groups],
+        weak_entries=weak_entries,
+        unfingerprinted_entries=unfingerprinted_entries
+    )
+
+@router.get("/match", response_model=List[PasswordResponse])
+async def match_passwords(
+    url: str,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. title,username"),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Credentials saved for the site a URL belongs to, for autofill"""
+    selected = parse_fields(PasswordResponse, fields)
+    website_domain = registrable_domain(url)
+    if website_domain is None:
+        raise HTTPException(status_code=400, detail="Could not determine a site from url")
+    passwords = await db["passwords"].find({
+        "user_id": ObjectId(current_user.id),
+        "website_domain": website_domain
+    }, response_projection(PasswordResponse, selected)).to_list(length=None)
+    return json_list_response(selected_model(PasswordResponse, selected), passwords)
 
 @router.get("/{password_id}", response_model=PasswordResponse)
 async def read_password(
@@ -80,7 +156,7 @@ async def read_password(
     password_data = await db["passwords"].find_one({
         "_id": ObjectId(password_id),
         "user_id": ObjectId(current_user.id)
-    })
+    }, response_projection(PasswordResponse))
     
     if password_data is None:
         raise HTTPException(status_code=404, detail="Password not found")
@@ -96,9 +172,17 @@ async def update_password(
 ):
     # Prepare update data
     update_fields = password_data.model_dump(exclude={'password'}, exclude_unset=True)
+    if "website_url" in update_fields:
+        update_fields["website_domain"] = registrable_domain(update_fields["website_url"])
+        update_fields["website_domain_version"] = PUBLIC_SUFFIX_LIST_VERSION
     if password_data.password: # Only update password if provided
-        update_fields["encrypted_password"] = encrypt_password(password_data.password)
+        update_fields["encrypted_password"] = await encrypt_for_user(db, current_user.id, password_data.password)
+        update_fields["key_scheme"] = KEY_SCHEME
+        update_fields["password_fingerprint"] = fingerprint_secret(current_user.id, password_data.password)
+        update_fields["strength_score"] = score_password(password_data.password)
+        update_fields["strength_version"] = STRENGTH_SCORE_VERSION
     update_fields["updated_at"] = datetime.utcnow()
+    update_fields["change_seq"] = await next_change_seq(db, current_user.id, vault_change=True)
 
     # Find and update the password
     updated_password = await db["passwords"].find_one_and_update(
@@ -113,6 +197,8 @@ async def update_password(
     if updated_password is None:
         raise HTTPException(status_code=404, detail="Password not found or not owned by user")
     
+    # Unset fields keep their stored values, so tokens are rebuilt from the updated document
+    await refresh_search_tokens(db["passwords"], updated_password)
     return PasswordResponse(**updated_password)
 
 @router.delete("/{password_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -129,4 +215,5 @@ async def delete_password(
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Password not found or not owned by user")
     
+    await record_deletion(db, current_user.id, "password", password_id)
     return None 
\ No newline at end of file
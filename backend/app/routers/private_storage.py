@@ -1,86 +1,225 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
 from typing import List, Optional
-from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from pymongo.collection import Collection
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
+from bson import Binary, ObjectId
+from datetime import datetime, timedelta
+import hashlib
 import json
+import math
+import os
 
-from ..api import deps
-from app.models.private_storage import PrivateStorage, PrivateItem
-from app.schemas.private_storage import (
-    PrivateStorageCreate,
-    PrivateStorageUpdate,
+from ..database import get_database, get_db
+from ..models import User
+from ..schemas import (
+    PrivateStorageSetup,
+    PrivateStorageUnlock,
+    PrivateStorageStatusResponse,
+    PrivateStorageUnlockResponse,
     PrivateItemCreate,
     PrivateItemResponse,
-    PatternLockCreate,
-    PinLockCreate
+    UploadSessionCreate,
+    UploadSessionResponse
 )
-from app.core.security import verify_password, get_password_hash
+from ..services.gridfs_streaming import upload_request_body, gridfs_download_response
+from ..services.unlock_sessions import (
+    create_unlock_token,
+    validate_unlock_token,
+    refresh_unlock_token,
+    revoke_unlock_token
+)
+from .auth import get_current_user
+from ..services.password_hashing import hash_password_async, verify_password_async
 
 router = APIRouter()
 
-@router.get("/status")
-def get_private_storage_status(
-    *,
-    db: Session = Depends(deps.get_db),
-    current_user = Depends(deps.get_current_user),
+# Encrypted photos and documents are kept in GridFS; private_items only holds
+# their metadata so listing a vault never touches the blobs.
+PRIVATE_BLOBS_BUCKET = "private_blobs"
+MAX_PRIVATE_ITEM_SIZE = int(os.getenv("MAX_PRIVATE_ITEM_SIZE", str(2 * 1024 * 1024 * 1024)))
+# Resumable upload sessions expire after this long without receiving a chunk
+UPLOAD_SESSION_TTL_MINUTES = int(os.getenv("UPLOAD_SESSION_TTL_MINUTES", str(24 * 60)))
+
+def get_private_blobs_bucket(db) -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db, bucket_name=PRIVATE_BLOBS_BUCKET)
+
+async def ensure_indexes(db):
+    await db["private_storage"].create_index([("user_id", ASCENDING)], unique=True)
+    await db["private_items"].create_index(
+        [("user_id", ASCENDING), ("item_type", ASCENDING), ("created_at", DESCENDING)]
+    )
+    await db["private_items"].create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+    # One item per blob, which also makes completing an upload idempotent
+    await db["private_items"].create_index([("blob_id", ASCENDING)], unique=True)
+    await db["private_upload_sessions"].create_index([("expires_at", ASCENDING)])
+    # Resumable uploads write GridFS chunks directly, so make sure the
+    # index the driver would normally create on first upload exists.
+    await db[f"{PRIVATE_BLOBS_BUCKET}.chunks"].create_index(
+        [("files_id", ASCENDING), ("n", ASCENDING)], unique=True
+    )
+
+async def require_unlocked_storage(
+    response: Response,
+    unlock_token: Optional[str] = Header(None, alias="X-Unlock-Token"),
+    current_user: User = Depends(get_current_user)
+) -> dict:
+    """Check the unlock session in memory and slide its idle window forward.
+
+    The refreshed token is returned in the X-Unlock-Token response header;
+    clients should use it for their next call.
+    """
+    claims = validate_unlock_token(unlock_token, current_user.id) if unlock_token else None
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Private storage is locked or not found"
+        )
+    response.headers["X-Unlock-Token"] = refresh_unlock_token(claims)["unlock_token"]
+    return {"_id": ObjectId(claims["sid"]), "user_id": ObjectId(claims["sub"]), "claims": claims}
+
+async def get_owned_item(db: Collection, current_user: User, item_id: str) -> dict:
+    item = await db["private_items"].find_one({
+        "_id": ObjectId(item_id),
+        "user_id": ObjectId(current_user.id)
+    })
+    if not item:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Item not found"
+        )
+    return item
+
+async def insert_private_item(
+    db: Collection,
+    storage: dict,
+    blob_id,
+    length: int,
+    item_type: str,
+    metadata: Optional[dict],
+    content_type: str
+) -> dict:
+    """Record the metadata of a blob that has already been written to GridFS"""
+    now = datetime.utcnow()
+    item_data = {
+        "user_id": storage["user_id"],
+        "storage_id": storage["_id"],
+        "item_type": item_type,
+        "metadata": metadata,
+        "blob_id": blob_id,
+        "length": length,
+        "content_type": content_type,
+        "created_at": now,
+        "updated_at": now,
+    }
+    try:
+        result = await db["private_items"].insert_one(item_data)
+    except DuplicateKeyError:
+        raise # The blob already belongs to an item
+    except Exception:
+        await get_private_blobs_bucket(db).delete(blob_id)
+        raise
+    item_data["_id"] = result.inserted_id
+    return item_data
+
+async def get_owned_upload_session(db: Collection, current_user: User, upload_id: str) -> dict:
+    session = await db["private_upload_sessions"].find_one({
+        "_id": ObjectId(upload_id),
+        "user_id": ObjectId(current_user.id),
+        "expires_at": {"$gt": datetime.utcnow()}
+    })
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found or expired"
+        )
+    return session
+
+async def discard_upload_session(db: Collection, session: dict):
+    # A session left behind by an interrupted /complete already owns a file; keep its chunks
+    if await db[f"{PRIVATE_BLOBS_BUCKET}.files"].find_one({"_id": session["blob_id"]}, {"_id": 1}) is None:
+        await db[f"{PRIVATE_BLOBS_BUCKET}.chunks"].delete_many({"files_id": session["blob_id"]})
+    await db["private_upload_sessions"].delete_one({"_id": session["_id"]})
+
+async def purge_expired_upload_sessions(db=None) -> int:
+    """Drop abandoned resumable uploads together with the chunks they already wrote"""
+    db = db if db is not None else get_db()
+    purged = 0
+    async for session in db["private_upload_sessions"].find({"expires_at": {"$lte": datetime.utcnow()}}):
+        await discard_upload_session(db, session)
+        purged += 1
+    return purged
+
+@router.get("/status", response_model=PrivateStorageStatusResponse)
+async def get_private_storage_status(
+    unlock_token: Optional[str] = Header(None, alias="X-Unlock-Token"),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
 ):
     """Get the status of private storage for the current user"""
-    storage = db.query(PrivateStorage).filter(PrivateStorage.user_id == current_user.id).first()
+    storage = await db["private_storage"].find_one({"user_id": ObjectId(current_user.id)})
 
     if not storage:
-        return {"is_initialized": False, "is_locked": True}
-    
-    return {"is_initialized": True, "is_locked": storage.is_locked}
-
-@router.post("/setup", response_model=PrivateStorageCreate)
-def setup_private_storage(
-    *,
-    db: Session = Depends(deps.get_db),
-    current_user = Depends(deps.get_current_user),
-    pattern: Optional[PatternLockCreate] = None,
-    pin: Optional[PinLockCreate] = None
+        return PrivateStorageStatusResponse(is_initialized=False, is_locked=True)
+
+    is_unlocked = bool(unlock_token) and validate_unlock_token(unlock_token, current_user.id) is not None
+    return PrivateStorageStatusResponse(is_initialized=True, is_locked=not is_unlocked)
+
+@router.post("/setup", response_model=PrivateStorageStatusResponse, status_code=status.HTTP_201_CREATED)
+async def setup_private_storage(
+    lock: PrivateStorageSetup,
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
 ):
     """Setup private storage with either pattern or PIN lock"""
-    if not pattern and not pin:
+    if not lock.pattern and not lock.pin:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Either pattern or PIN must be provided"
         )
-    
-    storage = PrivateStorage(
-        user_id=current_user.id,
-        pattern_hash=get_password_hash(pattern.pattern) if pattern else None,
-        pin_hash=get_password_hash(pin.pin) if pin else None
-    )
-    db.add(storage)
-    db.commit()
-    db.refresh(storage)
-    return storage
-
-@router.post("/unlock")
-def unlock_private_storage(
-    *,
-    db: Session = Depends(deps.get_db),
-    current_user = Depends(deps.get_current_user),
-    pattern: Optional[str] = None,
-    pin: Optional[str] = None
+    if await db["private_storage"].find_one({"user_id": ObjectId(current_user.id)}):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Private storage is already set up"
+        )
+
+    await db["private_storage"].insert_one({
+        "user_id": ObjectId(current_user.id),
+        "pattern_hash": await hash_password_async(lock.pattern) if lock.pattern else None,
+        "pin_hash": await hash_password_async(lock.pin) if lock.pin else None,
+        "last_accessed": datetime.utcnow(),
+        "created_at": datetime.utcnow(),
+    })
+    return PrivateStorageStatusResponse(is_initialized=True, is_locked=True)
+
+@router.post("/unlock", response_model=PrivateStorageUnlockResponse)
+async def unlock_private_storage(
+    unlock: PrivateStorageUnlock,
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
 ):
-    """Unlock private storage with pattern or PIN"""
-    storage = db.query(PrivateStorage).filter(PrivateStorage.user_id == current_user.id).first()
+    """Unlock private storage with pattern or PIN.
+
+    Returns a short-lived unlock token to send as X-Unlock-Token on item
+    operations; storage relocks by itself once the token goes idle.
+    """
+    storage = await db["private_storage"].find_one({"user_id": ObjectId(current_user.id)})
     if not storage:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Private storage not found"
         )
-    
-    if pattern and storage.pattern_hash:
-        if not verify_password(pattern, storage.pattern_hash):
+
+    if unlock.pattern and storage.get("pattern_hash"):
+        if not await verify_password_async(unlock.pattern, storage["pattern_hash"]):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid pattern"
             )
-    elif pin and storage.pin_hash:
-        if not verify_password(pin, storage.pin_hash):
+    elif unlock.pin and storage.get("pin_hash"):
+        if not await verify_password_async(unlock.pin, storage["pin_hash"]):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid PIN"
@@ -90,98 +229,336 @@ def unlock_private_storage(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid unlock method"
         )
-    
-    storage.is_locked = False
-    storage.last_accessed = datetime.utcnow()
-    db.commit()
-    return {"message": "Storage unlocked successfully"}
-
-@router.post("/items", response_model=PrivateItemResponse)
-def create_private_item(
-    *,
-    db: Session = Depends(deps.get_db),
-    current_user = Depends(deps.get_current_user),
-    item: PrivateItemCreate
+
+    await db["private_storage"].update_one(
+        {"_id": storage["_id"]},
+        {"$set": {"last_accessed": datetime.utcnow()}}
+    )
+    return PrivateStorageUnlockResponse(**create_unlock_token(current_user.id, storage["_id"]))
+
+@router.post("/lock", status_code=status.HTTP_204_NO_CONTENT)
+async def lock_private_storage(
+    storage: dict = Depends(require_unlocked_storage)
 ):
-    """Create a new private item"""
-    storage = db.query(PrivateStorage).filter(
-        PrivateStorage.user_id == current_user.id,
-        PrivateStorage.is_locked == False
-    ).first()
-    
-    if not storage:
+    """Lock private storage again, ending the current unlock session"""
+    await revoke_unlock_token(storage["claims"])
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.post("/items", response_model=PrivateItemResponse, status_code=status.HTTP_201_CREATED)
+async def create_private_item(
+    item: PrivateItemCreate,
+    storage: dict = Depends(require_unlocked_storage),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Create a small private item from a JSON body (use /items/upload for files)"""
+
+    content = item.encrypted_data.encode()
+    blob_id = await get_private_blobs_bucket(db).upload_from_stream(
+        item.item_type, content, metadata={"user_id": storage["user_id"]}
+    )
+    private_item = await insert_private_item(
+        db, storage, blob_id, len(content), item.item_type, item.metadata, "text/plain"
+    )
+    return PrivateItemResponse(**private_item)
+
+@router.post("/items/upload", response_model=PrivateItemResponse, status_code=status.HTTP_201_CREATED)
+async def upload_private_item(
+    request: Request,
+    item_type: str,
+    metadata: Optional[str] = None,
+    storage: dict = Depends(require_unlocked_storage),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Create a private item by streaming the encrypted file as the raw request body.
+
+    `metadata` is an optional JSON object passed as a query parameter.
+    """
+    # Checked before the body is streamed so a bad request never leaves a blob behind
+    invalid_metadata = HTTPException(status_code=400, detail="metadata must be a JSON object")
+    try:
+        item_metadata = json.loads(metadata) if metadata else None
+    except (ValueError, RecursionError):
+        raise invalid_metadata
+    if item_metadata is not None and not isinstance(item_metadata, dict):
+        raise invalid_metadata
+
+    content_type = request.headers.get("content-type", "application/octet-stream")
+    blob_id, length = await upload_request_body(
+        get_private_blobs_bucket(db),
+        request,
+        item_type,
+        {"user_id": storage["user_id"]},
+        max_size=MAX_PRIVATE_ITEM_SIZE
+    )
+    private_item = await insert_private_item(
+        db, storage, blob_id, length, item_type, item_metadata, content_type
+    )
+    return PrivateItemResponse(**private_item)
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    upload: UploadSessionCreate,
+    storage: dict = Depends(require_unlocked_storage),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Start a resumable upload of a large encrypted item.
+
+    The client then sends chunks 0..total_chunks-1 in order with
+    PUT /uploads/{id}/chunks/{n}; every chunk except the last must be exactly
+    chunk_size bytes. Each chunk is written straight into the blob store as a
+    GridFS chunk, so the file is never assembled in memory.
+    """
+    if upload.total_size > MAX_PRIVATE_ITEM_SIZE:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Private storage is locked or not found"
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds the maximum size of {MAX_PRIVATE_ITEM_SIZE} bytes"
+        )
+
+    session_data = {
+        "user_id": storage["user_id"],
+        "storage_id": storage["_id"],
+        "blob_id": ObjectId(),
+        "item_type": upload.item_type,
+        "metadata": upload.metadata,
+        "content_type": upload.content_type,
+        "total_size": upload.total_size,
+        "chunk_size": upload.chunk_size,
+        "total_chunks": math.ceil(upload.total_size / upload.chunk_size),
+        "next_chunk": 0,
+        "received_bytes": 0,
+        "last_chunk_sha256": None,
+        "created_at": datetime.utcnow(),
+        "expires_at": datetime.utcnow() + timedelta(minutes=UPLOAD_SESSION_TTL_MINUTES),
+    }
+    result = await db["private_upload_sessions"].insert_one(session_data)
+    session_data["_id"] = result.inserted_id
+    return UploadSessionResponse(**session_data)
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload_session(
+    upload_id: str,
+    storage: dict = Depends(require_unlocked_storage),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Get the server-side offset of an upload so the client knows where to resume"""
+    return UploadSessionResponse(**await get_owned_upload_session(db, current_user, upload_id))
+
+@router.put("/uploads/{upload_id}/chunks/{chunk_number}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    chunk_number: int,
+    request: Request,
+    chunk_sha256: str = Header(..., alias="X-Chunk-SHA256"),
+    storage: dict = Depends(require_unlocked_storage),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Append one chunk (raw body) to an upload; the X-Chunk-SHA256 header must match it"""
+    session = await get_owned_upload_session(db, current_user, upload_id)
+    chunk_sha256 = chunk_sha256.lower()
+
+    if chunk_number == session["next_chunk"] - 1 and chunk_sha256 == session["last_chunk_sha256"]:
+        # Retry of a chunk whose response was lost; it is already stored
+        return UploadSessionResponse(**session)
+    if chunk_number != session["next_chunk"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Expected chunk {session['next_chunk']}"
+        )
+
+    if chunk_number == session["total_chunks"] - 1:
+        expected_size = session["total_size"] - chunk_number * session["chunk_size"]
+    else:
+        expected_size = session["chunk_size"]
+    try:
+        declared_size = int(request.headers.get("content-length") or expected_size)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Content-Length header"
         )
-    
-    private_item = PrivateItem(
-        storage_id=storage.id,
-        item_type=item.item_type,
-        encrypted_data=item.encrypted_data,
-        metadata=json.dumps(item.metadata) if item.metadata else None
+    if declared_size > expected_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Chunk {chunk_number} must be {expected_size} bytes"
+        )
+
+    # Read incrementally: without a Content-Length the body size is only known as it arrives
+    data = bytearray()
+    async for piece in request.stream():
+        data += piece
+        if len(data) > expected_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Chunk {chunk_number} must be {expected_size} bytes"
+            )
+    data = bytes(data)
+    if len(data) != expected_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Chunk {chunk_number} must be {expected_size} bytes"
+        )
+    if hashlib.sha256(data).hexdigest() != chunk_sha256:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Chunk checksum mismatch"
+        )
+
+    await db[f"{PRIVATE_BLOBS_BUCKET}.chunks"].replace_one(
+        {"files_id": session["blob_id"], "n": chunk_number},
+        {"files_id": session["blob_id"], "n": chunk_number, "data": Binary(data)},
+        upsert=True
+    )
+    # Only advance from the offset we validated against, in case of a concurrent retry
+    updated_session = await db["private_upload_sessions"].find_one_and_update(
+        {"_id": session["_id"], "next_chunk": chunk_number},
+        {
+            "$inc": {"next_chunk": 1, "received_bytes": len(data)},
+            "$set": {
+                "last_chunk_sha256": chunk_sha256,
+                "expires_at": datetime.utcnow() + timedelta(minutes=UPLOAD_SESSION_TTL_MINUTES),
+            }
+        },
+        return_document=ReturnDocument.AFTER
     )
-    
-    db.add(private_item)
-    db.commit()
-    db.refresh(private_item)
-    return private_item
+    if updated_session is None:
+        updated_session = await get_owned_upload_session(db, current_user, upload_id)
+    return UploadSessionResponse(**updated_session)
 
-@router.get("/items", response_model=List[PrivateItemResponse])
-def get_private_items(
-    *,
-    db: Session = Depends(deps.get_db),
-    current_user = Depends(deps.get_current_user),
-    item_type: Optional[str] = None
+@router.post("/uploads/{upload_id}/complete", response_model=PrivateItemResponse, status_code=status.HTTP_201_CREATED)
+async def complete_upload_session(
+    upload_id: str,
+    storage: dict = Depends(require_unlocked_storage),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
 ):
-    """Get all private items, optionally filtered by type"""
-    storage = db.query(PrivateStorage).filter(
-        PrivateStorage.user_id == current_user.id,
-        PrivateStorage.is_locked == False
-    ).first()
-    
-    if not storage:
+    """Finish an upload once every chunk has arrived and turn it into a private item"""
+    session = await get_owned_upload_session(db, current_user, upload_id)
+    if session["next_chunk"] != session["total_chunks"]:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Private storage is locked or not found"
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload incomplete: {session['next_chunk']} of {session['total_chunks']} chunks received"
         )
-    
-    query = db.query(PrivateItem).filter(PrivateItem.storage_id == storage.id)
+
+    # Each step is safe to repeat, and the session goes last, so a /complete
+    # that is retried or runs concurrently finishes the same item instead of
+    # creating another or orphaning the chunks.
+    try:
+        # Writing the files document is what makes the chunks a readable GridFS file
+        await db[f"{PRIVATE_BLOBS_BUCKET}.files"].insert_one({
+            "_id": session["blob_id"],
+            "length": session["total_size"],
+            "chunkSize": session["chunk_size"],
+            "uploadDate": datetime.utcnow(),
+            "filename": session["item_type"],
+            "metadata": {"user_id": session["user_id"]},
+        })
+    except DuplicateKeyError:
+        pass
+    try:
+        private_item = await insert_private_item(
+            db, storage, session["blob_id"], session["total_size"],
+            session["item_type"], session["metadata"], session["content_type"]
+        )
+    except DuplicateKeyError:
+        private_item = await db["private_items"].find_one({"blob_id": session["blob_id"]})
+    await db["private_upload_sessions"].delete_one({"_id": session["_id"]})
+    return PrivateItemResponse(**private_item)
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def abort_upload_session(
+    upload_id: str,
+    storage: dict = Depends(require_unlocked_storage),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Abandon an upload and free the chunks written so far"""
+    session = await get_owned_upload_session(db, current_user, upload_id)
+    await discard_upload_session(db, session)
+    return None
+
+@router.get("/items", response_model=List[PrivateItemResponse])
+async def get_private_items(
+    item_type: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    storage: dict = Depends(require_unlocked_storage),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Get private item metadata, optionally filtered by type (content is fetched per item)"""
+
+    query_filter = {"user_id": ObjectId(current_user.id)}
     if item_type:
-        query = query.filter(PrivateItem.item_type == item_type)
-    
-    return query.all()
-
-@router.delete("/items/{item_id}")
-def delete_private_item(
-    *,
-    db: Session = Depends(deps.get_db),
-    current_user = Depends(deps.get_current_user),
-    item_id: int
+        query_filter["item_type"] = item_type
+
+    items_cursor = db["private_items"].find(query_filter).sort("created_at", -1).skip(skip).limit(limit)
+    items = await items_cursor.to_list(length=limit)
+
+    return [PrivateItemResponse(**i) for i in items]
+
+@router.get("/items/{item_id}", response_model=PrivateItemResponse)
+async def get_private_item(
+    item_id: str,
+    storage: dict = Depends(require_unlocked_storage),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
 ):
-    """Delete a private item"""
-    storage = db.query(PrivateStorage).filter(
-        PrivateStorage.user_id == current_user.id,
-        PrivateStorage.is_locked == False
-    ).first()
-    
-    if not storage:
+    """Get the metadata of a private item"""
+    return PrivateItemResponse(**await get_owned_item(db, current_user, item_id))
+
+@router.get("/items/{item_id}/content")
+async def download_private_item(
+    item_id: str,
+    request: Request,
+    response: Response,
+    storage: dict = Depends(require_unlocked_storage),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Stream the encrypted content of a private item, honouring Range requests"""
+    item = await get_owned_item(db, current_user, item_id)
+
+    try:
+        return await gridfs_download_response(
+            get_private_blobs_bucket(db),
+            item["blob_id"],
+            range_header=request.headers.get("range"),
+            media_type=item.get("content_type", "application/octet-stream"),
+            # The streamed response replaces the injected one, so carry the refreshed token over
+            headers={"X-Unlock-Token": response.headers["X-Unlock-Token"]}
+        )
+    except NoFile:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Private storage is locked or not found"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Item content not found"
         )
-    
-    item = db.query(PrivateItem).filter(
-        PrivateItem.id == item_id,
-        PrivateItem.storage_id == storage.id
-    ).first()
-    
+
+@router.delete("/items/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_private_item(
+    item_id: str,
+    storage: dict = Depends(require_unlocked_storage),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Delete a private item and its blob"""
+
+    item = await db["private_items"].find_one_and_delete({
+        "_id": ObjectId(item_id),
+        "user_id": ObjectId(current_user.id)
+    })
     if not item:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Item not found"
         )
-    
-    db.delete(item)
-    db.commit()
-    return {"message": "Item deleted successfully"} 
\ No newline at end of file
+
+    try:
+        await get_private_blobs_bucket(db).delete(item["blob_id"])
+    except NoFile:
+        pass
+    return None
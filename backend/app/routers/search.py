@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, Query
+from typing import List, Optional
+from pymongo.collection import Collection
+from pymongo import ASCENDING
+from bson import ObjectId
+
+from ..database import get_database
+from ..models import User
+from ..schemas import SearchResult
+from ..services.search_index import SEARCH_FIELD_WEIGHTS, query_terms, rank, search_tiers
+from .auth import get_current_user
+
+router = APIRouter()
+
+# Vault collections searched, and the field shown as each result's title
+SEARCH_SOURCES = {
+    "password": {"collection": "passwords", "title_field": "title"},
+    "social_account": {"collection": "social_accounts", "title_field": "platform"},
+}
+# Most matches ranked per collection. Broad one-letter queries are cut off
+# here, after title matches, which rank highest, have been taken first.
+SEARCH_CANDIDATE_LIMIT = 1000
+
+async def ensure_indexes(db):
+    for source in SEARCH_SOURCES.values():
+        await db[source["collection"]].create_index([("user_id", ASCENDING), ("search_tokens", ASCENDING)])
+
+@router.get("/", response_model=List[SearchResult])
+async def search_vault(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[str] = Query(None, pattern="^(password|social_account)$"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Prefix search over titles, usernames, websites, notes and platforms, best matches first"""
+    terms = query_terms(q)
+    if not terms:
+        return []
+
+    projection = {field: 1 for field in SEARCH_FIELD_WEIGHTS}
+    results = []
+    for source_kind, source in SEARCH_SOURCES.items():
+        if kind is not None and kind != source_kind:
+            continue
+        documents = []
+        for tier in search_tiers(ObjectId(current_user.id), terms):
+            if documents:
+                tier["_id"] = {"$nin": [document["_id"] for document in documents]}
+            remaining = SEARCH_CANDIDATE_LIMIT - len(documents)
+            documents += await db[source["collection"]].find(tier, projection).limit(remaining).to_list(length=remaining)
+            if len(documents) >= SEARCH_CANDIDATE_LIMIT:
+                break
+        for document in documents:
+            results.append({
+                "_id": document["_id"],
+                "kind": source_kind,
+                "title": document.get(source["title_field"]) or "",
+                "username": document.get("username") or "",
+                "website_domain": document.get("website_domain"),
+                "score": rank(document, q, terms),
+            })
+
+    results.sort(key=lambda result: (-result["score"], result["title"].lower()))
+    return [SearchResult(**result) for result in results[:limit]]
@@ -1,16 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from datetime import datetime, timedelta
+from pymongo import ASCENDING, ReturnDocument
 from pymongo.collection import Collection
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from gridfs.errors import NoFile
 from bson import ObjectId
+import os
 import secrets
 
-from ..database import get_database
+from ..database import get_database, get_db
 from ..models import SharedSecret, User, PyObjectId
-from ..schemas import SharedSecretCreate, SharedSecretResponse, SharedSecretConsumeResponse
+from ..schemas import MAX_SHARE_EXPIRES_IN_MINUTES, SharedSecretCreate, SharedSecretResponse, SharedSecretConsumeResponse, SharedFileResponse
+from ..services.gridfs_streaming import upload_request_body, gridfs_download_response, content_disposition
 from .auth import get_current_user
 
 router = APIRouter(prefix="/share", tags=["share"])
 
+# Encrypted file shares live in their own GridFS bucket; the share state is
+# kept in the file document's metadata so claiming and deleting stay atomic.
+SHARED_FILES_BUCKET = "shared_files"
+MAX_SHARED_FILE_SIZE = int(os.getenv("MAX_SHARED_FILE_SIZE", str(1024 * 1024 * 1024)))
+# How long the recipient may resume an interrupted download with Range
+# requests, sending back the X-Resume-Token handed out when it was claimed
+SHARED_FILE_DOWNLOAD_WINDOW_MINUTES = int(os.getenv("SHARED_FILE_DOWNLOAD_WINDOW_MINUTES", "15"))
+
+def get_shared_files_bucket(db) -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(db, bucket_name=SHARED_FILES_BUCKET)
+
+async def ensure_indexes(db):
+    files = db[f"{SHARED_FILES_BUCKET}.files"]
+    await files.create_index([("metadata.token", ASCENDING)], unique=True, sparse=True)
+    await files.create_index([("metadata.expires_at", ASCENDING)])
+
+async def delete_shared_file(db, file_id):
+    """Remove a shared file; the files document goes first so readers never see a partial file"""
+    try:
+        await get_shared_files_bucket(db).delete(file_id)
+    except NoFile:
+        pass # Already consumed or purged by another worker
+
+async def purge_expired_shared_files(db=None) -> int:
+    """Delete file shares that expired unclaimed or whose download window closed"""
+    db = db if db is not None else get_db()
+    now = datetime.utcnow()
+    expired_cursor = db[f"{SHARED_FILES_BUCKET}.files"].find(
+        {"$or": [
+            {"metadata.used": False, "metadata.expires_at": {"$lte": now}},
+            {"metadata.used": True, "metadata.download_expires_at": {"$lte": now}},
+        ]},
+        {"_id": 1}
+    )
+    purged = 0
+    async for shared_file in expired_cursor:
+        await delete_shared_file(db, shared_file["_id"])
+        purged += 1
+    return purged
+
 @router.post("/create", response_model=SharedSecretResponse)
 async def create_shared_secret(
     payload: SharedSecretCreate,
@@ -49,4 +94,96 @@ async def consume_shared_secret(token: str, db: Collection = Depends(get_databas
         {"$set": {"used": True}}
     )
     
-    return SharedSecretConsumeResponse(data=shared_secret["encrypted_data"])
\ No newline at end of file
+    return SharedSecretConsumeResponse(data=shared_secret["encrypted_data"])
+
+@router.post("/files", response_model=SharedFileResponse)
+async def create_shared_file(
+    request: Request,
+    filename: str = "shared-file",
+    expires_in_minutes: int = Query(60, gt=0, le=MAX_SHARE_EXPIRES_IN_MINUTES),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Upload an encrypted file for one-time sharing.
+
+    The request body is the raw (client-side encrypted) file and is streamed
+    straight into GridFS chunks.
+    """
+    token = secrets.token_urlsafe(32)
+    expires_at = datetime.utcnow() + timedelta(minutes=expires_in_minutes)
+    metadata = {
+        "token": token,
+        "expires_at": expires_at,
+        "used": False,
+        "created_by": ObjectId(current_user.id),
+    }
+
+    _, length = await upload_request_body(
+        get_shared_files_bucket(db), request, filename, metadata, max_size=MAX_SHARED_FILE_SIZE
+    )
+
+    return SharedFileResponse(token=token, filename=filename, length=length, expires_at=expires_at, used=False)
+
+@router.get("/files/{token}")
+async def consume_shared_file(token: str, request: Request, db: Collection = Depends(get_database)):
+    """Download a shared file once, with Range support for resuming the transfer.
+
+    The first request claims the share and gets an X-Resume-Token; only
+    requests carrying it may resume. The file is deleted once every byte of
+    it has been sent, counting only ranges that continue what was sent before.
+    """
+    files = db[f"{SHARED_FILES_BUCKET}.files"]
+    now = datetime.utcnow()
+    resume_token = request.headers.get("x-resume-token")
+
+    if resume_token is None:
+        # Claim the share atomically so only one recipient can ever start the download
+        resume_token = secrets.token_urlsafe(32)
+        shared_file = await files.find_one_and_update(
+            {"metadata.token": token, "metadata.used": False, "metadata.expires_at": {"$gt": now}},
+            {"$set": {
+                "metadata.used": True,
+                "metadata.resume_token": resume_token,
+                "metadata.delivered": 0,
+                "metadata.download_expires_at": now + timedelta(minutes=SHARED_FILE_DOWNLOAD_WINDOW_MINUTES),
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+    else:
+        # Resuming an interrupted download within the download window
+        shared_file = await files.find_one({
+            "metadata.token": token,
+            "metadata.used": True,
+            "metadata.resume_token": resume_token,
+            "metadata.download_expires_at": {"$gt": now},
+        })
+    if shared_file is None:
+        raise HTTPException(status_code=404, detail="Invalid or expired token")
+
+    async def record_progress(start: int, position: int):
+        # A range past what was sent so far leaves a gap; it doesn't count
+        progress = await files.find_one_and_update(
+            {"_id": shared_file["_id"], "metadata.delivered": {"$gte": start}},
+            {"$max": {"metadata.delivered": position}},
+            return_document=ReturnDocument.AFTER
+        )
+        if progress is not None and progress["metadata"]["delivered"] >= progress["length"]:
+            await delete_shared_file(db, shared_file["_id"])
+
+    try:
+        return await gridfs_download_response(
+            get_shared_files_bucket(db),
+            shared_file["_id"],
+            range_header=request.headers.get("range"),
+            headers={
+                "Content-Disposition": content_disposition(shared_file["filename"]),
+                "X-Resume-Token": resume_token,
+            },
+            on_progress=record_progress,
+        )
+    except HTTPException as e:
+        # An unsatisfiable range on the claiming request must not lose the claim
+        e.headers = {**(e.headers or {}), "X-Resume-Token": resume_token}
+        raise
+    except NoFile:
+        raise HTTPException(status_code=404, detail="Invalid or expired token")
@@ -1,20 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from typing import List, Dict, Any, Optional
 from cryptography.fernet import Fernet
 import os
 from dotenv import load_dotenv
 from pymongo.collection import Collection
 from bson import ObjectId
+from pymongo import ASCENDING
 from datetime import datetime
 
 from ..database import get_database
 from ..models import User, SocialAccount
 from ..schemas import SocialAccountCreate, SocialAccountResponse
 from .auth import get_current_user
-from .passwords import encrypt_password
+from ..services.encryption import KEY_SCHEME, encrypt_for_user, fingerprint_secret
+from ..services.password_strength import STRENGTH_SCORE_VERSION, score_password
+from ..services.search_index import build_search_tokens, refresh_search_tokens
+from ..services.change_feed import get_vault_version, next_change_seq, record_deletion
+from ..services.conditional_requests import conditional_response, vault_etag
+from ..services.fast_json import json_list_response
+from ..services.field_selection import parse_fields, response_projection, selected_model
 
 router = APIRouter()
 
+async def ensure_indexes(db):
+    # Reuse detection groups a user's secrets by fingerprint
+    await db["social_accounts"].create_index([("user_id", ASCENDING), ("password_fingerprint", ASCENDING)])
+    # Weak password views filter on the score stored at write time
+    await db["social_accounts"].create_index([("user_id", ASCENDING), ("strength_score", ASCENDING)])
+
 # Supported social media platforms
 SUPPORTED_PLATFORMS = {
     "whatsapp": {
@@ -61,10 +74,16 @@ async def create_social_account(
             detail=f"Unsupported platform. Supported platforms: {', '.join(SUPPORTED_PLATFORMS.keys())}"
         )
     
-    encrypted_password = encrypt_password(account_data.password)
+    encrypted_password = await encrypt_for_user(db, current_user.id, account_data.password)
     
     account_dict = account_data.model_dump(exclude={'password'})
     account_dict["encrypted_password"] = encrypted_password
+    account_dict["key_scheme"] = KEY_SCHEME
+    account_dict["password_fingerprint"] = fingerprint_secret(current_user.id, account_data.password)
+    account_dict["strength_score"] = score_password(account_data.password)
+    account_dict["strength_version"] = STRENGTH_SCORE_VERSION
+    account_dict["search_tokens"] = build_search_tokens(account_dict)
+    account_dict["change_seq"] = await next_change_seq(db, current_user.id, vault_change=True)
     account_dict["user_id"] = ObjectId(current_user.id)
     account_dict["created_at"] = datetime.utcnow()
     account_dict["updated_at"] = datetime.utcnow()
@@ -79,20 +98,33 @@ async def create_social_account(
 
 @router.get("/", response_model=List[SocialAccountResponse])
 async def read_social_accounts(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     platform: str = None,
+    fields: Optional[str] = Query(None, description="Comma separated fields to return, e.g. platform,username"),
     db: Collection = Depends(get_database),
     current_user: User = Depends(get_current_user)
 ):
+    selected = parse_fields(SocialAccountResponse, fields)
+    # Unchanged since the client's copy: answer from the version counter alone
+    version = await get_vault_version(db, current_user.id)
+    etag = None if version is None else vault_etag(
+        "social", current_user.id, version, selected, skip=skip, limit=limit, platform=platform
+    )
+    not_modified = conditional_response(request, response, etag)
+    if not_modified is not None:
+        return not_modified
+
     query_filter = {"user_id": ObjectId(current_user.id)}
     if platform:
         query_filter["platform"] = platform.lower()
         
-    accounts_cursor = db["social_accounts"].find(query_filter).skip(skip).limit(limit)
+    accounts_cursor = db["social_accounts"].find(query_filter, response_projection(SocialAccountResponse, selected)).skip(skip).limit(limit)
     accounts = await accounts_cursor.to_list(length=limit)
     
-    return [SocialAccountResponse(**a) for a in accounts]
+    return json_list_response(selected_model(SocialAccountResponse, selected), accounts, headers=response.headers)
 
 @router.get("/{account_id}", response_model=SocialAccountResponse)
 async def read_social_account(
@@ -103,7 +135,7 @@ async def read_social_account(
     account_data = await db["social_accounts"].find_one({
         "_id": ObjectId(account_id),
         "user_id": ObjectId(current_user.id)
-    })
+    }, response_projection(SocialAccountResponse))
     
     if account_data is None:
         raise HTTPException(status_code=404, detail="Social account not found")
@@ -125,8 +157,13 @@ async def update_social_account(
     
     update_fields = account_data.model_dump(exclude={'password'}, exclude_unset=True)
     if account_data.password:
-        update_fields["encrypted_password"] = encrypt_password(account_data.password)
+        update_fields["encrypted_password"] = await encrypt_for_user(db, current_user.id, account_data.password)
+        update_fields["key_scheme"] = KEY_SCHEME
+        update_fields["password_fingerprint"] = fingerprint_secret(current_user.id, account_data.password)
+        update_fields["strength_score"] = score_password(account_data.password)
+        update_fields["strength_version"] = STRENGTH_SCORE_VERSION
     update_fields["updated_at"] = datetime.utcnow()
+    update_fields["change_seq"] = await next_change_seq(db, current_user.id, vault_change=True)
 
     updated_account = await db["social_accounts"].find_one_and_update(
         filter={
@@ -140,6 +177,7 @@ async def update_social_account(
     if updated_account is None:
         raise HTTPException(status_code=404, detail="Social account not found or not owned by user")
     
+    await refresh_search_tokens(db["social_accounts"], updated_account)
     return SocialAccountResponse(**updated_account)
 
 @router.delete("/{account_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -156,6 +194,7 @@ async def delete_social_account(
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Social account not found or not owned by user")
     
+    await record_deletion(db, current_user.id, "social_account", account_id)
     return None
 
 @router.get("/platforms/supported", response_model=Dict[str, Any])
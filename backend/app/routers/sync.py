@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, Query
+from pymongo.collection import Collection
+from bson import ObjectId
+
+from ..database import get_database
+from ..models import User
+from ..schemas import ActivityNotificationResponse, PasswordResponse, SocialAccountResponse, SyncResponse
+from ..services.change_feed import sync_position
+from ..services.fast_json import json_model_response
+from ..services.field_selection import response_projection
+from .auth import get_current_user
+
+router = APIRouter()
+
+@router.get("/", response_model=SyncResponse)
+async def sync_changes(
+    since: int = Query(0, ge=0),
+    db: Collection = Depends(get_database),
+    current_user: User = Depends(get_current_user)
+):
+    """Everything created, changed or deleted after the since cursor, in one response.
+
+    since=0 returns the full vault. Items may be repeated across syncs and
+    should be applied as upserts.
+    """
+    user_id = ObjectId(current_user.id)
+    seq, reset = await sync_position(db, user_id, since)
+    if reset:
+        since = 0
+    changed = {"user_id": user_id, "change_seq": {"$gt": since}}
+    if since == 0:
+        # A full sync also covers items written before change sequences existed
+        changed = {"user_id": user_id}
+
+    passwords = await db["passwords"].find(changed, response_projection(PasswordResponse)).sort("change_seq", 1).to_list(length=None)
+    social_accounts = await db["social_accounts"].find(changed, response_projection(SocialAccountResponse)).sort("change_seq", 1).to_list(length=None)
+    notifications = await db["activity_notifications"].find(changed, response_projection(ActivityNotificationResponse)).sort("change_seq", 1).to_list(length=None)
+    # Nothing to delete on a client that starts over
+    tombstones = [] if since == 0 else await db["sync_tombstones"].find(changed).sort("change_seq", 1).to_list(length=None)
+
+    return json_model_response(SyncResponse, {
+        "seq": seq,
+        "reset": reset,
+        "passwords": passwords,
+        "social_accounts": social_accounts,
+        "notifications": notifications,
+        "deleted": [
+            {"kind": t["kind"], "id": t["item_id"], "change_seq": t["change_seq"]}
+            for t in tombstones
+        ],
+    })
@@ -8,7 +8,9 @@ from datetime import datetime
 from ..database import get_database
 from ..models import User
 from ..schemas import UserResponse, UserCreate
-from .auth import get_current_user, get_password_hash, verify_password
+from ..services.encryption import delete_user_key
+from .auth import get_current_user
+from ..services.password_hashing import hash_password_async, verify_password_async
 
 router = APIRouter()
 
@@ -44,13 +46,13 @@ async def update_user_me(
     
     if current_password and new_password:
         # Verify current password
-        if not verify_password(current_password, current_user.hashed_password):
+        if not await verify_password_async(current_password, current_user.hashed_password):
             raise HTTPException(
                 status_code=400,
                 detail="Incorrect current password"
             )
         # Update password
-        update_fields["hashed_password"] = get_password_hash(new_password)
+        update_fields["hashed_password"] = await hash_password_async(new_password)
     
     if not update_fields:
         raise HTTPException(status_code=400, detail="No fields to update")
@@ -79,6 +81,8 @@ async def delete_user_me(
     result = await db["users"].delete_one({"_id": ObjectId(current_user.id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found or not owned by user")
+    # Without the data key the user's stored secrets can never be decrypted again
+    await delete_user_key(db, current_user.id)
     return None
 
 @router.post("/verify-email", response_model=UserResponse)
@@ -42,6 +42,9 @@ class PasswordCreate(PasswordBase):
 
 class PasswordResponse(PasswordBase):
     id: PyObjectId = Field(alias="_id")
+    strength_score: Optional[int] = None # 0 (weakest) to 4, scored when the password was saved
+    website_domain: Optional[str] = None # Registrable domain of website_url
+    change_seq: Optional[int] = None # Position in the owner's change sequence (see /sync)
     created_at: datetime
     updated_at: Optional[datetime] = None
     user_id: PyObjectId
@@ -49,6 +52,22 @@ class PasswordResponse(PasswordBase):
     class Config:
         populate_by_name = True
 
+class ReusedSecretEntry(BaseModel):
+    id: PyObjectId
+    kind: str # "password" or "social_account"
+    title: str
+
+class ReuseGroup(BaseModel):
+    count: int
+    entries: List[ReusedSecretEntry]
+
+class PasswordHealthResponse(BaseModel):
+    reused_entries: int
+    reuse_groups: List[ReuseGroup]
+    weak_entries: int
+    # Entries written before fingerprints existed, not yet backfilled
+    unfingerprinted_entries: int
+
 # Social Account schemas
 class SocialAccountBase(BaseModel):
     platform: str
@@ -60,6 +79,8 @@ class SocialAccountCreate(SocialAccountBase):
 
 class SocialAccountResponse(SocialAccountBase):
     id: PyObjectId = Field(alias="_id")
+    strength_score: Optional[int] = None
+    change_seq: Optional[int] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
     user_id: PyObjectId
@@ -102,9 +123,12 @@ class SecureNoteResponse(SecureNoteBase):
     class Config:
         populate_by_name = True
 
+# Longest a share may stay claimable
+MAX_SHARE_EXPIRES_IN_MINUTES = 7 * 24 * 60
+
 class SharedSecretCreate(BaseModel):
     encrypted_data: str
-    expires_in_minutes: int = 60
+    expires_in_minutes: int = Field(60, gt=0, le=MAX_SHARE_EXPIRES_IN_MINUTES)
 
 class SharedSecretResponse(BaseModel):
     token: str
@@ -114,6 +138,65 @@ class SharedSecretResponse(BaseModel):
 class SharedSecretConsumeResponse(BaseModel):
     data: str
 
+class SharedFileResponse(BaseModel):
+    token: str
+    filename: str
+    length: int
+    expires_at: datetime
+    used: bool
+
+# Private storage schemas
+class PrivateStorageSetup(BaseModel):
+    pattern: Optional[str] = Field(None, min_length=4, max_length=100)
+    pin: Optional[str] = Field(None, min_length=4, max_length=6)
+
+class PrivateStorageUnlock(BaseModel):
+    pattern: Optional[str] = None
+    pin: Optional[str] = None
+
+class PrivateStorageUnlockResponse(BaseModel):
+    unlock_token: str
+    expires_at: datetime
+
+class PrivateStorageStatusResponse(BaseModel):
+    is_initialized: bool
+    is_locked: bool
+
+class PrivateItemBase(BaseModel):
+    item_type: str
+    metadata: Optional[Dict[str, Any]] = None
+
+class PrivateItemCreate(PrivateItemBase):
+    encrypted_data: str
+
+class PrivateItemResponse(PrivateItemBase):
+    id: PyObjectId = Field(alias="_id")
+    length: int
+    content_type: str
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        populate_by_name = True
+
+class UploadSessionCreate(PrivateItemBase):
+    total_size: int = Field(..., gt=0)
+    chunk_size: int = Field(1024 * 1024, ge=256 * 1024, le=8 * 1024 * 1024)
+    content_type: str = "application/octet-stream"
+
+class UploadSessionResponse(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    item_type: str
+    total_size: int
+    chunk_size: int
+    total_chunks: int
+    next_chunk: int
+    received_bytes: int
+    expires_at: datetime
+
+    class Config:
+        populate_by_name = True
+
 # Admin schemas
 class UserAdminResponse(BaseModel):
     id: PyObjectId = Field(alias="_id")
@@ -143,8 +226,80 @@ class ActivityNotificationCreate(ActivityNotificationBase):
 class ActivityNotificationResponse(ActivityNotificationBase):
     id: PyObjectId = Field(alias="_id")
     user_id: PyObjectId
+    change_seq: Optional[int] = None
     created_at: datetime
 
     class Config:
         populate_by_name = True
- 
\ No newline at end of file
+
+class NotificationDigestResponse(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    user_id: PyObjectId
+    kind: str
+    day: datetime
+    total: int
+    counts: Dict[str, int]
+    first_at: datetime
+    last_at: datetime
+
+    class Config:
+        populate_by_name = True
+
+class UnreadCountResponse(BaseModel):
+    unread: int
+
+class MarkReadRequest(BaseModel):
+    ids: List[PyObjectId] = Field(..., max_length=1000)
+
+class MarkReadResponse(BaseModel):
+    updated: int
+
+# Search schemas
+class SearchResult(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    kind: str # "password" or "social_account"
+    title: str
+    username: str
+    website_domain: Optional[str] = None
+    score: float
+
+    class Config:
+        populate_by_name = True
+
+# Sync schemas
+class SyncTombstone(BaseModel):
+    kind: str # "password", "social_account" or "activity_notification"
+    id: PyObjectId
+    change_seq: int
+
+class SyncResponse(BaseModel):
+    seq: int # Pass back as since on the next sync
+    reset: bool # The client's data is stale beyond repair: replace it with this response
+    passwords: List[PasswordResponse]
+    social_accounts: List[SocialAccountResponse]
+    notifications: List[ActivityNotificationResponse]
+    deleted: List[SyncTombstone]
+
+# Batch schemas
+class BatchRequestItem(BaseModel):
+    id: Optional[str] = None # Echoed back so clients can match responses
+    method: str = Field("GET", pattern="^(GET|POST|PUT|PATCH|DELETE)$")
+    path: str # e.g. "/api/v1/passwords/?limit=50"
+    body: Optional[Any] = None
+    headers: Optional[Dict[str, str]] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchRequestItem] = Field(..., min_length=1, max_length=20)
+    # Run in order, each after the previous one finished, instead of concurrently
+    sequential: bool = False
+
+class BatchResponseItem(BaseModel):
+    id: Optional[str] = None
+    status: int
+    headers: Dict[str, str]
+    body: Any = None
+    # "base64" when body holds a binary response base64 encoded
+    encoding: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchResponseItem]
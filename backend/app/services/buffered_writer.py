@@ -0,0 +1,205 @@
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, List, Optional
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from ..database import get_db
+from .metrics import Counter, registry
+
+# Upper bounds of the flush size histogram buckets
+FLUSH_SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000)
+
+BUFFERED_WRITE_MAX_BATCH = int(os.getenv("BUFFERED_WRITE_MAX_BATCH", "500"))
+BUFFERED_WRITE_FLUSH_INTERVAL_MS = int(os.getenv("BUFFERED_WRITE_FLUSH_INTERVAL_MS", "50"))
+BUFFERED_WRITE_MAX_QUEUE = int(os.getenv("BUFFERED_WRITE_MAX_QUEUE", "10000"))
+# Attempts after the first before a batch that keeps failing is dropped; the
+# delay before each one doubles from BUFFERED_WRITE_RETRY_BACKOFF_MS
+BUFFERED_WRITE_MAX_RETRIES = int(os.getenv("BUFFERED_WRITE_MAX_RETRIES", "5"))
+BUFFERED_WRITE_RETRY_BACKOFF_MS = int(os.getenv("BUFFERED_WRITE_RETRY_BACKOFF_MS", "100"))
+
+buffered_write_documents_dropped_total = registry.register(Counter(
+    "buffered_write_documents_dropped_total", "Buffered documents that could not be inserted", ("collection",)
+))
+
+class BufferedWriter:
+    """Coalesces single-document inserts into one collection into insert_many batches.
+
+    Documents are queued in memory and flushed every flush_interval_ms or as
+    soon as max_batch documents are waiting, whichever comes first. The queue
+    is bounded: once max_queue documents are pending, write() waits for the
+    next flush (backpressure) instead of growing memory without limit.
+
+    A batch that fails (a network error, a primary stepping down) is retried
+    with backoff while new writes wait behind it; documents only count as
+    dropped once the retries run out or the server rejects them.
+
+    before_flush may fill in fields that are cheaper to compute per batch;
+    after_flush sees the documents that were actually written.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        max_batch: int = BUFFERED_WRITE_MAX_BATCH,
+        flush_interval_ms: int = BUFFERED_WRITE_FLUSH_INTERVAL_MS,
+        max_queue: int = BUFFERED_WRITE_MAX_QUEUE,
+        max_retries: int = BUFFERED_WRITE_MAX_RETRIES,
+        retry_backoff_ms: int = BUFFERED_WRITE_RETRY_BACKOFF_MS,
+        before_flush: Optional[Callable[[List[dict]], Awaitable]] = None,
+        after_flush: Optional[Callable[[List[dict]], Awaitable]] = None,
+    ):
+        self.collection_name = collection_name
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self.before_flush = before_flush
+        self.after_flush = after_flush
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._current_flush: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.flushes = 0
+        self.documents_written = 0
+        self.documents_failed = 0
+        self.flush_size_counts = {bucket: 0 for bucket in FLUSH_SIZE_BUCKETS}
+        self.flush_size_counts["+Inf"] = 0
+        self.queue_latency_samples = 0
+        self.queue_latency_total = 0.0
+        self.queue_latency_max = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._batch_ready = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write out everything still queued"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._current_flush is not None:
+            await asyncio.gather(self._current_flush, return_exceptions=True)
+        while not self._queue.empty():
+            await self._flush(self._drain(self.max_batch))
+
+    async def write(self, document: dict) -> dict:
+        """Queue a document for insertion; its _id is assigned immediately"""
+        document.setdefault("_id", ObjectId())
+        await self._queue.put((time.monotonic(), document))
+        if self._queue.qsize() >= self.max_batch:
+            self._batch_ready.set()
+        return document
+
+    def _drain(self, limit: int) -> List[tuple]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                self._batch_ready.clear()
+                if self._queue.qsize() < self.max_batch - 1:
+                    try:
+                        await asyncio.wait_for(self._batch_ready.wait(), timeout=self.flush_interval)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                # Also runs on shutdown, so a batch already taken off the queue is never dropped
+                batch.extend(self._drain(self.max_batch - 1))
+                self._current_flush = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._current_flush)
+            self._current_flush = None
+
+    async def _flush(self, batch: List[tuple]):
+        if not batch:
+            return
+        flushed_at = time.monotonic()
+        documents = [document for _, document in batch]
+        collection = get_db()[self.collection_name]
+        prepared = self.before_flush is None
+        pending = documents
+        failed_ids = {document["_id"] for document in documents}
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                if not prepared:
+                    await self.before_flush(documents)
+                    prepared = True
+                if attempt:
+                    # The failed attempt may have inserted some of them before it broke off
+                    inserted = await collection.find(
+                        {"_id": {"$in": [document["_id"] for document in pending]}}, {"_id": 1}
+                    ).to_list(length=None)
+                    inserted_ids = {document["_id"] for document in inserted}
+                    pending = [document for document in pending if document["_id"] not in inserted_ids]
+                if pending:
+                    await collection.insert_many(pending, ordered=False)
+                failed_ids = set()
+                break
+            except BulkWriteError as e:
+                # Rejected by the server (e.g. a duplicate key); retrying won't help
+                failed_ids = {pending[error["index"]]["_id"] for error in e.details.get("writeErrors", [])}
+                print(f"Buffered insert into {self.collection_name} partially failed: {len(failed_ids)} documents")
+                break
+            except Exception as e:
+                print(f"Buffered insert into {self.collection_name} failed (attempt {attempt + 1}): {str(e)}")
+
+        if failed_ids:
+            self.documents_failed += len(failed_ids)
+            buffered_write_documents_dropped_total.inc(self.collection_name, amount=len(failed_ids))
+        written = [document for document in documents if document["_id"] not in failed_ids]
+        if not written:
+            return
+
+        self._record_flush(batch, flushed_at)
+        self.documents_written += len(written)
+        if self.after_flush is not None:
+            try:
+                await self.after_flush(written)
+            except Exception as e:
+                print(f"Post-flush hook for {self.collection_name} failed: {str(e)}")
+
+    def _record_flush(self, batch: List[tuple], flushed_at: float):
+        self.flushes += 1
+        size = len(batch)
+        bucket = next((bucket for bucket in FLUSH_SIZE_BUCKETS if size <= bucket), "+Inf")
+        self.flush_size_counts[bucket] += 1
+        self.queue_latency_samples += size
+        for enqueued_at, _ in batch:
+            latency = flushed_at - enqueued_at
+            self.queue_latency_total += latency
+            self.queue_latency_max = max(self.queue_latency_max, latency)
+
+    def stats(self) -> dict:
+        samples = self.queue_latency_samples
+        return {
+            "collection": self.collection_name,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "flushes": self.flushes,
+            "documents_written": self.documents_written,
+            "documents_failed": self.documents_failed,
+            "flush_size_buckets": {str(bucket): count for bucket, count in self.flush_size_counts.items()},
+            "avg_queue_latency_ms": (self.queue_latency_total / samples * 1000) if samples else 0.0,
+            "max_queue_latency_ms": self.queue_latency_max * 1000,
+        }
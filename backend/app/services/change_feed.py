@@ -0,0 +1,132 @@
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+
+from ..database import get_db
+
+# Collections clients sync, keyed by the kind reported in tombstones
+SYNCED_COLLECTIONS = {
+    "password": "passwords",
+    "social_account": "social_accounts",
+    "activity_notification": "activity_notifications",
+}
+# Kinds that make up the vault; changing one also bumps the user's vault version
+VAULT_KINDS = {"password", "social_account"}
+# Tombstones are kept this long; clients syncing from before that start over
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "90"))
+# A sequence number is allocated just before its write lands. Until a user's
+# last allocation is this old, a write may still be in flight, so the cursor
+# handed back does not move past it. Vault versions settle the same way, on
+# the last vault allocation only.
+SYNC_SETTLE_SECONDS = 5
+
+async def ensure_indexes(db):
+    for collection in SYNCED_COLLECTIONS.values():
+        await db[collection].create_index([("user_id", ASCENDING), ("change_seq", ASCENDING)])
+    await db["sync_tombstones"].create_index([("user_id", ASCENDING), ("change_seq", ASCENDING)])
+    await db["sync_tombstones"].create_index([("deleted_at", ASCENDING)])
+
+async def next_change_seq(db, user_id, vault_change: bool = False) -> int:
+    """Allocate the next number in the user's change sequence.
+
+    vault_change also bumps the vault version that list ETags are built from.
+    """
+    now = datetime.utcnow()
+    if vault_change:
+        increments = {"seq": 1, "vault_version": 1}
+        allocated = {"last_allocated_at": now, "vault_allocated_at": now}
+    else:
+        increments = {"seq": 1}
+        allocated = {"last_allocated_at": now}
+    counter = await db["sync_counters"].find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        {"$inc": increments, "$set": allocated},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"]
+
+async def stamp_change_seqs(documents: list):
+    """Give a batch of new documents one change sequence number per user.
+
+    Used before buffered inserts so a whole batch costs one counter update per
+    user rather than one per document.
+    """
+    db = get_db()
+    seqs = {}
+    for document in documents:
+        user_id = document["user_id"]
+        if user_id not in seqs:
+            seqs[user_id] = await next_change_seq(db, user_id)
+        document["change_seq"] = seqs[user_id]
+
+async def record_deletion(db, user_id, kind: str, item_id):
+    """Leave a tombstone so syncing clients learn an item was deleted"""
+    await db["sync_tombstones"].insert_one({
+        "user_id": ObjectId(user_id),
+        "kind": kind,
+        "item_id": ObjectId(item_id),
+        "change_seq": await next_change_seq(db, user_id, vault_change=kind in VAULT_KINDS),
+        "deleted_at": datetime.utcnow(),
+    })
+
+async def record_deletions(db, user_id, kind: str, item_ids: list):
+    """Tombstones for many items of one user deleted together, sharing one sequence number"""
+    if not item_ids:
+        return
+    change_seq = await next_change_seq(db, user_id, vault_change=kind in VAULT_KINDS)
+    deleted_at = datetime.utcnow()
+    await db["sync_tombstones"].insert_many([
+        {"user_id": ObjectId(user_id), "kind": kind, "item_id": ObjectId(item_id), "change_seq": change_seq, "deleted_at": deleted_at}
+        for item_id in item_ids
+    ])
+
+def _settled(counter: dict, allocated_at: str = "last_allocated_at") -> bool:
+    """Whether every write the counter has handed a number to has landed by now"""
+    settled_before = datetime.utcnow() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    return not counter.get(allocated_at) or counter[allocated_at] <= settled_before
+
+async def sync_position(db, user_id, since: int) -> Tuple[int, bool]:
+    """Cursor to hand back for this sync, and whether the client must start over.
+
+    A client has to start over if it is ahead of the counter (it synced
+    against other data) or behind tombstones that have since been pruned.
+    """
+    counter = await db["sync_counters"].find_one({"_id": ObjectId(user_id)}) or {}
+    seq = counter.get("seq", 0)
+    reset = since > seq or since < counter.get("pruned_seq", 0)
+    if not _settled(counter):
+        # Resend everything after the old cursor next time; clients apply changes idempotently
+        return (0 if reset else since), reset
+    return seq, reset
+
+async def get_vault_version(db, user_id) -> Optional[int]:
+    """The user's vault version, or None while a vault write may still be landing.
+
+    Notification writes share the sequence but not the version, so they
+    don't hold it back.
+    """
+    counter = await db["sync_counters"].find_one({"_id": ObjectId(user_id)}, {"vault_version": 1, "vault_allocated_at": 1})
+    if counter is None:
+        return 0
+    if not _settled(counter, "vault_allocated_at"):
+        return None
+    return counter.get("vault_version", 0)
+
+async def prune_tombstones(db=None):
+    """Drop tombstones past retention, remembering per user how far they went"""
+    db = db if db is not None else get_db()
+    cutoff = datetime.utcnow() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+    pruned = await db["sync_tombstones"].aggregate([
+        {"$match": {"deleted_at": {"$lt": cutoff}}},
+        {"$group": {"_id": "$user_id", "seq": {"$max": "$change_seq"}}},
+    ]).to_list(length=None)
+    if not pruned:
+        return
+    await db["sync_counters"].bulk_write(
+        [UpdateOne({"_id": row["_id"]}, {"$max": {"pruned_seq": row["seq"]}}, upsert=True) for row in pruned],
+        ordered=False
+    )
+    await db["sync_tombstones"].delete_many({"deleted_at": {"$lt": cutoff}})
@@ -0,0 +1,36 @@
+import hashlib
+import json
+from typing import Optional, Tuple
+from fastapi import Request, Response
+
+def vault_etag(listing: str, user_id, version: int, fields: Optional[Tuple[str, ...]] = None, **params) -> str:
+    """Tag for one variant of a vault listing.
+
+    A sparse fieldset, another page or another filter is a different
+    representation, so the fields and query params are hashed into the tag.
+    """
+    variant = json.dumps({"fields": list(fields or ()), **params}, sort_keys=True, default=str)
+    digest = hashlib.sha256(variant.encode()).hexdigest()[:16]
+    return f'"{listing}-{user_id}-{version}-{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches the etag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return etag in [candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates]
+
+def conditional_response(request: Request, response: Response, etag: Optional[str]) -> Optional[Response]:
+    """Tag a listing response, or return a 304 to send instead if the client's copy is current.
+
+    With etag None (version unknown) the listing is served untagged.
+    """
+    if etag is None:
+        return None
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
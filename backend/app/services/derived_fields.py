@@ -0,0 +1,295 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from cryptography.fernet import InvalidToken
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from ..database import get_db
+from .change_feed import next_change_seq
+from .encryption import decrypt_with_fallback, fingerprint_secret, get_user_cipher, run_crypto_batch
+from .password_strength import STRENGTH_SCORE_VERSION, score_password
+from .public_suffix import PUBLIC_SUFFIX_LIST_VERSION, registrable_domain
+from .reencryption import LEASE_SECONDS, SECRET_COLLECTIONS, WORKER_ID
+from .search_index import SEARCH_FIELD_WEIGHTS, SEARCH_INDEX_VERSION_TOKEN, build_search_tokens
+
+# Fields stored at write time and derived from a vault entry, in the order
+# they are derived: each may use the ones before it. needs_secret fields are
+# computed from the decrypted secret, reads lists the other stored fields
+# used, and collections limits where a field applies. A field is due when
+# it is missing, when its stale query (and check) says it is out of date, or
+# when a field it reads is being derived again; versioned fields make a
+# finished backfill rerun when their version changes.
+DERIVED_FIELDS = {
+    "password_fingerprint": {
+        "derive": lambda document, secret: fingerprint_secret(document["user_id"], secret),
+        "needs_secret": True,
+        "reads": [],
+        "collections": SECRET_COLLECTIONS,
+    },
+    "strength_score": {
+        "derive": lambda document, secret: score_password(secret),
+        "needs_secret": True,
+        "reads": ["strength_version"],
+        "collections": SECRET_COLLECTIONS,
+        "version": STRENGTH_SCORE_VERSION,
+        "stale": {"strength_version": {"$ne": STRENGTH_SCORE_VERSION}},
+        "is_stale": lambda document: document.get("strength_version") != STRENGTH_SCORE_VERSION,
+    },
+    "strength_version": {
+        "derive": lambda document, secret: STRENGTH_SCORE_VERSION,
+        "needs_secret": True, # Only written along with the score
+        "reads": [],
+        "collections": SECRET_COLLECTIONS,
+        "version": STRENGTH_SCORE_VERSION,
+        "stale": {"strength_version": {"$ne": STRENGTH_SCORE_VERSION}},
+        "is_stale": lambda document: document.get("strength_version") != STRENGTH_SCORE_VERSION,
+    },
+    "website_domain": {
+        "derive": lambda document, secret: registrable_domain(document.get("website_url")),
+        "needs_secret": False,
+        "reads": ["website_url", "website_domain_version"],
+        "collections": ["passwords"],
+        "version": PUBLIC_SUFFIX_LIST_VERSION,
+        "stale": {"website_domain_version": {"$ne": PUBLIC_SUFFIX_LIST_VERSION}},
+        "is_stale": lambda document: document.get("website_domain_version") != PUBLIC_SUFFIX_LIST_VERSION,
+    },
+    "website_domain_version": {
+        "derive": lambda document, secret: PUBLIC_SUFFIX_LIST_VERSION,
+        "needs_secret": False,
+        "reads": [],
+        "collections": ["passwords"],
+        "version": PUBLIC_SUFFIX_LIST_VERSION,
+        "stale": {"website_domain_version": {"$ne": PUBLIC_SUFFIX_LIST_VERSION}},
+        "is_stale": lambda document: document.get("website_domain_version") != PUBLIC_SUFFIX_LIST_VERSION,
+    },
+    "search_tokens": {
+        "derive": lambda document, secret: build_search_tokens(document),
+        "needs_secret": False,
+        "reads": list(SEARCH_FIELD_WEIGHTS),
+        "collections": SECRET_COLLECTIONS,
+        "version": SEARCH_INDEX_VERSION_TOKEN,
+        "stale": {"search_tokens": {"$ne": SEARCH_INDEX_VERSION_TOKEN}},
+        "is_stale": lambda document: SEARCH_INDEX_VERSION_TOKEN not in (document["search_tokens"] or ()),
+    },
+}
+
+JOB_ID = "backfill_derived_fields"
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "500"))
+BACKFILL_OPS_PER_SECOND = int(os.getenv("BACKFILL_OPS_PER_SECOND", "2000"))
+# How often each worker checks whether a backfill is needed; once one has
+# finished for the current set of fields the check is a single lookup
+BACKFILL_CHECK_INTERVAL_MINUTES = int(os.getenv("BACKFILL_CHECK_INTERVAL_MINUTES", "60"))
+
+def _field_versions() -> list:
+    """What a finished backfill covered, compared on the next check"""
+    return [f"{field}@{spec['version']}" if "version" in spec else field for field, spec in DERIVED_FIELDS.items()]
+
+def _fields_for(collection: str) -> list:
+    return [field for field, spec in DERIVED_FIELDS.items() if collection in spec["collections"]]
+
+def _due_query(field: str) -> dict:
+    return DERIVED_FIELDS[field].get("stale", {field: {"$exists": False}})
+
+def _is_due(document: dict, field: str) -> bool:
+    if field not in document:
+        return True
+    is_stale = DERIVED_FIELDS[field].get("is_stale")
+    return is_stale is not None and is_stale(document)
+
+def _scan_projection(collection: str) -> dict:
+    # The derived fields themselves tell which of them are due on an entry
+    projection = {"user_id": 1, "encrypted_password": 1, "updated_at": 1}
+    for field in _fields_for(collection):
+        projection[field] = 1
+        projection.update((read, 1) for read in DERIVED_FIELDS[field]["reads"])
+    return projection
+
+async def derive_due_fields(db, documents: list, fields: list) -> tuple:
+    """Compute the fields due on each document.
+
+    Returns the bulk updates to apply and how many documents could not be
+    decrypted with any known key. Fields that don't need the secret are
+    still filled in for those. Updated documents get a new change_seq (one
+    per user) so syncing clients pick up the new fields.
+    """
+    ciphers = {}
+    for document in documents:
+        if document["user_id"] not in ciphers:
+            ciphers[document["user_id"]] = await get_user_cipher(db, document["user_id"])
+
+    def derive(document: dict):
+        """Returns (the fields to set, whether the secret could be read)"""
+        due = []
+        for field in fields:
+            if _is_due(document, field) or any(read in due for read in DERIVED_FIELDS[field]["reads"]):
+                due.append(field)
+        secret = None
+        readable = True
+        if any(DERIVED_FIELDS[field]["needs_secret"] for field in due):
+            try:
+                secret = decrypt_with_fallback(ciphers[document["user_id"]], document["encrypted_password"])
+            except InvalidToken:
+                readable = False
+        derived = {}
+        for field in due:
+            spec = DERIVED_FIELDS[field]
+            if spec["needs_secret"] and secret is None:
+                continue
+            derived[field] = spec["derive"]({**document, **derived}, secret)
+        return derived, readable
+
+    updates = []
+    failed = 0
+    change_seqs = {}
+    results = await run_crypto_batch(derive, documents)
+    for document, (derived, readable) in zip(documents, results):
+        if not readable:
+            failed += 1
+        if derived:
+            user_id = document["user_id"]
+            if user_id not in change_seqs:
+                change_seqs[user_id] = await next_change_seq(db, user_id, vault_change=True)
+            # A user edit since the read rewrites these fields itself; don't race it
+            updates.append(UpdateOne(
+                {"_id": document["_id"], "updated_at": document.get("updated_at")},
+                {"$set": {**derived, "change_seq": change_seqs[user_id]}}
+            ))
+    return updates, failed
+
+class DerivedFieldsBackfill:
+    """Fills in write-time derived fields for vault entries stored before them.
+
+    Only entries with a field due are read, so running it again is cheap and
+    changes nothing already filled in. A finished run is recorded against
+    the set of fields it covered; adding a field to DERIVED_FIELDS makes the
+    next check run again. One worker runs it at a time, holding a renewable
+    lease on its maintenance_jobs document.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def status(self) -> Optional[dict]:
+        return await get_db()["maintenance_jobs"].find_one({"_id": JOB_ID})
+
+    async def start(self, force: bool = False, target_ops_per_second: int = BACKFILL_OPS_PER_SECOND) -> Optional[dict]:
+        """Start a pass unless one finished for the current fields; returns None if another worker holds it"""
+        db = get_db()
+        now = datetime.utcnow()
+        fields = _field_versions()
+        claim = {"_id": JOB_ID, "$or": [
+            {"status": {"$ne": "running"}},
+            {"lease_expires_at": {"$lt": now}},
+            {"owner": WORKER_ID},
+        ]}
+        if not force:
+            claim["$nor"] = [{"status": "completed", "fields": fields}]
+        try:
+            state = await db["maintenance_jobs"].find_one_and_update(
+                claim,
+                {"$set": {
+                    "status": "running",
+                    "owner": WORKER_ID,
+                    "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS),
+                    "fields": fields,
+                    "target_ops_per_second": target_ops_per_second,
+                    "started_at": now,
+                    "updated_at": now,
+                    "processed": 0,
+                    "backfilled": 0,
+                    "failed": 0,
+                    "error": None,
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Already complete, or another worker holds it
+            return None
+
+        if not self.running:
+            self._task = asyncio.create_task(self._run(target_ops_per_second))
+        return state
+
+    async def check(self):
+        """Periodic entry point: run if a backfill is due and nobody else is on it"""
+        await self.start()
+
+    async def stop(self):
+        """Stop working locally; the lease lapses and the next check picks it up again"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, target_ops_per_second: int):
+        db = get_db()
+        jobs = db["maintenance_jobs"]
+        try:
+            run_started = time.monotonic()
+            processed = 0
+            # Entries an edit raced past; the next check looks at them again
+            skipped = 0
+            for collection_name in SECRET_COLLECTIONS:
+                collection_fields = _fields_for(collection_name)
+                if not collection_fields:
+                    continue
+                collection = db[collection_name]
+                due = {"$or": [_due_query(field) for field in collection_fields]}
+                last_id = None
+                while True:
+                    query = due if last_id is None else {"_id": {"$gt": last_id}, **due}
+                    documents = await collection.find(query, _scan_projection(collection_name)).sort("_id", 1).limit(BACKFILL_BATCH_SIZE).to_list(length=BACKFILL_BATCH_SIZE)
+                    if not documents:
+                        break
+                    last_id = documents[-1]["_id"]
+                    updates, failed = await derive_due_fields(db, documents, collection_fields)
+                    if updates:
+                        result = await collection.bulk_write(updates, ordered=False)
+                        skipped += len(updates) - result.matched_count
+
+                    state = await jobs.find_one_and_update(
+                        {"_id": JOB_ID, "owner": WORKER_ID, "status": "running"},
+                        {
+                            "$set": {
+                                "lease_expires_at": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS),
+                                "updated_at": datetime.utcnow(),
+                            },
+                            "$inc": {"processed": len(documents), "backfilled": len(updates), "failed": failed},
+                        }
+                    )
+                    if state is None:
+                        return # The lease was lost to another worker
+
+                    # Throttle to the target rate
+                    processed += len(documents)
+                    ahead_by = processed / target_ops_per_second - (time.monotonic() - run_started)
+                    if ahead_by > 0:
+                        await asyncio.sleep(ahead_by)
+
+            await jobs.update_one(
+                {"_id": JOB_ID, "owner": WORKER_ID, "status": "running"},
+                {"$set": {
+                    "status": "completed" if not skipped else "incomplete",
+                    "lease_expires_at": None,
+                    "completed_at": datetime.utcnow(),
+                    "updated_at": datetime.utcnow(),
+                }}
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Derived field backfill failed: {str(e)}")
+            await jobs.update_one(
+                {"_id": JOB_ID, "owner": WORKER_ID},
+                {"$set": {"status": "failed", "error": str(e), "lease_expires_at": None, "updated_at": datetime.utcnow()}}
+            )
+
+derived_fields_backfill = DerivedFieldsBackfill()
@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Optional
+from bson import ObjectId
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from dotenv import load_dotenv, set_key
+
+from ..database import get_db
+from .metrics import time_fernet
+
+# Load keys from environment variables, generating and saving any that are missing
+load_dotenv(override=True) # Ensure .env is loaded and can be overridden
+
+def _load_or_generate_key(name: str) -> str:
+    key = os.getenv(name)
+    if not key:
+        key = Fernet.generate_key().decode()
+        env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
+        # Ensure the .env file exists before trying to set the key
+        if not os.path.exists(env_path):
+            with open(env_path, "w") as f:
+                f.write("")
+        set_key(env_path, name, key)
+        print(f"Generated new {name} and saved to {env_path}")
+    return key
+
+ENCRYPTION_KEY = _load_or_generate_key("ENCRYPTION_KEY")
+# Keys the password fingerprints used for reuse detection. Kept apart from
+# ENCRYPTION_KEY so rotating the master key leaves fingerprints valid.
+FINGERPRINT_KEY = _load_or_generate_key("FINGERPRINT_KEY")
+
+# Retired master keys (comma separated), still accepted for unwrapping while
+# user keys are being rewrapped under the current ENCRYPTION_KEY.
+PREVIOUS_ENCRYPTION_KEYS = [key.strip() for key in os.getenv("PREVIOUS_ENCRYPTION_KEYS", "").split(",") if key.strip()]
+
+# The master key only wraps per-user data keys; MultiFernet encrypts with the
+# first (current) key and decrypts with any of them.
+master_cipher = MultiFernet([Fernet(key.encode()) for key in [ENCRYPTION_KEY] + PREVIOUS_ENCRYPTION_KEYS])
+current_master_cipher = Fernet(ENCRYPTION_KEY.encode())
+
+# Stored alongside secrets encrypted under their owner's data key
+KEY_SCHEME = "dek"
+
+# Batches up to this size are processed inline; a thread hop costs more than a few Fernet calls
+CRYPTO_INLINE_BATCH_SIZE = int(os.getenv("CRYPTO_INLINE_BATCH_SIZE", "64"))
+# Items handed to one pool thread at a time
+CRYPTO_CHUNK_SIZE = int(os.getenv("CRYPTO_CHUNK_SIZE", "256"))
+CRYPTO_THREADS = int(os.getenv("CRYPTO_THREADS", str(os.cpu_count() or 1)))
+
+# OpenSSL releases the GIL during AES and HMAC, so large batches spread
+# across these threads instead of blocking the event loop.
+_crypto_executor = ThreadPoolExecutor(max_workers=CRYPTO_THREADS, thread_name_prefix="crypto")
+
+DEK_CACHE_SIZE = int(os.getenv("DEK_CACHE_SIZE", "10000"))
+DEK_CACHE_TTL_SECONDS = int(os.getenv("DEK_CACHE_TTL_SECONDS", "300"))
+
+class DataKeyCache:
+    """LRU cache of unwrapped per-user data keys, bounded by size and age"""
+
+    def __init__(self, max_size: int = DEK_CACHE_SIZE, ttl_seconds: int = DEK_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[Fernet]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, user_id: str, cipher: Fernet):
+        self._entries[user_id] = (cipher, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def evict(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+dek_cache = DataKeyCache()
+
+async def get_user_cipher(db, user_id) -> Fernet:
+    """Return the user's data key cipher, creating and wrapping the key on first use"""
+    user_id = str(user_id)
+    cipher = dek_cache.get(user_id)
+    if cipher is not None:
+        return cipher
+
+    user_key = await db["user_keys"].find_one({"_id": ObjectId(user_id)})
+    if user_key is None:
+        # $setOnInsert keeps whichever key a concurrent request created first
+        await db["user_keys"].update_one(
+            {"_id": ObjectId(user_id)},
+            {"$setOnInsert": {
+                "wrapped_key": current_master_cipher.encrypt(Fernet.generate_key()).decode(),
+                "created_at": datetime.utcnow(),
+            }},
+            upsert=True
+        )
+        user_key = await db["user_keys"].find_one({"_id": ObjectId(user_id)})
+
+    cipher = Fernet(master_cipher.decrypt(user_key["wrapped_key"].encode()))
+    dek_cache.put(user_id, cipher)
+    return cipher
+
+def decrypt_with_fallback(cipher: Fernet, token: str) -> str:
+    try:
+        return cipher.decrypt(token.encode()).decode()
+    except InvalidToken:
+        # Written before envelope encryption, directly under the master key
+        return master_cipher.decrypt(token.encode()).decode()
+
+async def encrypt_for_user(db, user_id, plaintext: str) -> str:
+    cipher = await get_user_cipher(db, user_id)
+    with time_fernet("encrypt"):
+        return cipher.encrypt(plaintext.encode()).decode()
+
+def fingerprint_secret(user_id, plaintext: str) -> str:
+    """Keyed fingerprint of a secret, equal for equal secrets of the same user.
+
+    The user id is part of the MAC input so fingerprints can't be matched
+    across users, and without FINGERPRINT_KEY they can't be brute forced.
+    """
+    message = f"{user_id}:{plaintext}".encode()
+    return hmac.new(FINGERPRINT_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+def _apply(func: Callable, items: list, operation: Optional[str] = None) -> list:
+    if operation is None:
+        return [func(item) for item in items]
+    # Timed where it runs, so waiting for a pool thread isn't counted as Fernet time
+    with time_fernet(operation, len(items)):
+        return [func(item) for item in items]
+
+async def run_crypto_batch(func: Callable, items: list, operation: Optional[str] = None) -> list:
+    """Apply a CPU-bound crypto function to every item, preserving order.
+
+    Small batches run inline; larger ones are split into CRYPTO_CHUNK_SIZE
+    chunks and run on the crypto thread pool so the event loop stays free.
+    With an operation, each inline batch or chunk is recorded by time_fernet.
+    """
+    if len(items) <= CRYPTO_INLINE_BATCH_SIZE:
+        return _apply(func, items, operation)
+    loop = asyncio.get_running_loop()
+    chunks = await asyncio.gather(*[
+        loop.run_in_executor(_crypto_executor, _apply, func, items[i:i + CRYPTO_CHUNK_SIZE], operation)
+        for i in range(0, len(items), CRYPTO_CHUNK_SIZE)
+    ])
+    return [result for chunk in chunks for result in chunk]
+
+async def decrypt_many(db, user_id, tokens: List[str]) -> List[str]:
+    cipher = await get_user_cipher(db, user_id)
+    return await run_crypto_batch(lambda token: decrypt_with_fallback(cipher, token), tokens, "decrypt")
+
+async def delete_user_key(db, user_id):
+    """Destroy a user's data key, making everything encrypted under it unreadable"""
+    dek_cache.evict(str(user_id))
+    await db["user_keys"].delete_one({"_id": ObjectId(user_id)})
+
+async def rewrap_user_keys(db=None) -> int:
+    """Rewrap every user data key under the current master key.
+
+    This is the whole master key rotation: put the new key in ENCRYPTION_KEY,
+    move the old one to PREVIOUS_ENCRYPTION_KEYS, run this, then drop the old
+    key. Only one small document per user is rewritten.
+    """
+    db = db if db is not None else get_db()
+    rewrapped = 0
+    async for user_key in db["user_keys"].find({}, {"wrapped_key": 1}):
+        try:
+            current_master_cipher.decrypt(user_key["wrapped_key"].encode())
+            continue # Already wrapped under the current master key
+        except InvalidToken:
+            pass
+        wrapped_key = master_cipher.rotate(user_key["wrapped_key"].encode()).decode()
+        await db["user_keys"].update_one(
+            {"_id": user_key["_id"], "wrapped_key": user_key["wrapped_key"]},
+            {"$set": {"wrapped_key": wrapped_key, "rewrapped_at": datetime.utcnow()}}
+        )
+        rewrapped += 1
+    return rewrapped
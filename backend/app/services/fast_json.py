@@ -0,0 +1,32 @@
+from functools import lru_cache
+from typing import Any, List, Mapping, Optional, Type
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+@lru_cache(maxsize=None)
+def _adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(model)
+
+def _json_response(content: bytes, headers: Optional[Mapping[str, str]]) -> Response:
+    return Response(content=content, media_type="application/json", headers=dict(headers) if headers else None)
+
+def json_list_response(model: Type[BaseModel], documents: List[Any], headers: Optional[Mapping[str, str]] = None) -> Response:
+    """Validate raw Mongo documents against a response model and serialize them in one go.
+
+    pydantic-core does both steps natively (ObjectIds go through PyObjectId,
+    datetimes are written as ISO 8601), and handing FastAPI a finished
+    Response skips its own response_model validation and json.dumps pass.
+    The output is the same JSON response_model would produce; keep
+    response_model on the route for the OpenAPI schema.
+    """
+    adapter = _list_adapter(model)
+    return _json_response(adapter.dump_json(adapter.validate_python(documents), by_alias=True), headers)
+
+def json_model_response(model: Type[BaseModel], document: Any, headers: Optional[Mapping[str, str]] = None) -> Response:
+    """json_list_response for a single object"""
+    adapter = _adapter(model)
+    return _json_response(adapter.dump_json(adapter.validate_python(document), by_alias=True), headers)
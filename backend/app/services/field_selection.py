@@ -0,0 +1,58 @@
+from functools import lru_cache
+from typing import Dict, Optional, Tuple, Type
+from fastapi import HTTPException, status
+from pydantic import BaseModel, create_model
+
+# Sent in every sparse response so clients can always address what they got back
+ALWAYS_SELECTED = ("_id",)
+
+def _output_names(model: Type[BaseModel]) -> Dict[str, str]:
+    """Map each field's JSON key (its alias, as responses are dumped by_alias) to its attribute name"""
+    return {(info.alias or name): name for name, info in model.model_fields.items()}
+
+@lru_cache(maxsize=None)
+def response_projection(model: Type[BaseModel], fields: Optional[Tuple[str, ...]] = None) -> Dict[str, int]:
+    """Mongo projection fetching only what a response model (or a subset of it) exposes.
+
+    Secrets and other stored-only fields (encrypted_password, search_tokens,
+    fingerprints) never leave the database for list views.
+    """
+    keys = fields if fields is not None else tuple(_output_names(model))
+    projection = {key: 1 for key in keys}
+    if "_id" not in projection:
+        projection["_id"] = 0
+    return projection
+
+@lru_cache(maxsize=None)
+def partial_model(model: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """A response model holding only the selected fields, built once per selection"""
+    names = _output_names(model)
+    definitions = {}
+    for key in fields:
+        info = model.model_fields[names[key]]
+        definitions[names[key]] = (info.annotation, info)
+    return create_model(f"{model.__name__}Fields", __config__=model.model_config, **definitions)
+
+def parse_fields(model: Type[BaseModel], fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Validate a comma separated ?fields= selection against a response model.
+
+    Returns the selected JSON keys in a canonical order (so equal selections
+    share cached models and projections), or None to select everything.
+    """
+    if not fields:
+        return None
+    names = _output_names(model)
+    # The id is accepted under its attribute name too
+    aliases = {name: key for key, name in names.items()}
+    requested = {aliases.get(field.strip(), field.strip()) for field in fields.split(",") if field.strip()}
+    unknown = sorted(requested - names.keys())
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    requested.update(key for key in ALWAYS_SELECTED if key in names)
+    return tuple(key for key in names if key in requested)
+
+def selected_model(model: Type[BaseModel], fields: Optional[Tuple[str, ...]]) -> Type[BaseModel]:
+    return model if fields is None else partial_model(model, fields)
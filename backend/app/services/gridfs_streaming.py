@@ -0,0 +1,154 @@
+import re
+import unicodedata
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple
+from urllib.parse import quote
+from fastapi import HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+# Size of the pieces handed to the ASGI server while streaming a download
+STREAM_READ_SIZE = 256 * 1024
+# How much of a download is sent between two on_progress calls
+PROGRESS_REPORT_SIZE = 16 * STREAM_READ_SIZE
+
+async def upload_request_body(
+    bucket: AsyncIOMotorGridFSBucket,
+    request: Request,
+    filename: str,
+    metadata: dict,
+    max_size: Optional[int] = None,
+) -> Tuple[object, int]:
+    """Stream the raw request body into GridFS chunk by chunk.
+
+    Returns the id of the new GridFS file and its length. The upload is
+    aborted (and its chunks removed) if the body exceeds max_size or the
+    client disconnects half way through.
+    """
+    grid_in = bucket.open_upload_stream(filename, metadata=metadata)
+    length = 0
+    try:
+        async for chunk in request.stream():
+            if not chunk:
+                continue
+            length += len(chunk)
+            if max_size is not None and length > max_size:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"File exceeds the maximum size of {max_size} bytes"
+                )
+            await grid_in.write(chunk)
+    except BaseException:
+        await grid_in.abort()
+        raise
+    await grid_in.close()
+    return grid_in._id, length
+
+def content_disposition(filename: str) -> str:
+    """An attachment Content-Disposition safe for any client-supplied filename.
+
+    The quoted filename is an ASCII-only fallback for old clients; the real
+    name travels percent-encoded in filename* (RFC 6266 / RFC 5987).
+    """
+    fallback = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode()
+    fallback = re.sub(r'[^\x20-\x7e]|["\\]', "_", fallback).strip() or "download"
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+def parse_range_header(range_header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range `Range` header into an inclusive (start, end) pair.
+
+    Returns None when the whole file should be served (no header, or a
+    multi-range request we don't support). Raises 416 for ranges that cannot
+    be satisfied.
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+
+    unsatisfiable = HTTPException(
+        status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        detail="Requested range not satisfiable",
+        headers={"Content-Range": f"bytes */{length}"}
+    )
+    start_str, _, end_str = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if start_str == "":
+            # Suffix range: the last N bytes
+            suffix = int(end_str)
+            if suffix <= 0:
+                raise unsatisfiable
+            start, end = max(length - suffix, 0), length - 1
+        else:
+            start = int(start_str)
+            end = int(end_str) if end_str else length - 1
+    except ValueError:
+        return None
+
+    end = min(end, length - 1)
+    if start < 0 or start > end:
+        raise unsatisfiable
+    return start, end
+
+async def iter_gridfs_range(grid_out, start: int, end: int) -> AsyncIterator[bytes]:
+    """Yield bytes start..end (inclusive) of a GridFS file without loading it whole"""
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = await grid_out.read(min(STREAM_READ_SIZE, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
+
+async def _report_progress(body: AsyncIterator[bytes], start: int, on_progress: Callable[[int, int], Awaitable]):
+    # The generator only resumes after the server has sent the previous
+    # chunk, so the position reported is what the client has been sent.
+    position = reported = start
+    async for data in body:
+        yield data
+        position += len(data)
+        if position - reported >= PROGRESS_REPORT_SIZE:
+            await on_progress(start, position)
+            reported = position
+    if position != reported or position == start:
+        await on_progress(start, position)
+
+async def gridfs_download_response(
+    bucket: AsyncIOMotorGridFSBucket,
+    file_id,
+    range_header: Optional[str] = None,
+    media_type: str = "application/octet-stream",
+    headers: Optional[dict] = None,
+    on_progress: Optional[Callable[[int, int], Awaitable]] = None,
+) -> StreamingResponse:
+    """Build a streaming (optionally partial) response for a GridFS file.
+
+    on_progress is awaited with (start, position) as the bytes from start up
+    to position are sent, at least once every PROGRESS_REPORT_SIZE and once
+    at the end, which lets one-time downloads track what the client holds.
+    """
+    grid_out = await bucket.open_download_stream(file_id)
+    length = grid_out.length
+
+    response_headers = {"Accept-Ranges": "bytes"}
+    if headers:
+        response_headers.update(headers)
+
+    byte_range = parse_range_header(range_header, length) if length else None
+    if byte_range is None:
+        start, end = 0, length - 1
+        status_code = status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    response_headers["Content-Length"] = str(end - start + 1 if length else 0)
+
+    body = iter_gridfs_range(grid_out, start, end)
+    if on_progress is not None:
+        body = _report_progress(body, start, on_progress)
+
+    return StreamingResponse(
+        body,
+        status_code=status_code,
+        media_type=media_type,
+        headers=response_headers,
+    )
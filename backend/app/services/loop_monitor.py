@@ -0,0 +1,127 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from .metrics import Counter, Gauge, Histogram, registry
+
+LOOP_LAG_SAMPLE_INTERVAL_MS = int(os.getenv("LOOP_LAG_SAMPLE_INTERVAL_MS", "100"))
+# Samples kept for percentiles; at the default interval this is the last minute
+LOOP_LAG_WINDOW = int(os.getenv("LOOP_LAG_WINDOW", "600"))
+# The exported p99 gauge is refreshed every this many samples
+LOOP_LAG_GAUGE_EVERY = 10
+# The watchdog dumps the loop thread's stack once the loop has been stuck this long
+LOOP_BLOCKED_DUMP_THRESHOLD_MS = int(os.getenv("LOOP_BLOCKED_DUMP_THRESHOLD_MS", "500"))
+LOOP_BLOCKED_DUMP_COOLDOWN_SECONDS = int(os.getenv("LOOP_BLOCKED_DUMP_COOLDOWN_SECONDS", "60"))
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+event_loop_lag_seconds = registry.register(Histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a sleeping task", buckets=LOOP_LAG_BUCKETS
+))
+event_loop_lag_p99_seconds = registry.register(Gauge(
+    "event_loop_lag_p99_seconds", "99th percentile event loop lag over the recent sample window"
+))
+event_loop_blocked_dumps_total = registry.register(Counter(
+    "event_loop_blocked_dumps_total", "Stack dumps taken because the event loop was blocked"
+))
+
+def _percentile(ordered: list, fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class LoopLagMonitor:
+    """Measures event loop lag and catches whatever is blocking the loop.
+
+    A task sleeps for a fixed interval and records how much later than asked
+    it woke up: time the loop spent running something else without yielding.
+    Sampling can only see a block once it is over, so a watchdog thread also
+    watches the sampler's heartbeat and, while the loop is stuck, prints the
+    loop thread's stack to show what is holding it.
+    """
+
+    def __init__(
+        self,
+        interval_ms: int = LOOP_LAG_SAMPLE_INTERVAL_MS,
+        window: int = LOOP_LAG_WINDOW,
+        dump_threshold_ms: int = LOOP_BLOCKED_DUMP_THRESHOLD_MS,
+    ):
+        self.interval = interval_ms / 1000
+        self.dump_threshold = dump_threshold_ms / 1000
+        self._samples = deque(maxlen=window)
+        self._heartbeat = time.perf_counter()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._last_dump = 0.0
+        self._dumped_heartbeat: Optional[float] = None
+        self._sampled = 0
+        self.dumps = 0
+
+    def start(self):
+        if self._task is not None and not self._task.done():
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sample(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._heartbeat = now
+            lag = max(now - started - self.interval, 0.0)
+            self._samples.append(lag)
+            event_loop_lag_seconds.observe(lag)
+            self._sampled += 1
+            if self._sampled % LOOP_LAG_GAUGE_EVERY == 0:
+                event_loop_lag_p99_seconds.set(_percentile(sorted(self._samples), 0.99))
+
+    def _watch(self):
+        # Checking twice per interval is enough to notice a stall well before the threshold
+        while not self._stopping.wait(self.interval / 2):
+            stalled = time.perf_counter() - self._heartbeat - self.interval
+            if stalled < self.dump_threshold or self._heartbeat == self._dumped_heartbeat:
+                continue # Not stuck, or this stall was already dumped
+            if time.monotonic() - self._last_dump < LOOP_BLOCKED_DUMP_COOLDOWN_SECONDS:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._last_dump = time.monotonic()
+            self._dumped_heartbeat = self._heartbeat
+            self.dumps += 1
+            event_loop_blocked_dumps_total.inc()
+            stack = "".join(traceback.format_stack(frame))
+            print(f"Event loop blocked for {stalled * 1000:.0f}ms, loop thread is at:\n{stack}")
+
+    def percentiles(self) -> dict:
+        """Lag over the sample window in milliseconds; a stall still in progress counts as lag"""
+        ordered = sorted(self._samples)
+        current = max(time.perf_counter() - self._heartbeat - self.interval, 0.0) if self._task else 0.0
+        p99 = max(_percentile(ordered, 0.99), current)
+        return {
+            "samples": len(ordered),
+            "p50": round(_percentile(ordered, 0.50) * 1000, 3),
+            "p90": round(_percentile(ordered, 0.90) * 1000, 3),
+            "p99": round(p99 * 1000, 3),
+            "max": round(max(ordered[-1] if ordered else 0.0, current) * 1000, 3),
+        }
+
+loop_lag_monitor = LoopLagMonitor()
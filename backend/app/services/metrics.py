@@ -0,0 +1,314 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+from pymongo import monitoring
+
+# Latency buckets in seconds, from a fast Mongo lookup to a slow HIBP call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# bcrypt is deliberately slow, so its buckets start higher
+HASHING_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0)
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4" # Response appends the charset
+# Label used for requests that matched no route, so stray paths can't grow the series count
+UNMATCHED_ROUTE = "unmatched"
+# Commands whose start was seen but whose outcome wasn't (dropped connections); bounds that map
+MAX_PENDING_MONGO_COMMANDS = int(os.getenv("MAX_PENDING_MONGO_COMMANDS", "10000"))
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Observations can come from pymongo and crypto pool threads
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}" for labels, value in values
+        ]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket counts (not cumulative, plus +Inf) and the sum
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        lines = self.header()
+        for labels, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class Registry:
+    """Process-wide metrics, rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests handled, by route template and status", ("method", "route", "status")
+))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request, by route template", ("method", "route")
+))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled"
+))
+mongo_command_duration_seconds = registry.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command round trip time", ("command", "collection")
+))
+mongo_command_failures_total = registry.register(Counter(
+    "mongo_command_failures_total", "MongoDB commands that returned an error", ("command", "collection")
+))
+hibp_request_duration_seconds = registry.register(Histogram(
+    "hibp_request_duration_seconds", "Outbound Have I Been Pwned request time, by API and response status", ("api", "status")
+))
+password_hash_duration_seconds = registry.register(Histogram(
+    "password_hash_duration_seconds", "bcrypt time spent hashing or verifying account passwords", ("operation",),
+    buckets=HASHING_BUCKETS
+))
+fernet_duration_seconds = registry.register(Histogram(
+    "fernet_duration_seconds", "Time spent in Fernet encrypting or decrypting vault secrets, per call or batch chunk", ("operation",)
+))
+fernet_items_total = registry.register(Counter(
+    "fernet_items_total", "Vault secrets encrypted or decrypted with Fernet", ("operation",)
+))
+
+# ASGI scope of the request being handled. Routing fills in scope["route"]
+# before the endpoint runs, so anything the request awaits (Motor copies the
+# context into its executor threads too) can tell which route it serves.
+current_request_scope: ContextVar[Optional[dict]] = ContextVar("current_request_scope", default=None)
+
+def route_label(scope: dict) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+def current_route() -> Optional[str]:
+    """Route template of the request being handled, or None outside a request"""
+    scope = current_request_scope.get()
+    return None if scope is None else route_label(scope)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request against its route template.
+
+    Route templates ("/api/v1/passwords/{password_id}") rather than raw paths
+    keep the number of series bounded. Streaming responses are timed until
+    their last body chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        token = current_request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request_scope.reset(token)
+            http_requests_in_flight.dec()
+            route = route_label(scope)
+            http_request_duration_seconds.observe(time.perf_counter() - started, scope["method"], route)
+            http_requests_total.inc(scope["method"], route, str(status_code))
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the driver sends, labelled by command and collection"""
+
+    def __init__(self):
+        self._collections: Dict[Tuple[int, int], str] = {}
+
+    @staticmethod
+    def _key(event) -> Tuple[int, int]:
+        return event.request_id, event.operation_id
+
+    def started(self, event):
+        if len(self._collections) >= MAX_PENDING_MONGO_COMMANDS:
+            self._collections.clear()
+        collection = event.command.get(event.command_name)
+        self._collections[self._key(event)] = collection if isinstance(collection, str) else ""
+
+    def succeeded(self, event):
+        collection = self._collections.pop(self._key(event), "")
+        mongo_command_duration_seconds.observe(event.duration_micros / 1e6, event.command_name, collection)
+
+    def failed(self, event):
+        collection = self._collections.pop(self._key(event), "")
+        mongo_command_duration_seconds.observe(event.duration_micros / 1e6, event.command_name, collection)
+        mongo_command_failures_total.inc(event.command_name, collection)
+
+mongo_command_metrics = MongoCommandMetrics()
+
+mongo_pool_connections = registry.register(Gauge(
+    "mongo_pool_connections", "Connections open in the MongoDB driver pool", ("address",)
+))
+mongo_pool_checked_out = registry.register(Gauge(
+    "mongo_pool_checked_out", "Pooled MongoDB connections currently in use", ("address",)
+))
+mongo_pool_waiting = registry.register(Gauge(
+    "mongo_pool_waiting", "Operations waiting for a pooled MongoDB connection", ("address",)
+))
+mongo_pool_checkout_failures_total = registry.register(Counter(
+    "mongo_pool_checkout_failures_total", "Connection checkouts that failed or timed out", ("address", "reason")
+))
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Tracks the driver's connection pools (open, in use and waiting) per server"""
+
+    def __init__(self):
+        self._pools: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _update(self, address, **deltas):
+        label = "%s:%s" % address
+        with self._lock:
+            pool = self._pools.setdefault(label, {"connections": 0, "checked_out": 0, "waiting": 0})
+            for key, delta in deltas.items():
+                pool[key] = max(pool[key] + delta, 0)
+            snapshot = dict(pool)
+        mongo_pool_connections.set(snapshot["connections"], label)
+        mongo_pool_checked_out.set(snapshot["checked_out"], label)
+        mongo_pool_waiting.set(snapshot["waiting"], label)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {label: dict(pool) for label, pool in self._pools.items()}
+
+    def pool_created(self, event):
+        self._update(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._pools.pop("%s:%s" % event.address, None)
+
+    def connection_created(self, event):
+        self._update(event.address, connections=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, connections=-1)
+
+    def connection_check_out_started(self, event):
+        self._update(event.address, waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, waiting=-1)
+        mongo_pool_checkout_failures_total.inc("%s:%s" % event.address, str(event.reason))
+
+    def connection_checked_out(self, event):
+        self._update(event.address, waiting=-1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, checked_out=-1)
+
+mongo_pool_metrics = MongoPoolMetrics()
+
+@contextmanager
+def time_fernet(operation: str, items: int = 1):
+    fernet_items_total.inc(operation, amount=items)
+    with fernet_duration_seconds.time(operation):
+        yield
@@ -0,0 +1,45 @@
+from collections import Counter
+from typing import Iterable
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+# Per-user unread notification counters, kept next to the notifications so
+# the badge count never needs a count over the user's whole history.
+
+async def adjust_unread_count(db, user_id, delta: int):
+    """Apply a change to the user's maintained unread counter.
+
+    Only existing counters are changed: a missing one is seeded from the
+    notifications themselves by get_unread_count, which already includes
+    this change.
+    """
+    if delta:
+        await db["notification_counters"].update_one(
+            {"_id": ObjectId(user_id)},
+            {"$inc": {"unread": delta}}
+        )
+
+async def add_unread_notifications(db, user_ids: Iterable):
+    """Count one new unread notification per entry in user_ids"""
+    unread_by_user = Counter(ObjectId(user_id) for user_id in user_ids)
+    if unread_by_user:
+        await db["notification_counters"].bulk_write(
+            [UpdateOne({"_id": user_id}, {"$inc": {"unread": count}})
+             for user_id, count in unread_by_user.items()],
+            ordered=False
+        )
+
+async def get_unread_count(db, user_id) -> int:
+    counter = await db["notification_counters"].find_one({"_id": ObjectId(user_id)})
+    if counter is None:
+        # First read for this user: seed the counter once from the index
+        unread = await db["activity_notifications"].count_documents(
+            {"user_id": ObjectId(user_id), "is_read": False}
+        )
+        counter = await db["notification_counters"].find_one_and_update(
+            {"_id": ObjectId(user_id)},
+            {"$setOnInsert": {"unread": unread}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    return max(counter["unread"], 0)
@@ -0,0 +1,149 @@
+import asyncio
+import os
+from collections import defaultdict
+from typing import Dict, Optional, Set, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from ..database import get_db
+from ..schemas import ActivityNotificationResponse, BreachAlertResponse
+
+# Event kinds and the collection each one is stored in
+NOTIFICATION_COLLECTIONS = {
+    "activity_notification": "activity_notifications",
+    "breach_alert": "breach_alerts",
+}
+EVENT_RESPONSE_MODELS = {
+    "activity_notification": ActivityNotificationResponse,
+    "breach_alert": BreachAlertResponse,
+}
+
+# Events buffered per open stream before the subscriber is considered too slow
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("NOTIFICATION_STREAM_QUEUE_SIZE", "100"))
+
+# Sentinel telling a stream it fell behind and should resume from its last event id
+OVERFLOW = object()
+
+def build_event(kind: str, document: dict) -> dict:
+    """Turn a stored notification or alert into a stream event.
+
+    The event id is the document's place in the owner's change sequence,
+    with its id to order documents sharing a number (see replay_events).
+    """
+    payload = EVENT_RESPONSE_MODELS[kind](**document).model_dump(mode="json", by_alias=True)
+    return {"id": f"{document.get('change_seq', 0)}-{document['_id']}", "event": kind, "data": payload}
+
+def parse_event_id(event_id: str) -> Optional[Tuple[int, ObjectId]]:
+    """The (change_seq, _id) an event id was built from, or None if it isn't one"""
+    change_seq, _, document_id = event_id.partition("-")
+    try:
+        return int(change_seq), ObjectId(document_id)
+    except (ValueError, InvalidId):
+        return None
+
+class NotificationHub:
+    """Per-user fan-out of notification events to the streams open on this worker"""
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[str(user_id)].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(str(user_id))
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[str(user_id)]
+
+    def dispatch(self, user_id: str, event: dict):
+        for queue in list(self._subscribers.get(str(user_id), ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Drop the backlog rather than block publishers; the client
+                # reconnects with its last event id and replays from MongoDB.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(OVERFLOW)
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+class LocalBroker:
+    """Delivers events to streams on this worker only (single worker deployments and tests)"""
+
+    def __init__(self, hub: NotificationHub):
+        self.hub = hub
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, user_id: str, event: dict):
+        self.hub.dispatch(user_id, event)
+
+class MongoChangeStreamBroker:
+    """Cross-worker delivery through MongoDB change streams (needs a replica set).
+
+    Publishing is implicit: every worker watches inserts into the notification
+    collections and fans them out to its own streams, so whichever worker
+    wrote the document, every connected client sees it.
+    """
+
+    def __init__(self, hub: NotificationHub):
+        self.hub = hub
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def publish(self, user_id: str, event: dict):
+        pass # Delivered by the change stream watcher on every worker
+
+    async def _watch(self):
+        collection_kinds = {collection: kind for kind, collection in NOTIFICATION_COLLECTIONS.items()}
+        pipeline = [{"$match": {
+            "operationType": "insert",
+            "ns.coll": {"$in": list(collection_kinds)},
+        }}]
+        resume_token = None
+        while True:
+            try:
+                async with get_db().watch(pipeline, resume_after=resume_token) as stream:
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        document = change["fullDocument"]
+                        kind = collection_kinds[change["ns"]["coll"]]
+                        self.hub.dispatch(str(document["user_id"]), build_event(kind, document))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Notification change stream failed, reconnecting: {str(e)}")
+                await asyncio.sleep(1)
+
+BROKERS = {
+    "local": LocalBroker,
+    "mongo": MongoChangeStreamBroker,
+}
+
+hub = NotificationHub()
+broker = BROKERS[os.getenv("NOTIFICATION_BROKER", "local")](hub)
+
+async def publish_notification(user_id, kind: str, document: dict):
+    """Publish a freshly stored notification or alert to the user's open streams"""
+    await broker.publish(str(user_id), build_event(kind, document))
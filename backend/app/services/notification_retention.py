@@ -0,0 +1,221 @@
+import os
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from ..database import get_db
+from .change_feed import SYNCED_COLLECTIONS, record_deletions
+from .notification_counters import adjust_unread_count
+
+# Read notifications are purged this long after being read (0 keeps them).
+# They are synced, so this is a job leaving tombstones rather than a TTL index.
+NOTIFICATION_READ_TTL_DAYS = int(os.getenv("NOTIFICATION_READ_TTL_DAYS", "30"))
+# Read notifications purged per round trip
+NOTIFICATION_PURGE_BATCH_SIZE = 1000
+# Resolved breach alerts are removed this long after being resolved (0 keeps them)
+BREACH_ALERT_RESOLVED_TTL_DAYS = int(os.getenv("BREACH_ALERT_RESOLVED_TTL_DAYS", "90"))
+# Events older than this are rolled up into per-day digests
+NOTIFICATION_COMPACT_AFTER_DAYS = int(os.getenv("NOTIFICATION_COMPACT_AFTER_DAYS", "90"))
+# Events folded into digests per round trip
+COMPACTION_BATCH_SIZE = 1000
+# Batch ids remembered per digest so a retried batch is never counted twice
+COMPACTION_APPLIED_BATCHES_KEPT = 32
+# How often the compaction job runs
+NOTIFICATION_COMPACTION_INTERVAL_MINUTES = int(os.getenv("NOTIFICATION_COMPACTION_INTERVAL_MINUTES", "60"))
+
+# What gets compacted for each event kind: the source collection, the field
+# the digest breaks counts down by, and which documents are eligible.
+COMPACTION_SOURCES = {
+    "activity_notification": {
+        "collection": "activity_notifications",
+        "type_field": "type",
+        "match": {},
+    },
+    "breach_alert": {
+        "collection": "breach_alerts",
+        "type_field": "severity",
+        # Open alerts stay in the hot collection until they are resolved
+        "match": {"is_resolved": True},
+    },
+}
+
+async def _ensure_ttl_index(collection, field: str, ttl_days: int, partial_filter: dict):
+    name = f"{field}_ttl"
+    if ttl_days <= 0:
+        indexes = await collection.index_information()
+        if name in indexes:
+            await collection.drop_index(name)
+        return
+    expire_after = ttl_days * 24 * 3600
+    try:
+        await collection.create_index(
+            [(field, ASCENDING)],
+            name=name,
+            expireAfterSeconds=expire_after,
+            partialFilterExpression=partial_filter
+        )
+    except OperationFailure as e:
+        if e.code not in (85, 86): # IndexOptionsConflict / IndexKeySpecsConflict
+            raise
+        # The retention period changed since the index was built
+        await collection.database.command(
+            "collMod", collection.name,
+            index={"name": name, "expireAfterSeconds": expire_after}
+        )
+
+async def ensure_indexes(db):
+    # Replaced by purge_read_notifications; the TTL index deleted without tombstones
+    await _ensure_ttl_index(db["activity_notifications"], "read_at", 0, {})
+    await db["activity_notifications"].create_index(
+        [("read_at", ASCENDING)], name="read_at_purge", partialFilterExpression={"is_read": True}
+    )
+    await _ensure_ttl_index(db["breach_alerts"], "resolved_at", BREACH_ALERT_RESOLVED_TTL_DAYS, {"is_resolved": True})
+    await db["breach_alerts"].create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+    # Compaction scans by age across all users
+    await db["activity_notifications"].create_index([("created_at", ASCENDING)])
+    await db["breach_alerts"].create_index([("created_at", ASCENDING)])
+    for source in COMPACTION_SOURCES.values():
+        # Finds batches a crashed run left half done
+        await db[source["collection"]].create_index([("compaction_batch", ASCENDING)], sparse=True)
+    await db["notification_digests"].create_index(
+        [("user_id", ASCENDING), ("day", DESCENDING), ("kind", ASCENDING)], unique=True
+    )
+
+async def _record_tombstones(db, kind: str, documents: list):
+    if kind not in SYNCED_COLLECTIONS:
+        return
+    ids_by_user = {}
+    for document in documents:
+        ids_by_user.setdefault(document["user_id"], []).append(document["_id"])
+    for user_id, item_ids in ids_by_user.items():
+        await record_deletions(db, user_id, kind, item_ids)
+
+async def purge_read_notifications(db=None) -> int:
+    """Delete notifications read more than NOTIFICATION_READ_TTL_DAYS ago, leaving tombstones"""
+    if NOTIFICATION_READ_TTL_DAYS <= 0:
+        return 0
+    db = db if db is not None else get_db()
+    collection = db["activity_notifications"]
+    cutoff = datetime.utcnow() - timedelta(days=NOTIFICATION_READ_TTL_DAYS)
+    purged = 0
+    while True:
+        batch = await collection.find(
+            {"is_read": True, "read_at": {"$lt": cutoff}}, {"user_id": 1}
+        ).limit(NOTIFICATION_PURGE_BATCH_SIZE).to_list(length=NOTIFICATION_PURGE_BATCH_SIZE)
+        if not batch:
+            return purged
+        # Tombstones first: a crash in between leaves an extra tombstone, never a silent delete
+        await _record_tombstones(db, "activity_notification", batch)
+        result = await collection.delete_many({"_id": {"$in": [document["_id"] for document in batch]}, "is_read": True})
+        purged += result.deleted_count
+
+async def _compact_batch(db, kind: str, source: dict, batch_id: ObjectId):
+    """Fold the events stamped with batch_id into digests, then delete them; returns how many.
+
+    Safe to run again for the same batch after a crash: each digest records
+    the batches it already counted, and only stamped events are touched.
+    """
+    collection = db[source["collection"]]
+    rows = await collection.aggregate([
+        {"$match": {"compaction_batch": batch_id}},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                "type": f"${source['type_field']}",
+            },
+            "count": {"$sum": 1},
+            "first_at": {"$min": "$created_at"},
+            "last_at": {"$max": "$created_at"},
+        }},
+    ]).to_list(length=None)
+
+    # Rows for the same digest (one per type) are merged so each digest takes
+    # the whole batch in a single write
+    digests = {}
+    for row in rows:
+        key = row["_id"]
+        digest_key = (key["user_id"], key["day"])
+        digest = digests.setdefault(digest_key, {"total": 0, "counts": {}, "first_at": row["first_at"], "last_at": row["last_at"]})
+        type_key = str(key.get("type") or "unknown").replace(".", "_").replace("$", "_")
+        digest["total"] += row["count"]
+        digest["counts"][f"counts.{type_key}"] = digest["counts"].get(f"counts.{type_key}", 0) + row["count"]
+        digest["first_at"] = min(digest["first_at"], row["first_at"])
+        digest["last_at"] = max(digest["last_at"], row["last_at"])
+
+    digest_updates = [
+        UpdateOne(
+            # A digest that already lists this batch doesn't match, and the
+            # upsert then collides with it on the unique index instead
+            {"user_id": user_id, "day": datetime.strptime(day, "%Y-%m-%d"), "kind": kind, "batches": {"$ne": batch_id}},
+            {
+                "$inc": {"total": digest["total"], **digest["counts"]},
+                "$min": {"first_at": digest["first_at"]},
+                "$max": {"last_at": digest["last_at"]},
+                "$push": {"batches": {"$each": [batch_id], "$slice": -COMPACTION_APPLIED_BATCHES_KEPT}},
+            },
+            upsert=True
+        )
+        for (user_id, day), digest in digests.items()
+    ]
+    if digest_updates:
+        try:
+            await db["notification_digests"].bulk_write(digest_updates, ordered=False)
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+            # Duplicate keys are digests this batch was already applied to
+
+    # Synced clients hold these events; tell them they are gone. Repeating
+    # this for a retried batch only repeats tombstones, which sync tolerates.
+    await _record_tombstones(db, kind, await collection.find({"compaction_batch": batch_id}, {"user_id": 1}).to_list(length=None))
+
+    deleted = 0
+    if kind == "activity_notification":
+        # Delete unread events per user first so the unread counters drop by
+        # exactly what was removed, even if the user is marking some read now.
+        unread_users = await collection.distinct("user_id", {"compaction_batch": batch_id, "is_read": False})
+        for user_id in unread_users:
+            result = await collection.delete_many({"compaction_batch": batch_id, "user_id": user_id, "is_read": False})
+            await adjust_unread_count(db, user_id, -result.deleted_count)
+            deleted += result.deleted_count
+
+    result = await collection.delete_many({"compaction_batch": batch_id})
+    return deleted + result.deleted_count
+
+async def _next_batch(collection, source: dict, cutoff: datetime):
+    """Id of the next batch to compact, resuming one a crashed run left stamped"""
+    leftover = await collection.find_one({"compaction_batch": {"$exists": True}}, {"compaction_batch": 1})
+    if leftover is not None:
+        return leftover["compaction_batch"]
+    batch = await collection.find(
+        {"created_at": {"$lt": cutoff}, "compaction_batch": {"$exists": False}, **source["match"]}, {"_id": 1}
+    ).limit(COMPACTION_BATCH_SIZE).to_list(length=COMPACTION_BATCH_SIZE)
+    if not batch:
+        return None
+    batch_id = ObjectId()
+    await collection.update_many(
+        {"_id": {"$in": [document["_id"] for document in batch]}, "compaction_batch": {"$exists": False}},
+        {"$set": {"compaction_batch": batch_id}}
+    )
+    return batch_id
+
+async def compact_notifications(db=None) -> dict:
+    """Roll events older than NOTIFICATION_COMPACT_AFTER_DAYS into per-day digests.
+
+    Each batch is stamped, aggregated into digest counters and then deleted,
+    so the hot collections only hold recent events.
+    """
+    db = db if db is not None else get_db()
+    cutoff = datetime.utcnow() - timedelta(days=NOTIFICATION_COMPACT_AFTER_DAYS)
+    compacted = {}
+    for kind, source in COMPACTION_SOURCES.items():
+        collection = db[source["collection"]]
+        compacted[kind] = 0
+        while True:
+            batch_id = await _next_batch(collection, source, cutoff)
+            if batch_id is None:
+                break
+            compacted[kind] += await _compact_batch(db, kind, source, batch_id)
+    return compacted
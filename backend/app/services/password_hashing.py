@@ -0,0 +1,62 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+
+from .metrics import Gauge, password_hash_duration_seconds, registry
+
+PASSWORD_HASHING_THREADS = int(os.getenv("PASSWORD_HASHING_THREADS", str(os.cpu_count() or 1)))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt releases the GIL while it works, so hashing on these threads keeps
+# the event loop serving other requests during each ~100ms+ hash.
+_hashing_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASHING_THREADS, thread_name_prefix="bcrypt")
+_outstanding = 0
+_outstanding_lock = threading.Lock()
+
+password_hashing_outstanding = registry.register(Gauge(
+    "password_hashing_outstanding", "bcrypt jobs running or queued on the hashing pool"
+))
+
+def verify_password(plain_password, hashed_password) -> bool:
+    with password_hash_duration_seconds.time("verify"):
+        return pwd_context.verify(plain_password, hashed_password)
+
+def get_password_hash(password) -> str:
+    with password_hash_duration_seconds.time("hash"):
+        return pwd_context.hash(password)
+
+def _track(delta: int):
+    global _outstanding
+    with _outstanding_lock:
+        _outstanding += delta
+        password_hashing_outstanding.set(_outstanding)
+
+def _run_tracked(func, *args):
+    try:
+        return func(*args)
+    finally:
+        _track(-1)
+
+async def _run_on_pool(func, *args):
+    _track(1)
+    return await asyncio.get_running_loop().run_in_executor(_hashing_executor, _run_tracked, func, *args)
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    """verify_password on the hashing pool"""
+    return await _run_on_pool(verify_password, plain_password, hashed_password)
+
+async def hash_password_async(password) -> str:
+    """get_password_hash on the hashing pool"""
+    return await _run_on_pool(get_password_hash, password)
+
+def pool_stats() -> dict:
+    """Jobs on the hashing pool; queued ones wait for a free thread"""
+    outstanding = _outstanding
+    return {
+        "threads": PASSWORD_HASHING_THREADS,
+        "running": min(outstanding, PASSWORD_HASHING_THREADS),
+        "queued": max(outstanding - PASSWORD_HASHING_THREADS, 0),
+    }
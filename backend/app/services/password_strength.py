@@ -0,0 +1,238 @@
+import math
+import mmap
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Directory holding the compiled dictionaries (sorted "word\trank" lines)
+PASSWORD_DICTIONARY_DIR = os.getenv(
+    "PASSWORD_DICTIONARY_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "dictionaries")
+)
+# Compiled from zxcvbn's frequency lists (MIT): leaked passwords, US census
+# surnames and first names, and English Wikipedia plus TV and film subtitles.
+# Keyboard walks need no dictionary; the spatial matcher scores them.
+DICTIONARIES = ["common_passwords", "names", "english"]
+# Stored next to each strength_score; bump it when the dictionaries or the
+# scoring change so the derived field backfill rescores older entries
+STRENGTH_SCORE_VERSION = 2
+# Only this much of a secret is analysed; anything longer is strong on length alone
+MAX_SCORED_LENGTH = 64
+MAX_WORD_LENGTH = 32
+
+BRUTEFORCE_CARDINALITY = 10
+MIN_SUBMATCH_GUESSES_SINGLE_CHAR = 10
+MIN_SUBMATCH_GUESSES_MULTI_CHAR = 50
+MIN_YEAR_SPACE = 20
+# Score 0-4 by estimated guesses, as in zxcvbn
+SCORE_THRESHOLDS = [1e3 + 5, 1e6 + 5, 1e8 + 5, 1e10 + 5]
+
+L33T_TABLE = str.maketrans({
+    "4": "a", "@": "a", "8": "b", "(": "c", "{": "c", "3": "e", "6": "g", "9": "g",
+    "1": "i", "!": "i", "|": "i", "0": "o", "$": "s", "5": "s", "7": "t", "+": "t", "2": "z",
+})
+
+KEYBOARD_ROWS = {
+    "qwerty": ["1234567890-=", "qwertyuiop[]", "asdfghjkl;'", "zxcvbnm,./"],
+    "keypad": ["789", "456", "123", "0"],
+}
+YEAR_PATTERN = re.compile(r"19\d\d|20\d\d")
+REPEAT_PATTERN = re.compile(r"(.+?)\1+")
+
+class MappedDictionary:
+    """A sorted "word\\trank" file, memory-mapped and binary searched in place.
+
+    Nothing is parsed up front, and since the mapping is read-only every
+    worker process shares the same page cache copy of the file.
+    """
+
+    def __init__(self, path: str):
+        self._map = None
+        if os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def lookup(self, word: str) -> Tuple[Optional[int], bool]:
+        """Return the word's rank (None if absent) and whether longer words start with it"""
+        if self._map is None:
+            return None, False
+        key = word.encode()
+        data = self._map
+        lo, hi = 0, len(data)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            newline = data.rfind(b"\n", lo, mid)
+            start = lo if newline == -1 else newline + 1
+            end = data.find(b"\n", start)
+            if end == -1:
+                end = len(data)
+            entry, _, rank = data[start:end].partition(b"\t")
+            if entry == key:
+                return int(rank), data[end + 1:end + 1 + len(key)] == key
+            if entry < key:
+                lo = end + 1
+            else:
+                hi = start
+        # lo is now the first entry sorting after the word
+        return None, data[lo:lo + len(key)] == key
+
+def compile_dictionary(ranked_words: List[str], path: str):
+    """Write words (most common first) as a sorted dictionary file for MappedDictionary"""
+    ranks = {}
+    for rank, word in enumerate(ranked_words, start=1):
+        word = word.strip().lower()
+        if word and "\t" not in word and word not in ranks:
+            ranks[word] = rank
+    lines = sorted(f"{word}\t{rank}".encode() for word, rank in ranks.items())
+    with open(path, "wb") as f:
+        f.write(b"\n".join(lines))
+
+_dictionaries: Optional[Dict[str, MappedDictionary]] = None
+
+def get_dictionaries() -> Dict[str, MappedDictionary]:
+    global _dictionaries
+    if _dictionaries is None:
+        _dictionaries = {
+            name: MappedDictionary(os.path.join(PASSWORD_DICTIONARY_DIR, f"{name}.txt"))
+            for name in DICTIONARIES
+        }
+    return _dictionaries
+
+def _build_adjacency(rows: List[str]) -> Dict[str, set]:
+    positions = {char: (r, c) for r, row in enumerate(rows) for c, char in enumerate(row)}
+    adjacency = {}
+    for char, (r, c) in positions.items():
+        adjacency[char] = {
+            other for other, (r2, c2) in positions.items()
+            if other != char and abs(r - r2) <= 1 and abs(c - c2) <= 1
+        }
+    return adjacency
+
+KEYBOARD_GRAPHS = {name: _build_adjacency(rows) for name, rows in KEYBOARD_ROWS.items()}
+
+def _uppercase_variations(token: str) -> int:
+    upper = sum(1 for char in token if char.isupper())
+    lower = sum(1 for char in token if char.islower())
+    if upper == 0:
+        return 1
+    if token.isupper() or (upper == 1 and (token[0].isupper() or token[-1].isupper())):
+        return 2
+    return sum(math.comb(upper + lower, i) for i in range(1, min(upper, lower) + 1))
+
+def _dictionary_matches(password: str) -> List[tuple]:
+    lowered = password.lower()
+    unleeted = lowered.translate(L33T_TABLE)
+    matches = []
+    for dictionary in get_dictionaries().values():
+        for candidate, is_l33t in ((lowered, False), (unleeted, True)):
+            if is_l33t and unleeted == lowered:
+                continue
+            for i in range(len(candidate)):
+                for j in range(i + 1, min(len(candidate), i + MAX_WORD_LENGTH) + 1):
+                    rank, has_longer = dictionary.lookup(candidate[i:j])
+                    if rank is not None and j - i > 1:
+                        guesses = rank * _uppercase_variations(password[i:j])
+                        if is_l33t:
+                            substitutions = sum(1 for a, b in zip(lowered[i:j], candidate[i:j]) if a != b)
+                            guesses *= 2 ** substitutions if substitutions else 1
+                        matches.append((i, j, guesses))
+                    if not has_longer:
+                        break
+    return matches
+
+def _spatial_matches(password: str) -> List[tuple]:
+    lowered = password.lower()
+    matches = []
+    for graph in KEYBOARD_GRAPHS.values():
+        starting_positions = len(graph)
+        average_degree = sum(len(neighbours) for neighbours in graph.values()) / len(graph)
+        i = 0
+        while i < len(lowered) - 2:
+            j = i + 1
+            while j < len(lowered) and lowered[j] in graph.get(lowered[j - 1], ()):
+                j += 1
+            if j - i >= 3:
+                # zxcvbn's estimate, treating every key as a potential turn
+                length = j - i
+                guesses = sum(
+                    math.comb(step - 1, turns - 1) * starting_positions * average_degree ** turns
+                    for step in range(2, length + 1)
+                    for turns in range(1, min(length - 1, step - 1) + 1)
+                )
+                matches.append((i, j, guesses * _uppercase_variations(password[i:j])))
+                i = j
+            else:
+                i += 1
+    return matches
+
+def _sequence_matches(password: str) -> List[tuple]:
+    matches = []
+    i = 0
+    while i < len(password) - 2:
+        delta = ord(password[i + 1]) - ord(password[i])
+        j = i + 1
+        while j < len(password) and abs(delta) == 1 and ord(password[j]) - ord(password[j - 1]) == delta:
+            j += 1
+        if j - i >= 3:
+            first = password[i]
+            if first in "aAzZ019":
+                base = 4
+            elif first.isdigit():
+                base = 10
+            else:
+                base = 26
+            matches.append((i, j, base * (j - i) * (1 if delta > 0 else 2)))
+            i = j
+        else:
+            i += 1
+    return matches
+
+def _repeat_matches(password: str) -> List[tuple]:
+    matches = []
+    for match in REPEAT_PATTERN.finditer(password):
+        base = match.group(1)
+        repeats = len(match.group(0)) // len(base)
+        matches.append((match.start(), match.end(), estimate_guesses(base) * repeats))
+    return matches
+
+def _year_matches(password: str) -> List[tuple]:
+    reference_year = datetime.utcnow().year
+    return [
+        (match.start(), match.end(), max(abs(int(match.group(0)) - reference_year), MIN_YEAR_SPACE))
+        for match in YEAR_PATTERN.finditer(password)
+    ]
+
+def estimate_guesses(password: str) -> float:
+    """Fewest guesses needed to find the password by any decomposition into patterns"""
+    password = password[:MAX_SCORED_LENGTH]
+    if not password:
+        return 1
+    ending_at: Dict[int, List[tuple]] = {}
+    for matcher in (_dictionary_matches, _spatial_matches, _sequence_matches, _repeat_matches, _year_matches):
+        for i, j, guesses in matcher(password):
+            minimum = MIN_SUBMATCH_GUESSES_SINGLE_CHAR if j - i == 1 else MIN_SUBMATCH_GUESSES_MULTI_CHAR
+            ending_at.setdefault(j, []).append((i, max(guesses, minimum)))
+
+    # best[k] is the log10 guesses of the cheapest decomposition of password[:k]
+    best = [0.0] + [math.inf] * len(password)
+    for k in range(1, len(password) + 1):
+        best[k] = best[k - 1] + math.log10(BRUTEFORCE_CARDINALITY)
+        for i, guesses in ending_at.get(k, ()):
+            best[k] = min(best[k], best[i] + math.log10(guesses))
+    return 10 ** best[len(password)]
+
+def score_password(password: str) -> int:
+    """zxcvbn-style strength score from 0 (trivially guessable) to 4 (very strong)"""
+    guesses = estimate_guesses(password)
+    for score, threshold in enumerate(SCORE_THRESHOLDS):
+        if guesses < threshold:
+            return score
+    return 4
+
+if __name__ == "__main__":
+    # Compile ranked word lists: python -m app.services.password_strength <ranked.txt> <name>
+    source, name = sys.argv[1], sys.argv[2]
+    with open(source, encoding="utf-8") as f:
+        words = f.read().splitlines()
+    compile_dictionary(words, os.path.join(PASSWORD_DICTIONARY_DIR, f"{name}.txt"))
@@ -0,0 +1,110 @@
+import ipaddress
+import os
+from typing import Optional
+from urllib.parse import urlsplit
+
+PUBLIC_SUFFIX_LIST_PATH = os.getenv(
+    "PUBLIC_SUFFIX_LIST_PATH", os.path.join(os.path.dirname(__file__), "..", "data", "public_suffix_list.dat")
+)
+
+# Trie node keys that can't collide with a DNS label
+_RULE = "$"
+_EXCEPTION = "!"
+
+_trie: Optional[dict] = None
+
+def _read_list_version(path: str) -> str:
+    """The VERSION stamp upstream puts in the list's header"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("// VERSION:"):
+                return line.split(":", 1)[1].strip()
+            if line.strip() and not line.startswith("//"):
+                break
+    return "unversioned"
+
+# Stored next to each website_domain so entries resolved against an older
+# list are resolved again by the derived field backfill
+PUBLIC_SUFFIX_LIST_VERSION = _read_list_version(PUBLIC_SUFFIX_LIST_PATH)
+
+def compile_public_suffix_list(path: str = PUBLIC_SUFFIX_LIST_PATH) -> dict:
+    """Compile a public suffix list into a trie keyed by labels from the right"""
+    root: dict = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            rule = line.split()[0] if line.strip() else ""
+            if not rule or rule.startswith("//"):
+                continue
+            exception = rule.startswith("!")
+            node = root
+            for label in reversed(rule.lstrip("!").split(".")):
+                node = node.setdefault(label.encode("idna").decode() if label != "*" else label, {})
+            node[_EXCEPTION if exception else _RULE] = True
+    return root
+
+def _get_trie() -> dict:
+    global _trie
+    if _trie is None:
+        _trie = compile_public_suffix_list()
+    return _trie
+
+def _public_suffix_length(labels: list) -> int:
+    """Number of trailing labels forming the public suffix, per the PSL algorithm"""
+    node = _get_trie()
+    # Unlisted TLDs fall back to the implicit "*" rule
+    suffix_length = 1
+    for depth, label in enumerate(reversed(labels), start=1):
+        child = node.get(label)
+        if child is not None and child.get(_EXCEPTION):
+            # An exception rule makes its parent the public suffix
+            return depth - 1
+        wildcard = node.get("*")
+        if wildcard is not None and wildcard.get(_RULE):
+            suffix_length = depth
+        if child is None:
+            break
+        if child.get(_RULE):
+            suffix_length = depth
+        node = child
+    return suffix_length
+
+def _hostname(url: str) -> Optional[str]:
+    url = url.strip()
+    if "://" not in url:
+        # Bare hosts like "example.com/login" are common in saved entries
+        url = f"//{url}"
+    try:
+        hostname = urlsplit(url).hostname
+    except ValueError:
+        return None
+    if not hostname:
+        return None
+    hostname = hostname.rstrip(".")
+    try:
+        return hostname.encode("idna").decode()
+    except UnicodeError:
+        return hostname
+
+def registrable_domain(url: str) -> Optional[str]:
+    """The registrable domain (eTLD+1) a URL belongs to, e.g. "accounts.google.co.uk" -> "google.co.uk".
+
+    IP addresses and single-label hosts such as "localhost" are returned as
+    is. Returns None if no host can be parsed or the host is itself a
+    public suffix.
+    """
+    hostname = _hostname(url) if url else None
+    if not hostname:
+        return None
+    try:
+        ipaddress.ip_address(hostname)
+        return hostname
+    except ValueError:
+        pass
+
+    labels = hostname.split(".")
+    if len(labels) == 1:
+        return hostname
+    suffix_length = _public_suffix_length(labels)
+    if suffix_length >= len(labels):
+        return None
+    return ".".join(labels[-(suffix_length + 1):])
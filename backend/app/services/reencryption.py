@@ -0,0 +1,248 @@
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from cryptography.fernet import InvalidToken
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from ..database import get_db
+from .encryption import KEY_SCHEME, get_user_cipher, master_cipher, rewrap_user_keys, run_crypto_batch
+
+# Collections holding secrets, walked in this order
+SECRET_COLLECTIONS = ["passwords", "social_accounts"]
+
+JOB_ID = "reencrypt_secrets"
+REENCRYPTION_BATCH_SIZE = int(os.getenv("REENCRYPTION_BATCH_SIZE", "500"))
+REENCRYPTION_OPS_PER_SECOND = int(os.getenv("REENCRYPTION_OPS_PER_SECOND", "2000"))
+# A worker must renew its claim on the job this often or another worker may take over
+LEASE_SECONDS = 60
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+async def reencrypt_documents(db, documents: list) -> tuple:
+    """Re-encrypt legacy secrets under their owner's data key.
+
+    Returns the bulk updates to apply, how many of them carry a new
+    ciphertext, and how many documents could not be decrypted with any
+    known key.
+    """
+    ciphers = {}
+    for document in documents:
+        if document["user_id"] not in ciphers:
+            ciphers[document["user_id"]] = await get_user_cipher(db, document["user_id"])
+
+    def reencrypt(document: dict):
+        """Returns the new ciphertext, None if already current, or False if undecryptable"""
+        cipher = ciphers[document["user_id"]]
+        token = document["encrypted_password"].encode()
+        try:
+            cipher.decrypt(token)
+            # Already under the data key (written after envelope encryption)
+            return None
+        except InvalidToken:
+            pass
+        try:
+            return cipher.encrypt(master_cipher.decrypt(token)).decode()
+        except InvalidToken:
+            return False
+
+    updates = []
+    reencrypted = 0
+    failed = 0
+    new_tokens = await run_crypto_batch(reencrypt, documents)
+    for document, new_token in zip(documents, new_tokens):
+        if new_token is False:
+            failed += 1
+            continue
+
+        update = {"key_scheme": KEY_SCHEME}
+        if new_token is not None:
+            update["encrypted_password"] = new_token
+            reencrypted += 1
+        # Matching on the old ciphertext keeps a concurrent user edit from being overwritten
+        updates.append(UpdateOne(
+            {"_id": document["_id"], "encrypted_password": document["encrypted_password"]},
+            {"$set": update}
+        ))
+    return updates, reencrypted, failed
+
+class ReencryptionJob:
+    """Online, resumable re-encryption of every stored secret.
+
+    Progress is checkpointed in the maintenance_jobs collection after every
+    batch, so the job survives restarts and can be paused and resumed. Only
+    one worker runs it at a time, holding a renewable lease on the job
+    document. Throughput is capped at target_ops_per_second.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def status(self) -> Optional[dict]:
+        state = await get_db()["maintenance_jobs"].find_one({"_id": JOB_ID})
+        if state is not None and state.get("total"):
+            state["percent_complete"] = round(100 * state["processed"] / state["total"], 2)
+        return state
+
+    async def start(
+        self,
+        restart: bool = False,
+        batch_size: int = REENCRYPTION_BATCH_SIZE,
+        target_ops_per_second: int = REENCRYPTION_OPS_PER_SECOND,
+    ) -> Optional[dict]:
+        """Start or resume the job; returns None if another worker holds it"""
+        db = get_db()
+        now = datetime.utcnow()
+        # A finished rotation is never resumed; starting again begins a new pass
+        await db["maintenance_jobs"].delete_one({
+            "_id": JOB_ID,
+            "status": {"$in": ["completed", "paused", "failed"]} if restart else "completed"
+        })
+
+        total = 0
+        for collection in SECRET_COLLECTIONS:
+            total += await db[collection].estimated_document_count()
+
+        try:
+            state = await db["maintenance_jobs"].find_one_and_update(
+                {"_id": JOB_ID, "$or": [
+                    {"status": {"$ne": "running"}},
+                    {"lease_expires_at": {"$lt": now}},
+                    {"owner": WORKER_ID},
+                ]},
+                {
+                    "$set": {
+                        "status": "running",
+                        "owner": WORKER_ID,
+                        "lease_expires_at": now + timedelta(seconds=LEASE_SECONDS),
+                        "batch_size": batch_size,
+                        "target_ops_per_second": target_ops_per_second,
+                        "total": total,
+                        "updated_at": now,
+                        "error": None,
+                    },
+                    "$setOnInsert": {
+                        "collection_index": 0,
+                        "last_id": None,
+                        "processed": 0,
+                        "reencrypted": 0,
+                        "failed": 0,
+                        "started_at": now,
+                    },
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Another worker holds the job
+            return None
+
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+        return state
+
+    async def stop(self):
+        """Stop working on the job locally, leaving it to be resumed on restart"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def pause(self):
+        """Pause the job; a worker running it elsewhere stops at its next checkpoint"""
+        await self.stop()
+        await get_db()["maintenance_jobs"].update_one(
+            {"_id": JOB_ID, "status": "running"},
+            {"$set": {"status": "paused", "lease_expires_at": None, "updated_at": datetime.utcnow()}}
+        )
+
+    async def resume_if_interrupted(self):
+        """Pick the job back up after a restart if it was running when the worker died"""
+        state = await get_db()["maintenance_jobs"].find_one({"_id": JOB_ID, "status": "running"})
+        if state is not None:
+            await self.start(batch_size=state["batch_size"], target_ops_per_second=state["target_ops_per_second"])
+
+    async def _run(self):
+        db = get_db()
+        jobs = db["maintenance_jobs"]
+        try:
+            state = await jobs.find_one({"_id": JOB_ID})
+            if state["collection_index"] == 0 and state["last_id"] is None:
+                await rewrap_user_keys(db)
+
+            run_started = time.monotonic()
+            run_processed = 0
+            while state["collection_index"] < len(SECRET_COLLECTIONS):
+                collection = db[SECRET_COLLECTIONS[state["collection_index"]]]
+                query = {} if state["last_id"] is None else {"_id": {"$gt": state["last_id"]}}
+                documents = await collection.find(
+                    query, {"user_id": 1, "encrypted_password": 1, "key_scheme": 1}
+                ).sort("_id", 1).limit(state["batch_size"]).to_list(length=state["batch_size"])
+
+                if not documents:
+                    # Move on to the next collection
+                    state = await jobs.find_one_and_update(
+                        {"_id": JOB_ID, "owner": WORKER_ID, "status": "running"},
+                        {"$inc": {"collection_index": 1}, "$set": {"last_id": None, "updated_at": datetime.utcnow()}},
+                        return_document=ReturnDocument.AFTER
+                    )
+                    if state is None:
+                        return # Paused, or the lease was lost to another worker
+                    continue
+
+                pending = [document for document in documents if document.get("key_scheme") != KEY_SCHEME]
+                updates, reencrypted, failed = await reencrypt_documents(db, pending)
+                if updates:
+                    await collection.bulk_write(updates, ordered=False)
+
+                state = await jobs.find_one_and_update(
+                    {"_id": JOB_ID, "owner": WORKER_ID, "status": "running"},
+                    {
+                        "$set": {
+                            "last_id": documents[-1]["_id"],
+                            "lease_expires_at": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS),
+                            "updated_at": datetime.utcnow(),
+                        },
+                        "$inc": {
+                            "processed": len(documents),
+                            "reencrypted": reencrypted,
+                            "failed": failed,
+                        },
+                    },
+                    return_document=ReturnDocument.AFTER
+                )
+                if state is None:
+                    return
+
+                # Throttle to the target rate
+                run_processed += len(documents)
+                ahead_by = run_processed / state["target_ops_per_second"] - (time.monotonic() - run_started)
+                if ahead_by > 0:
+                    await asyncio.sleep(ahead_by)
+
+            await jobs.update_one(
+                {"_id": JOB_ID, "owner": WORKER_ID, "status": "running"},
+                {"$set": {
+                    "status": "completed",
+                    "lease_expires_at": None,
+                    "completed_at": datetime.utcnow(),
+                    "updated_at": datetime.utcnow(),
+                }}
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Re-encryption job failed: {str(e)}")
+            await jobs.update_one(
+                {"_id": JOB_ID, "owner": WORKER_ID},
+                {"$set": {"status": "failed", "error": str(e), "lease_expires_at": None, "updated_at": datetime.utcnow()}}
+            )
+
+reencryption_job = ReencryptionJob()
@@ -0,0 +1,229 @@
+import asyncio
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+from .metrics import route_label
+
+PROFILE_OUTPUT_DIR = os.getenv("PROFILE_OUTPUT_DIR", os.path.join(os.getcwd(), "profiles"))
+# The sampler needs the GIL to take a sample, so while the loop is busy the
+# interpreter's switch interval (5ms by default) is added to this
+PROFILE_SAMPLE_INTERVAL_MS = int(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+# Requests sending this header are profiled while profiling is on, whatever the sample rate
+PROFILE_REQUEST_HEADER = os.getenv("PROFILE_REQUEST_HEADER", "x-profile-request").lower().encode()
+# Profiling switches itself off after this long unless told otherwise
+PROFILE_DEFAULT_DURATION_SECONDS = 300
+PROFILE_MAX_DURATION_SECONDS = 3600
+# Deepest stack recorded per sample
+PROFILE_MAX_STACK_DEPTH = 256
+
+class ProfilingSession:
+    """What one profiling run collects: folded stack counts per route"""
+
+    def __init__(self, sample_rate: float, route: Optional[str], interval_ms: int, duration_seconds: int):
+        self.sample_rate = sample_rate
+        self.route = route
+        self.interval = interval_ms / 1000
+        self.started_at = datetime.utcnow()
+        self.deadline = time.monotonic() + duration_seconds
+        self.requests_profiled = 0
+        self.samples = 0
+        # "METHOD route" -> Counter of stacks, each a tuple of (filename, function, first line) root first
+        self.stacks: Dict[str, Counter] = {}
+
+    def wants(self, scope: dict) -> bool:
+        """Decide, before routing, whether to watch a request"""
+        if self.route is not None:
+            # Filtered on the route template once routing has run (see keeps)
+            return True
+        if any(name == PROFILE_REQUEST_HEADER for name, _ in scope.get("headers", ())):
+            return True
+        return random.random() < self.sample_rate
+
+    def keeps(self, scope: dict) -> bool:
+        if self.route is None:
+            return True
+        return route_label(scope) == self.route or scope["path"].startswith(self.route)
+
+    def describe(self) -> dict:
+        return {
+            "started_at": self.started_at,
+            "sample_rate": self.sample_rate,
+            "route": self.route,
+            "interval_ms": round(self.interval * 1000, 3),
+            "seconds_left": max(round(self.deadline - time.monotonic()), 0),
+            "requests_profiled": self.requests_profiled,
+            "samples": self.samples,
+            "routes": sorted(self.stacks),
+        }
+
+def _frame_label(code_key: tuple) -> str:
+    filename, function, first_line = code_key
+    # Semicolons separate frames in the folded format
+    return f"{function} ({os.path.basename(filename)}:{first_line})".replace(";", ":")
+
+def _file_name(route_key: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.{}-]+", "_", route_key).strip("_") + ".folded"
+
+class RequestProfiler:
+    """Statistical profiler for live requests, switched on by an admin.
+
+    While on, a thread samples the event loop thread's stack every few
+    milliseconds. A sample whose stack runs through a watched request's
+    middleware frame is charged to that request's route, so concurrent
+    requests are told apart. This is an on-CPU profile of the loop: time
+    spent awaiting I/O or in pool threads doesn't show up, but whatever
+    holds the loop does.
+
+    Output is written in folded stack format, one file per route, ready for
+    flamegraph.pl, speedscope or inferno. When off, the middleware checks
+    one attribute per request and no thread runs. A session past its
+    duration is ended by the sampler thread itself, traffic or not.
+    """
+
+    def __init__(self):
+        self.session: Optional[ProfilingSession] = None
+        self._loop_thread_id: Optional[int] = None
+        # Middleware coroutine frame of each watched request -> stack counts for that request
+        self._watched: Dict[object, Counter] = {}
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.session is not None
+
+    async def start(
+        self,
+        sample_rate: float,
+        route: Optional[str] = None,
+        interval_ms: int = PROFILE_SAMPLE_INTERVAL_MS,
+        duration_seconds: int = PROFILE_DEFAULT_DURATION_SECONDS,
+    ) -> dict:
+        """Begin profiling; must be called from the event loop thread"""
+        if self.session is not None:
+            await self.stop()
+        self._loop_thread_id = threading.get_ident()
+        self.session = ProfilingSession(sample_rate, route, interval_ms, duration_seconds)
+        self._stopping.clear()
+        self._sampler = threading.Thread(target=self._sample, args=(self.session,), name="request-profiler", daemon=True)
+        self._sampler.start()
+        print(f"Request profiling on: sample rate {sample_rate}, route {route or 'any'}, for {duration_seconds}s")
+        return self.session.describe()
+
+    async def stop(self) -> Optional[dict]:
+        """Stop profiling and write what was collected; returns the session and files written"""
+        detached = self._detach()
+        if detached is None:
+            return None
+        # Joining the sampler and writing the files block, so they run off the loop
+        return await asyncio.get_running_loop().run_in_executor(None, self._finish, *detached)
+
+    def _detach(self, session: Optional[ProfilingSession] = None) -> Optional[tuple]:
+        """Take the running session (only if it is session, when given) so exactly one caller finishes it"""
+        with self._lock:
+            if self.session is None or (session is not None and self.session is not session):
+                return None
+            detached = (self.session, self._sampler)
+            self.session = None
+            self._sampler = None
+            self._stopping.set()
+            self._watched.clear()
+        return detached
+
+    def _finish(self, session: ProfilingSession, sampler: Optional[threading.Thread]) -> dict:
+        if sampler is not None and sampler is not threading.current_thread():
+            sampler.join()
+        summary = session.describe()
+        summary["files"] = self._write(session)
+        print(f"Request profiling off: {session.samples} samples from {session.requests_profiled} requests")
+        return summary
+
+    def status(self) -> Optional[dict]:
+        return None if self.session is None else self.session.describe()
+
+    def begin_request(self, frame, scope: dict) -> bool:
+        """Start watching a request whose middleware is running in frame"""
+        session = self.session
+        if session is None or time.monotonic() > session.deadline:
+            return False # An expired session is ended by its sampler
+        if not session.wants(scope):
+            return False
+        with self._lock:
+            self._watched[frame] = Counter()
+        return True
+
+    def end_request(self, frame, scope: dict):
+        with self._lock:
+            stacks = self._watched.pop(frame, None)
+        # Popped under the lock, so the sampler no longer touches stacks
+        session = self.session
+        if stacks is None or session is None or not session.keeps(scope):
+            return
+        route_key = f"{scope['method']} {route_label(scope)}"
+        session.requests_profiled += 1
+        session.stacks.setdefault(route_key, Counter()).update(stacks)
+
+    def _sample(self, session: ProfilingSession):
+        while not self._stopping.wait(session.interval):
+            if time.monotonic() > session.deadline:
+                detached = self._detach(session)
+                if detached is not None:
+                    self._finish(*detached)
+                return
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = []
+            while frame is not None and len(stack) < PROFILE_MAX_STACK_DEPTH:
+                if frame in self._watched:
+                    with self._lock:
+                        # The request may have finished since the check
+                        stacks = self._watched.get(frame)
+                        if stacks is not None:
+                            stacks[tuple(reversed(stack))] += 1
+                            session.samples += 1
+                    break
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_name, code.co_firstlineno))
+                frame = frame.f_back
+
+    def _write(self, session: ProfilingSession) -> list:
+        if not session.stacks:
+            return []
+        directory = os.path.join(PROFILE_OUTPUT_DIR, session.started_at.strftime("%Y%m%d-%H%M%S"))
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for route_key, stacks in session.stacks.items():
+            path = os.path.join(directory, _file_name(route_key))
+            with open(path, "w") as f:
+                for stack, count in stacks.most_common():
+                    f.write(";".join([route_key] + [_frame_label(code_key) for code_key in stack]) + f" {count}\n")
+            files.append(path)
+        return files
+
+request_profiler = RequestProfiler()
+
+class ProfilingMiddleware:
+    """Marks requests for the request profiler; a single check when profiling is off"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if request_profiler.session is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # This coroutine's frame is on the loop thread's stack whenever the request's code runs
+        frame = sys._getframe()
+        watched = request_profiler.begin_request(frame, scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if watched:
+                request_profiler.end_request(frame, scope)
@@ -0,0 +1,29 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+# Background jobs started on app startup, keyed by name
+_tasks: Dict[str, asyncio.Task] = {}
+
+async def _run_periodically(name: str, interval_seconds: float, func: Callable[[], Awaitable]):
+    while True:
+        try:
+            await func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Periodic task {name} failed: {str(e)}")
+        await asyncio.sleep(interval_seconds)
+
+def start_periodic_task(name: str, interval_seconds: float, func: Callable[[], Awaitable]):
+    """Run func every interval_seconds on the event loop until shutdown"""
+    if name in _tasks and not _tasks[name].done():
+        return
+    _tasks[name] = asyncio.create_task(_run_periodically(name, interval_seconds, func))
+
+async def stop_periodic_tasks():
+    """Cancel every periodic task and wait for them to exit"""
+    tasks = list(_tasks.values())
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
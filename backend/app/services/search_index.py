@@ -0,0 +1,103 @@
+import re
+from typing import Dict, List, Optional
+
+# Words are indexed by every prefix from MIN_PREFIX_LENGTH up to MAX_PREFIX_LENGTH
+# characters; longer query terms are matched on their first MAX_PREFIX_LENGTH.
+MIN_PREFIX_LENGTH = 1
+MAX_PREFIX_LENGTH = 12
+# Notes can be long; only this many distinct words of them are indexed
+MAX_NOTE_WORDS = 64
+
+# Metadata fields searched, with the weight a match in each contributes to ranking
+SEARCH_FIELD_WEIGHTS = {
+    "title": 8,
+    "platform": 8,
+    "website_domain": 5,
+    "username": 4,
+    "website_url": 2,
+    "notes": 1,
+}
+EXACT_WORD_BONUS = 2
+TITLE_PREFIX_BONUS = 4
+# Title words are also indexed on their own, so the best-ranked candidates
+# can be fetched first: marked whole words, then marked prefixes
+TITLE_FIELDS = ("title", "platform")
+TITLE_WORD_MARK = "="
+TITLE_PREFIX_MARK = "t:"
+# Stored among the tokens; entries without it were indexed by an older
+# build_search_tokens and are rebuilt by the derived field backfill
+SEARCH_INDEX_VERSION_TOKEN = "~v2"
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased words of a metadata value, in order"""
+    return WORD_PATTERN.findall(text.lower()) if text else []
+
+def _prefixes(word: str) -> List[str]:
+    word = word[:MAX_PREFIX_LENGTH]
+    return [word[:length] for length in range(MIN_PREFIX_LENGTH, len(word) + 1)]
+
+def build_search_tokens(document: dict) -> List[str]:
+    """Prefix tokens of a vault entry's metadata, stored in its indexed search_tokens field"""
+    words = set()
+    for field in SEARCH_FIELD_WEIGHTS:
+        field_words = tokenize(document.get(field))
+        if field == "notes":
+            field_words = list(dict.fromkeys(field_words))[:MAX_NOTE_WORDS]
+        words.update(field_words)
+    tokens = {SEARCH_INDEX_VERSION_TOKEN}
+    for word in words:
+        tokens.update(_prefixes(word))
+    for field in TITLE_FIELDS:
+        for word in tokenize(document.get(field)):
+            tokens.add(TITLE_WORD_MARK + word[:MAX_PREFIX_LENGTH])
+            tokens.update(TITLE_PREFIX_MARK + prefix for prefix in _prefixes(word))
+    return sorted(tokens)
+
+def query_terms(query: str) -> List[str]:
+    """Distinct search terms of a query, each cut to the indexed prefix length"""
+    return list(dict.fromkeys(term[:MAX_PREFIX_LENGTH] for term in tokenize(query)))
+
+def search_filter(user_id, terms: List[str]) -> dict:
+    # Every term must prefix some indexed word; the index bounds the scan by the first term
+    return {"user_id": user_id, "search_tokens": {"$all": terms}}
+
+def search_tiers(user_id, terms: List[str]) -> List[dict]:
+    """Filters for the matches of terms, from the ones rank() scores highest to all of them.
+
+    Each tier contains the one before: every term a whole title word, every
+    term prefixing a title word, then every term prefixing any indexed word.
+    """
+    return [
+        {"user_id": user_id, "search_tokens": {"$all": [TITLE_WORD_MARK + term for term in terms]}},
+        {"user_id": user_id, "search_tokens": {"$all": [TITLE_PREFIX_MARK + term for term in terms]}},
+        search_filter(user_id, terms),
+    ]
+
+def rank(document: dict, query: str, terms: List[str]) -> float:
+    """Relevance of a matched entry: where each term matched, and how well"""
+    field_words: Dict[str, List[str]] = {field: tokenize(document.get(field)) for field in SEARCH_FIELD_WEIGHTS}
+    score = 0.0
+    for term in terms:
+        best = 0.0
+        for field, weight in SEARCH_FIELD_WEIGHTS.items():
+            for word in field_words[field]:
+                if word == term:
+                    best = max(best, weight + EXACT_WORD_BONUS)
+                elif word.startswith(term):
+                    # Shorter completions rank above longer ones
+                    best = max(best, weight * len(term) / len(word))
+        score += best
+    title = (document.get("title") or document.get("platform") or "").lower()
+    if title.startswith(query.strip().lower()):
+        score += TITLE_PREFIX_BONUS
+    return score
+
+async def refresh_search_tokens(collection, document: dict) -> dict:
+    """Bring a document's search tokens up to date after a partial update"""
+    tokens = build_search_tokens(document)
+    if document.get("search_tokens") != tokens:
+        await collection.update_one({"_id": document["_id"]}, {"$set": {"search_tokens": tokens}})
+        document["search_tokens"] = tokens
+    return document
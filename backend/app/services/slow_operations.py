@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from .metrics import current_route
+
+# Opt-in: recording adds a little work to every command while enabled
+SLOW_OPERATION_RECORDING = os.getenv("SLOW_OPERATION_RECORDING", "false").lower() == "true"
+SLOW_OPERATION_THRESHOLD_MS = int(os.getenv("SLOW_OPERATION_THRESHOLD_MS", "100"))
+# Run explain on slow commands to see which plan they used (and flag collection scans)
+SLOW_OPERATION_EXPLAIN = os.getenv("SLOW_OPERATION_EXPLAIN", "false").lower() == "true"
+# The same query shape is explained at most this often
+SLOW_OPERATION_EXPLAIN_INTERVAL_SECONDS = int(os.getenv("SLOW_OPERATION_EXPLAIN_INTERVAL_SECONDS", "600"))
+# Size of the capped collection; oldest records are overwritten first
+SLOW_OPERATIONS_COLLECTION_BYTES = int(os.getenv("SLOW_OPERATIONS_COLLECTION_BYTES", str(16 * 1024 * 1024)))
+# Records waiting to be written; more than this while Mongo is slow are dropped
+SLOW_OPERATION_QUEUE_SIZE = 1000
+SLOW_OPERATIONS_COLLECTION = "slow_operations"
+
+# Commands that can miss an index, with the parts of them that make up the query shape
+SHAPED_COMMAND_FIELDS = {
+    "find": ("filter", "sort", "projection"),
+    "aggregate": ("pipeline",),
+    "count": ("query",),
+    "distinct": ("key", "query"),
+    "findAndModify": ("query", "sort"),
+    "update": ("updates",),
+    "delete": ("deletes",),
+}
+# Parts of a sub-document of update/delete that shape the query
+STATEMENT_FIELDS = ("q", "limit", "multi")
+# Session and routing fields the driver adds that explain must not be given
+DRIVER_FIELDS = {"lsid", "txnNumber", "$clusterTime", "$db", "$readPreference", "readConcern", "writeConcern", "apiVersion"}
+# Parts kept verbatim in shapes: they are written in code rather than filled
+# from user input, and decide which index can serve the query
+VERBATIM_FIELDS = {"sort", "projection", "key", "$sort", "$project"}
+
+def query_shape(value, key: Optional[str] = None):
+    """The structure of a query with its values replaced by "?".
+
+    Field names and operators are kept, so queries that differ only in the
+    values they look for share a shape.
+    """
+    if key in VERBATIM_FIELDS:
+        return value
+    if isinstance(value, dict):
+        return {k: query_shape(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [query_shape(item) for item in value]
+        return ["?"]
+    return "?"
+
+def command_shape(command_name: str, command: dict) -> dict:
+    shape = {}
+    for field in SHAPED_COMMAND_FIELDS.get(command_name, ()):
+        if field not in command:
+            continue
+        value = command[field]
+        if field in ("updates", "deletes"):
+            # Every statement of a bulk write shares the first one's shape often enough
+            value = [{k: statement[k] for k in STATEMENT_FIELDS if k in statement} for statement in value[:1]]
+        shape[field] = query_shape(value, field)
+    return shape
+
+def _plan_stages(explain: dict) -> List[str]:
+    """Stage names of every winning plan in an explain result, outermost first"""
+    stages = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.append(node["stage"])
+            for key, child in node.items():
+                if key != "rejectedPlans":
+                    walk(child)
+        elif isinstance(node, list):
+            for child in node:
+                walk(child)
+
+    def find_winning_plans(node):
+        if isinstance(node, dict):
+            for key, child in node.items():
+                if key == "winningPlan":
+                    walk(child)
+                else:
+                    find_winning_plans(child)
+        elif isinstance(node, list):
+            for child in node:
+                find_winning_plans(child)
+
+    find_winning_plans(explain)
+    return stages
+
+class SlowOperationRecorder(monitoring.CommandListener):
+    """Records commands slower than a threshold into a capped collection.
+
+    The listener methods run on driver threads and must not block, so a slow
+    command only leaves a record on a queue; a task on the event loop drains
+    it, optionally explains the command, and writes the record. Records keep
+    the query shape, never the values queried for.
+    """
+
+    def __init__(self, threshold_ms: int = SLOW_OPERATION_THRESHOLD_MS, explain: bool = SLOW_OPERATION_EXPLAIN):
+        self.enabled = False
+        self.threshold_micros = threshold_ms * 1000
+        self.explain = explain
+        self.recorded = 0
+        self.dropped = 0
+        self._db = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Started commands, until they finish: (command name, collection, database, route, command)
+        self._pending: Dict[Tuple[int, int], tuple] = {}
+        # Last explain per query shape: (when, plan stages)
+        self._explained: Dict[str, Tuple[float, List[str]]] = {}
+
+    async def start(self, db):
+        """Create the capped collection and begin recording"""
+        try:
+            await db.create_collection(SLOW_OPERATIONS_COLLECTION, capped=True, size=SLOW_OPERATIONS_COLLECTION_BYTES)
+        except CollectionInvalid:
+            pass # Already exists
+        self._db = db
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=SLOW_OPERATION_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._drain())
+        self.enabled = True
+        print(f"Recording MongoDB commands slower than {self.threshold_micros // 1000}ms")
+
+    async def stop(self):
+        self.enabled = False
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._pending.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "threshold_ms": self.threshold_micros // 1000,
+            "explain": self.explain,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+        }
+
+    @staticmethod
+    def _key(event) -> Tuple[int, int]:
+        return event.request_id, event.operation_id
+
+    def started(self, event):
+        if not self.enabled or event.command_name not in SHAPED_COMMAND_FIELDS:
+            return
+        collection = event.command.get(event.command_name)
+        if collection == SLOW_OPERATIONS_COLLECTION:
+            return
+        if len(self._pending) >= SLOW_OPERATION_QUEUE_SIZE * 10:
+            self._pending.clear() # Outcomes lost with dropped connections
+        # The driver may reuse the command document once it is sent, so keep a copy
+        self._pending[self._key(event)] = (
+            event.command_name, collection, event.database_name, current_route(), dict(event.command)
+        )
+
+    def succeeded(self, event):
+        self._finished(event, failed=False)
+
+    def failed(self, event):
+        self._finished(event, failed=True)
+
+    def _finished(self, event, failed: bool):
+        pending = self._pending.pop(self._key(event), None)
+        if pending is None or event.duration_micros < self.threshold_micros:
+            return
+        command_name, collection, database, route, command = pending
+        record = {
+            "command": command_name,
+            "collection": collection,
+            "database": database,
+            "route": route,
+            "duration_ms": round(event.duration_micros / 1000, 3),
+            "failed": failed,
+            "recorded_at": datetime.utcnow(),
+        }
+        try:
+            self._loop.call_soon_threadsafe(self._enqueue, record, command)
+        except RuntimeError:
+            pass # Loop already closed during shutdown
+
+    def _enqueue(self, record: dict, command: dict):
+        try:
+            self._queue.put_nowait((record, command))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _drain(self):
+        while True:
+            record, command = await self._queue.get()
+            try:
+                shape = command_shape(record["command"], command)
+                # Stored as text: shapes contain operator keys Mongo won't take as field names
+                record["shape"] = json.dumps(shape, default=str)
+                record["shape_id"] = hashlib.sha1(
+                    f"{record['database']}.{record['collection']}:{record['command']}:{record['shape']}".encode()
+                ).hexdigest()[:16]
+                if self.explain and not record["failed"]:
+                    stages = await self._explain(record, command)
+                    if stages is not None:
+                        record["plan_stages"] = stages
+                        record["collscan"] = "COLLSCAN" in stages
+                await self._db[SLOW_OPERATIONS_COLLECTION].insert_one(record)
+                self.recorded += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Failed to record slow operation: {str(e)}")
+
+    async def _explain(self, record: dict, command: dict) -> Optional[List[str]]:
+        cached = self._explained.get(record["shape_id"])
+        if cached is not None and time.monotonic() - cached[0] < SLOW_OPERATION_EXPLAIN_INTERVAL_SECONDS:
+            return cached[1]
+        explainable = {key: value for key, value in command.items() if key not in DRIVER_FIELDS}
+        try:
+            # queryPlanner only plans the query; it doesn't run it again
+            result = await self._db.client[record["database"]].command(
+                {"explain": explainable, "verbosity": "queryPlanner"}
+            )
+        except PyMongoError as e:
+            print(f"Could not explain slow {record['command']} on {record['collection']}: {str(e)}")
+            return None
+        stages = _plan_stages(result)
+        self._explained[record["shape_id"]] = (time.monotonic(), stages)
+        return stages
+
+slow_operation_recorder = SlowOperationRecorder()
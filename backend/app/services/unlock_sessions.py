@@ -0,0 +1,92 @@
+import os
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from bson import ObjectId
+from jose import JWTError, jwt
+from pymongo import ASCENDING
+
+from ..database import get_db
+from ..routers.auth import SECRET_KEY, ALGORITHM
+
+# Private storage relocks after this long without an item operation
+PRIVATE_STORAGE_IDLE_MINUTES = int(os.getenv("PRIVATE_STORAGE_IDLE_MINUTES", "5"))
+# Hard cap on how long one unlock lasts, however active the session is
+PRIVATE_STORAGE_MAX_UNLOCK_MINUTES = int(os.getenv("PRIVATE_STORAGE_MAX_UNLOCK_MINUTES", "60"))
+UNLOCK_TOKEN_SCOPE = "private_storage"
+
+# jti -> expiry (unix time) of unlock sessions locked explicitly. Every worker
+# mirrors the private_storage_revocations collection here, so validating a
+# token never needs a database round trip.
+_revoked: Dict[str, float] = {}
+_revocations_synced_at: Optional[datetime] = None
+
+def _issue(user_id: str, storage_id: str, jti: str, auth_time: float) -> dict:
+    now = time.time()
+    expires_at = min(now + PRIVATE_STORAGE_IDLE_MINUTES * 60, auth_time + PRIVATE_STORAGE_MAX_UNLOCK_MINUTES * 60)
+    claims = {
+        "sub": str(user_id),
+        "sid": str(storage_id),
+        "scope": UNLOCK_TOKEN_SCOPE,
+        "jti": jti,
+        "auth_time": int(auth_time),
+        "exp": int(expires_at),
+    }
+    return {
+        "unlock_token": jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM),
+        "expires_at": datetime.utcfromtimestamp(expires_at),
+    }
+
+def create_unlock_token(user_id: str, storage_id: str) -> dict:
+    """Start a new unlock session for a user's private storage"""
+    return _issue(user_id, storage_id, secrets.token_urlsafe(16), time.time())
+
+def validate_unlock_token(token: str, user_id: str) -> Optional[dict]:
+    """Return the claims of a live unlock token belonging to user_id, else None"""
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if claims.get("scope") != UNLOCK_TOKEN_SCOPE or claims.get("sub") != str(user_id):
+        return None
+    if claims.get("jti") in _revoked:
+        return None
+    return claims
+
+def refresh_unlock_token(claims: dict) -> dict:
+    """Slide the idle window of an unlock session forward (never past its hard cap)"""
+    return _issue(claims["sub"], claims["sid"], claims["jti"], claims["auth_time"])
+
+async def ensure_indexes(db):
+    await db["private_storage_revocations"].create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    await db["private_storage_revocations"].create_index([("revoked_at", ASCENDING)])
+
+async def revoke_unlock_token(claims: dict):
+    """Lock an unlock session on every worker"""
+    expires_at = claims["auth_time"] + PRIVATE_STORAGE_MAX_UNLOCK_MINUTES * 60
+    _revoked[claims["jti"]] = expires_at
+    await get_db()["private_storage_revocations"].update_one(
+        {"_id": claims["jti"]},
+        {"$set": {
+            "user_id": ObjectId(claims["sub"]),
+            "revoked_at": datetime.utcnow(),
+            "expires_at": datetime.utcfromtimestamp(expires_at),
+        }},
+        upsert=True
+    )
+
+async def sync_revocations(db=None):
+    """Pull revocations made on other workers into the in-memory set"""
+    global _revocations_synced_at
+    db = db if db is not None else get_db()
+    now = datetime.utcnow()
+    since = _revocations_synced_at or now - timedelta(minutes=PRIVATE_STORAGE_MAX_UNLOCK_MINUTES)
+    # Overlap a little so a revocation written during the last sync isn't missed
+    async for revocation in db["private_storage_revocations"].find({"revoked_at": {"$gte": since - timedelta(seconds=5)}}):
+        _revoked[revocation["_id"]] = revocation["expires_at"].replace(tzinfo=timezone.utc).timestamp()
+    _revocations_synced_at = now
+
+    cutoff = time.time()
+    for jti in [jti for jti, expires_at in _revoked.items() if expires_at < cutoff]:
+        del _revoked[jti]
@@ -0,0 +1,54 @@
+"""Throughput of batched Fernet decryption against the crypto thread pool size.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_crypto --items 20000
+
+Each pool size decrypts the same batch through run_crypto_batch; with the
+GIL released inside OpenSSL, throughput should grow with the thread count
+up to the number of cores.
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("FINGERPRINT_KEY", Fernet.generate_key().decode())
+
+from app.services import encryption
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=20000, help="secrets per batch")
+    parser.add_argument("--size", type=int, default=32, help="plaintext length in bytes")
+    parser.add_argument("--threads", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}), help="pool sizes to try")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per pool size (best is reported)")
+    return parser.parse_args()
+
+async def run(args):
+    cipher = Fernet(Fernet.generate_key())
+    tokens = [cipher.encrypt(os.urandom(args.size)) for _ in range(args.items)]
+
+    start = time.perf_counter()
+    for token in tokens:
+        cipher.decrypt(token)
+    inline_rate = args.items / (time.perf_counter() - start)
+    print(f"{'inline loop':>12}: {inline_rate:>10.0f} ops/s")
+
+    for threads in args.threads:
+        encryption._crypto_executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="crypto")
+        best = 0.0
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            await encryption.run_crypto_batch(cipher.decrypt, tokens)
+            best = max(best, args.items / (time.perf_counter() - start))
+        encryption._crypto_executor.shutdown()
+        print(f"{threads:>4} threads: {best:>10.0f} ops/s  ({best / inline_rate:.2f}x)")
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,313 @@
+"""End-to-end load test of the API under realistic request mixes.
+
+Starts the FastAPI app in-process (with its full startup and shutdown) and a
+local fake HIBP server, then drives each scenario with concurrent clients
+and reports throughput and p50/p95/p99 latency. Run from the backend
+directory against a MongoDB instance (MONGODB_URL, default
+mongodb://localhost:27017/); the benchmark uses its own throwaway database:
+
+    pip install -r requirements-bench.txt
+    python -m benchmarks.bench_e2e --output results.json
+    python -m benchmarks.bench_e2e --output new.json --compare results.json
+
+--in-memory uses mongomock_motor instead, which exercises the same code
+paths but has no indexes or network, so its numbers say nothing about
+production. Requests go through httpx's ASGI transport on the app's own
+event loop: no sockets, so latencies include client overhead but no
+network.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import string
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("FINGERPRINT_KEY", Fernet.generate_key().decode())
+os.environ["MONGODB_NAME"] = f"bench_e2e_{os.getpid()}"
+
+from benchmarks.fake_hibp import FakeHIBP
+
+SCENARIOS = ["login_storm", "vault_crud", "breach_scan", "notification_polling", "share"]
+# Passwords the fake HIBP server reports as breached; seeded into the scanned vault
+BREACHED_PASSWORDS = ["password", "123456", "qwerty", "letmein", "iloveyou"]
+BENCH_PASSWORD = "bench-Password-1"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--users", type=int, default=20, help="accounts registered for the run")
+    parser.add_argument("--concurrency", type=int, default=10, help="clients running each scenario at once")
+    parser.add_argument("--ops", type=int, default=200, help="operations per scenario (breach_scan: see --breach-scans)")
+    parser.add_argument("--breach-entries", type=int, default=10000, help="passwords in the vault breach_scan checks")
+    parser.add_argument("--breach-scans", type=int, default=1, help="full scans breach_scan runs")
+    parser.add_argument("--notifications", type=int, default=200, help="notifications seeded per user")
+    parser.add_argument("--hibp-latency-ms", type=float, default=0, help="delay the fake HIBP server adds per response")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--in-memory", action="store_true", help="use mongomock_motor instead of MongoDB")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to print changes against")
+    return parser.parse_args()
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summarize(samples: list) -> dict:
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(percentile(samples, 0.50), 3),
+        "p95_ms": round(percentile(samples, 0.95), 3),
+        "p99_ms": round(percentile(samples, 0.99), 3),
+        "max_ms": round(max(samples), 3),
+    }
+
+def random_word(length: int = 8) -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=length))
+
+class Recorder:
+    """Latencies of whole operations and of each request within them"""
+
+    def __init__(self):
+        self.operations = []
+        self.requests = {}
+        self.errors = {}
+
+    async def call(self, client, method: str, url: str, label: str, expected=(200,), **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.requests.setdefault(label, []).append((time.perf_counter() - started) * 1000)
+        if response.status_code not in expected:
+            key = f"{label} {response.status_code}"
+            self.errors[key] = self.errors.get(key, 0) + 1
+            raise RuntimeError(f"{method} {url} returned {response.status_code}")
+        return response
+
+async def run_scenario(name: str, operation, ops: int, concurrency: int) -> dict:
+    recorder = Recorder()
+    remaining = iter(range(ops))
+    failed = 0
+
+    async def worker(worker_id: int):
+        nonlocal failed
+        for index in remaining:
+            started = time.perf_counter()
+            try:
+                await operation(recorder, worker_id, index)
+            except RuntimeError:
+                failed += 1
+                continue
+            recorder.operations.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(i) for i in range(min(concurrency, ops))])
+    elapsed = time.perf_counter() - started
+    result = {
+        "operations": ops,
+        "failed": failed,
+        "concurrency": min(concurrency, ops),
+        "duration_s": round(elapsed, 3),
+        "throughput_ops_s": round(len(recorder.operations) / elapsed, 3) if elapsed else None,
+        "latency": summarize(recorder.operations),
+        "requests": {label: summarize(samples) for label, samples in sorted(recorder.requests.items())},
+        "errors": recorder.errors,
+    }
+    latency = result["latency"]
+    print(
+        f"{name:22} ops={len(recorder.operations):>5} failed={failed:>3}  {result['throughput_ops_s'] or 0:9.2f} ops/s  "
+        f"p50={latency.get('p50_ms', 0):8.2f}ms  p95={latency.get('p95_ms', 0):8.2f}ms  p99={latency.get('p99_ms', 0):8.2f}ms"
+    )
+    return result
+
+class Bench:
+    def __init__(self, args, client, db):
+        self.args = args
+        self.client = client
+        self.db = db
+        self.users = [] # (email, user_id, auth headers)
+
+    async def register_users(self):
+        for i in range(self.args.users):
+            email = f"bench{i}-{random_word(6)}@example.com"
+            response = await self.client.post(
+                "/api/v1/auth/register", json={"email": email, "full_name": f"Bench {i}", "password": BENCH_PASSWORD}
+            )
+            response.raise_for_status()
+            user_id = response.json()["_id"]
+            token = await self.client.post("/api/v1/auth/token", data={"username": email, "password": BENCH_PASSWORD})
+            token.raise_for_status()
+            self.users.append((email, user_id, {"Authorization": f"Bearer {token.json()['access_token']}"}))
+
+    def user(self, index: int):
+        return self.users[index % len(self.users)]
+
+    # Scenarios: each returns the operation run_scenario repeats
+
+    async def login_storm(self):
+        async def operation(recorder, worker_id, index):
+            email, _, _ = random.choice(self.users)
+            await recorder.call(self.client, "POST", "/api/v1/auth/token", "login",
+                                data={"username": email, "password": BENCH_PASSWORD})
+        return operation, self.args.ops
+
+    async def vault_crud(self):
+        async def operation(recorder, worker_id, index):
+            _, _, headers = self.user(index)
+            entry = {
+                "title": f"Site {index}", "username": f"user{index}@example.com",
+                "website_url": f"https://login.site{index % 50}.example.com/",
+                "password": f"{random_word(12)}-{index}",
+            }
+            created = await recorder.call(self.client, "POST", "/api/v1/passwords/", "create", json=entry, headers=headers)
+            password_id = created.json()["_id"]
+            await recorder.call(self.client, "GET", "/api/v1/passwords/?limit=100", "list", headers=headers)
+            await recorder.call(self.client, "GET", f"/api/v1/passwords/{password_id}", "read", headers=headers)
+            entry["notes"] = "rotated"
+            entry["password"] = f"{random_word(12)}-{index}-2"
+            await recorder.call(self.client, "PUT", f"/api/v1/passwords/{password_id}", "update", json=entry, headers=headers)
+            await recorder.call(self.client, "DELETE", f"/api/v1/passwords/{password_id}", "delete", expected=(204,), headers=headers)
+        return operation, self.args.ops
+
+    async def breach_scan(self):
+        from app.services.encryption import KEY_SCHEME, get_user_cipher, run_crypto_batch
+
+        # One dedicated vault, seeded directly: creating 10k entries through the API isn't what's measured
+        _, user_id, headers = self.users[0]
+        plaintexts = [
+            random.choice(BREACHED_PASSWORDS) if i % 100 == 0 else f"{random_word(10)}-{i}"
+            for i in range(self.args.breach_entries)
+        ]
+        cipher = await get_user_cipher(self.db, user_id)
+        tokens = await run_crypto_batch(lambda plaintext: cipher.encrypt(plaintext.encode()).decode(), plaintexts)
+        now = datetime.utcnow()
+        documents = [{
+            "user_id": ObjectId(user_id), "title": f"Breach scan {i}", "username": f"scan{i}",
+            "encrypted_password": token, "key_scheme": KEY_SCHEME, "created_at": now, "updated_at": now,
+        } for i, token in enumerate(tokens)]
+        for offset in range(0, len(documents), 5000):
+            await self.db["passwords"].insert_many(documents[offset:offset + 5000])
+
+        async def operation(recorder, worker_id, index):
+            await recorder.call(self.client, "POST", "/api/v1/breach/check-passwords", "check_passwords",
+                                headers=headers, timeout=None)
+        return operation, self.args.breach_scans
+
+    async def notification_polling(self):
+        now = datetime.utcnow()
+        for _, user_id, _ in self.users:
+            await self.db["activity_notifications"].insert_many([{
+                "user_id": ObjectId(user_id), "message": f"Password {i} was updated", "type": "password_updated",
+                "entity_id": ObjectId(), "is_read": i % 3 == 0, "created_at": now - timedelta(minutes=i),
+            } for i in range(self.args.notifications)])
+
+        async def operation(recorder, worker_id, index):
+            _, _, headers = self.user(index)
+            await recorder.call(self.client, "GET", "/api/v1/notifications/unread-count", "unread_count", headers=headers)
+            listing = await recorder.call(self.client, "GET", "/api/v1/notifications/?limit=50&read=false", "list_unread", headers=headers)
+            # Clients open some of what they see
+            unread = listing.json()
+            if unread and index % 5 == 0:
+                await recorder.call(self.client, "PUT", f"/api/v1/notifications/{unread[0]['_id']}/read", "mark_read", headers=headers)
+        return operation, self.args.ops
+
+    async def share(self):
+        async def operation(recorder, worker_id, index):
+            _, _, headers = self.user(index)
+            created = await recorder.call(self.client, "POST", "/api/v1/share/share/create", "create",
+                                          json={"encrypted_data": random_word(64), "expires_in_minutes": 10}, headers=headers)
+            await recorder.call(self.client, "GET", f"/api/v1/share/share/{created.json()['token']}", "consume")
+        return operation, self.args.ops
+
+def git_version() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(results: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nChange against {baseline_path} ({baseline.get('version', 'unknown')}):")
+    for name, result in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            old, new = before["latency"].get(key), result["latency"].get(key)
+            if old and new is not None:
+                changes.append(f"{key[:-3]} {100 * (new - old) / old:+6.1f}%")
+        old, new = before.get("throughput_ops_s"), result.get("throughput_ops_s")
+        if old and new is not None:
+            changes.append(f"throughput {100 * (new - old) / old:+6.1f}%")
+        print(f"{name:22} " + "  ".join(changes))
+
+async def run(args):
+    random.seed(args.seed)
+    fake_hibp = FakeHIBP(BREACHED_PASSWORDS, latency_ms=args.hibp_latency_ms)
+    hibp_url = await fake_hibp.start()
+    os.environ["HIBP_RANGE_API_URL"] = f"{hibp_url}/range"
+    os.environ["HIBP_API_URL"] = f"{hibp_url}/api/v3"
+
+    # Imported once the environment points at the stand-ins
+    import httpx
+    from app.database import mongodb
+    from app.main import app
+
+    if args.in_memory:
+        from mongomock_motor import AsyncMongoMockClient
+
+        async def connect():
+            mongodb.client = AsyncMongoMockClient()
+        mongodb.connect = connect
+
+    await app.router.startup()
+    db = mongodb.get_db()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+            bench = Bench(args, client, db)
+            await bench.register_users()
+            results = {
+                "version": git_version(),
+                "recorded_at": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "database": "mongomock" if args.in_memory else os.getenv("MONGODB_URL", "mongodb://localhost:27017/"),
+                "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+                "scenarios": {},
+            }
+            for name in args.scenarios:
+                operation, ops = await getattr(bench, name)()
+                concurrency = 1 if name == "breach_scan" else args.concurrency
+                results["scenarios"][name] = await run_scenario(name, operation, ops, concurrency)
+            results["hibp_requests"] = fake_hibp.requests
+    finally:
+        await mongodb.client.drop_database(mongodb.database_name)
+        await app.router.shutdown()
+        await fake_hibp.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    failed = sum(result["failed"] for result in results["scenarios"].values())
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
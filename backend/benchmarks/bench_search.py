@@ -0,0 +1,126 @@
+"""Latency of vault search on a large synthetic vault.
+
+Run from the backend directory against a MongoDB instance (MONGODB_URL,
+default mongodb://localhost:27017/); the benchmark uses its own
+throwaway database:
+
+    python -m benchmarks.bench_search --entries 100000
+
+--in-memory uses mongomock_motor instead, which checks the code path but
+has no indexes, so its latencies say nothing about production.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import string
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from cryptography.fernet import Fernet
+
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("FINGERPRINT_KEY", Fernet.generate_key().decode())
+
+from app.models import User
+from app.routers import search
+from app.services.public_suffix import registrable_domain
+from app.services.search_index import build_search_tokens
+
+SITES = ["google", "github", "amazon", "netflix", "bank", "paypal", "spotify", "dropbox", "slack", "atlassian",
+         "microsoft", "apple", "adobe", "twitter", "reddit", "linkedin", "zoom", "stripe", "heroku", "digitalocean"]
+TLDS = ["com", "co.uk", "io", "de", "org", "net"]
+WORDS = ["work", "personal", "shared", "old", "backup", "admin", "test", "family", "billing", "dev", "staging", "prod"]
+PLATFORMS = ["whatsapp", "instagram", "reddit", "discord", "facebook", "linkedin"]
+QUERIES = ["g", "git", "github", "goo work", "bank billing", "amaz", "netflix family", "dev", "zzz", "paypal old", "stag"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100000, help="passwords in the vault")
+    parser.add_argument("--social", type=int, default=2000, help="social accounts in the vault")
+    parser.add_argument("--iterations", type=int, default=50, help="runs per query")
+    parser.add_argument("--target-p95-ms", type=float, default=50.0, help="latency target per query")
+    parser.add_argument("--in-memory", action="store_true", help="use mongomock_motor instead of MongoDB")
+    return parser.parse_args()
+
+def random_word(length: int = 8) -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=length))
+
+def make_password(user_id: ObjectId, i: int) -> dict:
+    site = random.choice(SITES)
+    url = f"https://{random.choice(['', 'www.', 'login.', 'accounts.'])}{site}.{random.choice(TLDS)}/"
+    document = {
+        "user_id": user_id,
+        "title": f"{site.title()} {random.choice(WORDS)} {i}",
+        "username": f"{random_word(6)}@{random.choice(['gmail.com', 'example.org'])}",
+        "website_url": url,
+        "website_domain": registrable_domain(url),
+        "notes": " ".join(random_word(random.randint(3, 10)) for _ in range(random.randint(0, 12))),
+        "encrypted_password": "x",
+        "created_at": datetime.utcnow(),
+    }
+    document["search_tokens"] = build_search_tokens(document)
+    return document
+
+def make_social_account(user_id: ObjectId) -> dict:
+    document = {
+        "user_id": user_id,
+        "platform": random.choice(PLATFORMS),
+        "username": random_word(8),
+        "encrypted_password": "x",
+        "created_at": datetime.utcnow(),
+    }
+    document["search_tokens"] = build_search_tokens(document)
+    return document
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def run(args):
+    if args.in_memory:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+    else:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017/"))
+    db_name = f"bench_search_{os.getpid()}"
+    db = client[db_name]
+
+    try:
+        user_id = ObjectId()
+        # Another user's entries make the user_id prefix of the index matter
+        other_user_id = ObjectId()
+        started = time.perf_counter()
+        for owner in (user_id, other_user_id):
+            for offset in range(0, args.entries, 5000):
+                batch = [make_password(owner, i) for i in range(offset, min(offset + 5000, args.entries))]
+                await db["passwords"].insert_many(batch)
+            await db["social_accounts"].insert_many([make_social_account(owner) for _ in range(args.social)])
+        await search.ensure_indexes(db)
+        print(f"Loaded 2 x {args.entries} passwords in {time.perf_counter() - started:.1f}s")
+
+        user = User(_id=str(user_id), email="bench@example.com", username="bench", hashed_password="x")
+        failed = False
+        for query in QUERIES:
+            samples = []
+            results = []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                results = await search.search_vault(q=query, kind=None, limit=20, db=db, current_user=user)
+                samples.append((time.perf_counter() - started) * 1000)
+            p95 = percentile(samples, 0.95)
+            failed |= p95 > args.target_p95_ms
+            print(
+                f"{query!r:18} results={len(results):>3}  p50={statistics.median(samples):7.2f}ms  "
+                f"p95={p95:7.2f}ms  p99={percentile(samples, 0.99):7.2f}ms  "
+                f"{'FAIL' if p95 > args.target_p95_ms else 'ok'}"
+            )
+        return 1 if failed else 0
+    finally:
+        await client.drop_database(db_name)
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(run(parse_args())))
@@ -0,0 +1,104 @@
+"""CPU cost of serializing list endpoint payloads, per 1k items.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_serialization --items 1000
+
+"before" is the old path: build response objects by hand, then let FastAPI
+validate them against response_model and render them with json.dumps.
+"after" is services.fast_json: one pydantic-core validate and dump_json
+straight from the Mongo documents. Both must produce the same JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+from cryptography.fernet import Fernet
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("FINGERPRINT_KEY", Fernet.generate_key().decode())
+
+from app.schemas import ActivityNotificationResponse, PasswordResponse
+from app.services.fast_json import json_list_response
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000, help="documents per response")
+    parser.add_argument("--repeat", type=int, default=50, help="responses rendered per path")
+    return parser.parse_args()
+
+def make_passwords(count: int) -> List[dict]:
+    user_id = ObjectId()
+    now = datetime.utcnow()
+    return [{
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "title": f"Account {i}",
+        "username": f"user{i}@example.com",
+        "website_url": f"https://login.site{i % 50}.example.com/",
+        "website_domain": f"site{i % 50}.example.com",
+        "notes": "recovery codes in the safe" if i % 3 == 0 else None,
+        "encrypted_password": "gAAAAA" + "x" * 100,
+        "strength_score": i % 5,
+        "change_seq": i,
+        "created_at": now - timedelta(days=i),
+        "updated_at": now,
+    } for i in range(count)]
+
+def make_notifications(count: int) -> List[dict]:
+    user_id = ObjectId()
+    now = datetime.utcnow()
+    return [{
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "message": f"Password {i} was updated",
+        "type": "password_updated",
+        "entity_id": ObjectId(),
+        "is_read": bool(i % 2),
+        "change_seq": i,
+        "created_at": now - timedelta(minutes=i),
+    } for i in range(count)]
+
+async def render_before(model, documents: List[dict]) -> bytes:
+    field = create_response_field(name="response", type_=List[model])
+    content = await serialize_response(field=field, response_content=[model(**d) for d in documents])
+    return JSONResponse(content).body
+
+def render_after(model, documents: List[dict]) -> bytes:
+    return json_list_response(model, documents).body
+
+async def measure(model, documents: List[dict], repeat: int):
+    before = await render_before(model, documents)
+    after = render_after(model, documents)
+    assert json.loads(before) == json.loads(after), "fast path output differs"
+
+    started = time.process_time()
+    for _ in range(repeat):
+        await render_before(model, documents)
+    before_cpu = (time.process_time() - started) / repeat
+
+    started = time.process_time()
+    for _ in range(repeat):
+        render_after(model, documents)
+    after_cpu = (time.process_time() - started) / repeat
+
+    per_1k = 1000 / len(documents) * 1000
+    print(
+        f"{model.__name__:30} before={before_cpu * per_1k:7.2f}ms  after={after_cpu * per_1k:7.2f}ms  "
+        f"per 1k items  ({before_cpu / after_cpu:.1f}x)"
+    )
+
+async def run(args):
+    await measure(PasswordResponse, make_passwords(args.items), args.repeat)
+    await measure(ActivityNotificationResponse, make_notifications(args.items), args.repeat)
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
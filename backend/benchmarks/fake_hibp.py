@@ -0,0 +1,95 @@
+"""Local stand-in for the Have I Been Pwned APIs the breach monitor calls.
+
+Serves the k-anonymity range API (GET /range/{prefix}) and the breached
+account API (GET /api/v3/breachedaccount/{email}) with deterministic
+responses, so breach scans can be benchmarked without the network or rate
+limits. Point the app at it with:
+
+    HIBP_RANGE_API_URL=http://127.0.0.1:8089/range
+    HIBP_API_URL=http://127.0.0.1:8089/api/v3
+
+Run on its own with python -m benchmarks.fake_hibp --port 8089.
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+from typing import Iterable, Optional
+
+from aiohttp import web
+
+# A real range response lists roughly this many suffixes per prefix
+SUFFIXES_PER_PREFIX = 800
+
+def sha1_hex(password: str) -> str:
+    return hashlib.sha1(password.encode()).hexdigest().upper()
+
+class FakeHIBP:
+    """Range responses padded with pseudo-random suffixes, plus the known-breached passwords"""
+
+    def __init__(self, breached_passwords: Iterable[str] = (), breached_emails: Iterable[str] = (), latency_ms: float = 0):
+        self.latency = latency_ms / 1000
+        self.breached_emails = {email.lower() for email in breached_emails}
+        self._breached_suffixes = {}
+        for password in breached_passwords:
+            digest = sha1_hex(password)
+            self._breached_suffixes.setdefault(digest[:5], []).append(digest[5:])
+        self.requests = 0
+        self._runner: Optional[web.AppRunner] = None
+
+    def range_body(self, prefix: str) -> str:
+        rng = random.Random(prefix)
+        lines = [f"{rng.getrandbits(140):035X}:{rng.randint(1, 5000)}" for _ in range(SUFFIXES_PER_PREFIX)]
+        lines.extend(f"{suffix}:{rng.randint(1, 5000)}" for suffix in self._breached_suffixes.get(prefix, ()))
+        return "\r\n".join(sorted(lines))
+
+    async def _range(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        prefix = request.match_info["prefix"].upper()
+        if len(prefix) != 5:
+            return web.Response(status=400, text="The hash prefix was not in a valid format")
+        return web.Response(text=self.range_body(prefix))
+
+    async def _breached_account(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        email = request.match_info["email"].lower()
+        if email not in self.breached_emails:
+            return web.Response(status=404)
+        return web.json_response([{"Name": "BenchBreach", "BreachDate": "2020-01-01", "Description": "Synthetic breach"}])
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/range/{prefix}", self._range)
+        app.router.add_get("/api/v3/breachedaccount/{email}", self._breached_account)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in the background on the running loop; returns the base URL"""
+        self._runner = web.AppRunner(self.application(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every response")
+    parser.add_argument("--breached", nargs="*", default=["password", "123456", "qwerty"], help="passwords reported as breached")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    fake = FakeHIBP(args.breached, latency_ms=args.latency_ms)
+    web.run_app(fake.application(), host=args.host, port=args.port, access_log=None)